@@ -1,4 +1,6 @@
 import json
+import hmac
+import settings
 import rgw_consts
 import api_core
 import models
@@ -48,6 +50,16 @@ async def CheckUser2(pwd):
         raise models.NoRightError()
 
 
+def CheckIngestKey(key):
+    """
+    the gateway pushing readings authenticates with INGEST['key']
+    """
+    expected = settings.INGEST['key']
+    if not (expected and isinstance(key, str) and hmac.compare_digest(key.encode('utf-8'),
+                                                                      expected.encode('utf-8'))):
+        raise models.NoRightError()
+
+
 async def CheckRight(token):
     if token:
         tbl = await Get(token)
@@ -0,0 +1,170 @@
+"""
+online backup of the databases with the sqlite backup api, pages are copied in small
+steps on a worker thread while rgw keeps running. the source connection holds a read
+transaction, so writes by rgw do not restart the copy.
+"""
+import os
+import os.path as os_path
+import gzip
+import json
+import shutil
+import sqlite3
+from twisted.internet import threads, defer
+from twisted.python import log
+import rg_lib
+import models
+import settings
+
+progress_tbl = {}  # job id -> progress
+
+# time column of each log table for incremental backups, day partitions use cts
+LOG_TIME_COLS = {
+    models.SensorAvgData.TBL: 'cts',
+    models.TriggerLog.TBL: 'cts',
+    models.SwitchOpDuration.TBL: 'stop_ts'
+}
+
+
+def GetDbPath(db_name):
+    return {'biz': settings.BIZ_DB['path'], 'log': settings.LOG_DB['path']}[db_name]
+
+
+def WatermarkPath():
+    return os_path.join(settings.BACKUP['path'], 'rgw_log_watermark.json')
+
+
+def ReadWatermark():
+    """
+    :return: timestamp of the last incremental log backup, 0 if none
+    """
+    if os_path.exists(WatermarkPath()):
+        with open(WatermarkPath()) as f:
+            return json.load(f)['ts']
+    else:
+        return 0
+
+
+def WriteWatermark(ts_val):
+    with open(WatermarkPath(), 'w') as f:
+        json.dump({'ts': ts_val}, f)
+
+
+def IsRunning(db_name):
+    return any([p['status'] == 'running' and p['db'] == db_name for p in progress_tbl.values()])
+
+
+def OpenSource(db_path):
+    conn_obj = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False, timeout=32)
+    conn_obj.execute("BEGIN")
+    conn_obj.execute("select count(*) from sqlite_master").fetchone()  # starts the read transaction
+    return conn_obj
+
+
+def FullCopy(progress, src_path, dst_path):
+    def __progress(status, remaining, total):
+        progress['pages_total'] = total
+        progress['pages_remaining'] = remaining
+
+    src = OpenSource(src_path)
+    dst = sqlite3.connect(dst_path)
+    try:
+        src.backup(dst, pages=settings.BACKUP['step_pages'], progress=__progress, sleep=settings.BACKUP['pause'])
+    finally:
+        dst.close()
+        src.execute("COMMIT")
+        src.close()
+
+
+def IncrementalCopy(progress, src_path, dst_path, start_ts, stop_ts):
+    """
+    copies the log rows with start_ts < time <= stop_ts, rgw_sensor_key is copied whole
+    """
+    src = OpenSource(src_path)
+    attached = False
+    try:
+        src.execute("ATTACH DATABASE ? AS inc", (dst_path,))
+        attached = True
+        tables = src.execute("select name, sql from main.sqlite_master where type='table'").fetchall()
+        for name, sql_str in tables:
+            if name == models.SensorKey.TBL:
+                where, args = "", []
+            elif name in LOG_TIME_COLS:
+                where, args = "where {0}>? and {0}<=?".format(LOG_TIME_COLS[name]), [start_ts, stop_ts]
+            elif name in (models.SensorArchive.TBL, models.SensorArchive.DAY_TBL):
+                where, args = "where day>=? and day<=?", [models.SensorData.PartitionDay(start_ts),
+                                                          models.SensorData.PartitionDay(stop_ts)]
+            elif models.SensorData.PartitionDayOf(name) is not None:
+                day = models.SensorData.PartitionDayOf(name)
+                if (day + 1) * rg_lib.DateTime.DAY_SECONDS <= start_ts:
+                    continue
+                where, args = "where cts>? and cts<=?", [start_ts, stop_ts]
+            else:
+                continue
+            src.execute(sql_str.replace("CREATE TABLE ", "CREATE TABLE inc.", 1))
+            cursor_obj = src.execute("insert into inc.{0} select * from main.{0} {1}".format(name, where), args)
+            progress['rows'] += cursor_obj.rowcount
+            progress['tables'] += 1
+    finally:
+        src.execute("COMMIT")
+        if attached:
+            src.execute("DETACH DATABASE inc")
+        src.close()
+
+
+def Compress(file_path):
+    with open(file_path, 'rb') as src, gzip.open(file_path + '.gz', 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.remove(file_path)
+    return file_path + '.gz'
+
+
+async def Run(progress):
+    try:
+        if progress['mode'] == 'incremental':
+            start_ts = ReadWatermark()
+            await threads.deferToThread(IncrementalCopy, progress, GetDbPath(progress['db']), progress['path'],
+                                        start_ts, progress['start_ts'])
+        else:
+            await threads.deferToThread(FullCopy, progress, GetDbPath(progress['db']), progress['path'])
+        if settings.BACKUP['compress']:
+            progress['status'] = 'compressing'
+            progress['path'] = await threads.deferToThread(Compress, progress['path'])
+        if progress['mode'] == 'incremental':
+            WriteWatermark(progress['start_ts'])
+        progress['size'] = os_path.getsize(progress['path'])
+        progress['status'] = 'done'
+    except Exception as e:
+        log.err()
+        progress['status'] = 'failed'
+        progress['error'] = str(e)
+    finally:
+        progress['stop_ts'] = rg_lib.DateTime.ts()
+
+
+def Start(db_name, mode):
+    """
+    :param db_name: biz or log
+    :param mode: full or incremental, incremental applies to log only
+    :return: progress of the started job
+    """
+    if db_name not in ('biz', 'log') or mode not in ('full', 'incremental'):
+        raise rg_lib.RGError(models.ErrorTypes.UnsupportedOp())
+    if (mode == 'incremental' and db_name != 'log') or IsRunning(db_name):
+        raise rg_lib.RGError(models.ErrorTypes.UnsupportedOp())
+    os.makedirs(settings.BACKUP['path'], exist_ok=True)
+    start_ts = rg_lib.DateTime.ts()
+    job_id = "rgw_{0}_{1}_{2}".format(db_name, mode, rg_lib.DateTime.ts2dt(start_ts).strftime('%Y%m%d%H%M%S'))
+    progress = {'id': job_id, 'db': db_name, 'mode': mode, 'status': 'running',
+                'path': os_path.join(settings.BACKUP['path'], job_id + '.db3'),
+                'pages_total': 0, 'pages_remaining': 0, 'tables': 0, 'rows': 0, 'size': 0,
+                'start_ts': start_ts, 'stop_ts': None, 'error': None}
+    progress_tbl[job_id] = progress
+    defer.ensureDeferred(Run(progress))
+    return progress
+
+
+def GetProgress(job_id=None):
+    if job_id is None:
+        return list(progress_tbl.values())
+    else:
+        return progress_tbl.get(job_id, None)
@@ -1,3 +1,4 @@
+import bisect
 from twisted.python import log
 from twisted.internet import defer, error
 import txredisapi
@@ -10,15 +11,17 @@ import rgw_consts
 
 class BizDB:
     db_pool = None
+    read_pool = None
     redis_conn = None
 
     @classmethod
     async def Query(cls, sql_row):
         """
+        runs on the read only pool
         :param sql_row: [sql, args]
         :return: rows
         """
-        return await rg_lib.Sqlite.RunQuery(cls.db_pool, [sql_row])
+        return await rg_lib.Sqlite.RunQuery(cls.read_pool, [sql_row])
 
     @classmethod
     async def Get(cls, sql_row):
@@ -29,6 +32,18 @@ class BizDB:
     def Interaction(cls, sql_rows):
         return rg_lib.Sqlite.RunInteraction(cls.db_pool, sql_rows)
 
+    @classmethod
+    def BulkInteraction(cls, bulk_rows):
+        """
+        :param bulk_rows: [[sql, [args,...]],...]
+        :return:
+        """
+        return rg_lib.Sqlite.RunBulkInteraction(cls.db_pool, bulk_rows)
+
+    @classmethod
+    def RunWithConn(cls, func_obj, *args):
+        return rg_lib.Sqlite.RunWithConn(cls.db_pool, func_obj, *args)
+
     @classmethod
     def Init(cls):
         def helper(conn_obj):
@@ -40,18 +55,31 @@ class BizDB:
             models.SwitchSchedule.Init(conn_obj)
             models.SwitchAction.Init(conn_obj)
 
-        cls.db_pool = rg_lib.Sqlite.MakeConnPool(settings.BIZ_DB['path'])
+        profile = settings.SQLITE_PROFILES[settings.BIZ_DB['profile']]
+        cls.db_pool = rg_lib.Sqlite.MakeConnPool(settings.BIZ_DB['path'],
+                                                 profile['pool']['cp_min'], profile['pool']['cp_max'], profile)
+        cls.read_pool = rg_lib.Sqlite.MakeReadOnlyConnPool(settings.BIZ_DB['path'],
+                                                           profile['read_pool']['cp_min'],
+                                                           profile['read_pool']['cp_max'], profile)
         cls.redis_conn = txredisapi.lazyConnectionPool(host=settings.REDIS['host'],
                                                        port=settings.REDIS['port'],
                                                        charset=None,
                                                        convertNumbers=False)
         return cls.db_pool.runWithConnection(helper)
 
+    @classmethod
+    def GetStats(cls):
+        return {'pool': cls.db_pool.GetStats() if cls.db_pool else None,
+                'read_pool': cls.read_pool.GetStats() if cls.read_pool else None}
+
     @classmethod
     def Close(cls):
         if cls.db_pool:
             cls.db_pool.close()
             cls.db_pool = None
+        if cls.read_pool:
+            cls.read_pool.close()
+            cls.read_pool = None
         if cls.redis_conn:
             cls.redis_conn.quit()
             cls.redis_conn = None
@@ -59,53 +87,249 @@ class BizDB:
 
 class LogDB:
     db_pool = None
+    read_pool = None
+    writer = None
 
     @classmethod
     def Interaction(cls, sql_rows):
-        return rg_lib.Sqlite.RunInteraction(cls.db_pool, sql_rows)
+        """
+        queued on the group commit writer
+        :param sql_rows: [[sql, args],...]
+        :return: Deferred
+        """
+        return cls.writer.Submit(rg_lib.Sqlite.GroupSqlRows(sql_rows))
+
+    @classmethod
+    def BulkInteraction(cls, bulk_rows):
+        """
+        queued on the group commit writer
+        :param bulk_rows: [[sql, [args,...]],...]
+        :return: Deferred
+        """
+        return cls.writer.Submit(bulk_rows)
+
+    @classmethod
+    def RunWithConn(cls, func_obj, *args):
+        """
+        runs on the writer connection between flushes
+        :param func_obj: func(conn_obj, *args)
+        :return: Deferred
+        """
+        return cls.writer.RunWithConn(func_obj, *args)
 
     @classmethod
     async def Query(cls, sql_row):
         """
+        runs on the read only pool
         :param sql_row: [sql, args]
         :return: list of dict
         """
-        return await rg_lib.Sqlite.RunQuery(cls.db_pool, [sql_row])
+        return await rg_lib.Sqlite.RunQuery(cls.read_pool, [sql_row])
+
+    @classmethod
+    async def QueryTuples(cls, sql_row, binary_cols=()):
+        """
+        runs on the read only pool, for large results
+        :param sql_row: [sql, args]
+        :param binary_cols: indexes of blob columns
+        :return: list of tuple
+        """
+        _, rows = await rg_lib.Sqlite.RunTupleQuery(cls.read_pool, sql_row, binary_cols)
+        return rows
 
     @classmethod
     def Init(cls):
         def helper(conn_obj):
             conn_obj.execute("BEGIN")
+            models.SensorKey.Init(conn_obj)
             models.SensorData.Init(conn_obj)
             models.SwitchOpDuration.Init(conn_obj)
             models.TriggerLog.Init(conn_obj)
             models.SensorAvgData.Init(conn_obj)
-
-        cls.db_pool = rg_lib.Sqlite.MakeConnPool(settings.LOG_DB['path'])
+            models.SensorArchive.Init(conn_obj)
+
+        profile = settings.SQLITE_PROFILES[settings.LOG_DB['profile']]
+        cls.db_pool = rg_lib.Sqlite.MakeConnPool(settings.LOG_DB['path'],
+                                                 profile['pool']['cp_min'], profile['pool']['cp_max'], profile)
+        cls.read_pool = rg_lib.Sqlite.MakeReadOnlyConnPool(settings.LOG_DB['path'],
+                                                           profile['read_pool']['cp_min'],
+                                                           profile['read_pool']['cp_max'], profile)
+        cls.writer = rg_lib.SqliteWriter(rg_lib.Sqlite.MakeConnPool(settings.LOG_DB['path'], 1, 1, profile),
+                                         settings.LOG_DB['writer']['flush_interval'],
+                                         settings.LOG_DB['writer']['flush_rows'])
         return cls.db_pool.runWithConnection(helper)
 
     @classmethod
-    def Close(cls):
+    async def __Close(cls):
+        if cls.writer:
+            try:
+                await cls.writer.Drain()
+            except Exception:
+                log.err()
+            cls.writer.conn_pool_obj.close()
+            cls.writer = None
         if cls.db_pool:
             cls.db_pool.close()
             cls.db_pool = None
+        if cls.read_pool:
+            cls.read_pool.close()
+            cls.read_pool = None
+
+    @classmethod
+    def GetStats(cls):
+        return {'pool': cls.db_pool.GetStats() if cls.db_pool else None,
+                'read_pool': cls.read_pool.GetStats() if cls.read_pool else None,
+                'writer_pool': cls.writer.conn_pool_obj.GetStats() if cls.writer else None,
+                'writer': cls.writer.GetStats() if cls.writer else None}
+
+    @classmethod
+    def Close(cls):
+        """
+        drain the writer first
+        :return: Deferred
+        """
+        return defer.ensureDeferred(cls.__Close())
+
+
+class Registry:
+    """
+    in process copy of rgw_sensor and rgw_switch rows, loaded once and kept current by
+    the Sensor and Switch writes, a miss falls back to the db
+    """
+    sensor_tbl = {}  # sensorid -> row
+
+    switch_tbl = {}  # switchid -> row
+
+    stats = {'hits': 0, 'misses': 0, 'loads': 0, 'loaded': False}
+
+    TBL_MAP = {'sensor': (sensor_tbl, models.Sensor.TBL), 'switch': (switch_tbl, models.Switch.TBL)}
+
+    @classmethod
+    async def Load(cls, kind=None):
+        """
+        :param kind: 'sensor', 'switch' or None for both
+        """
+        for name in ([kind] if kind else ['sensor', 'switch']):
+            tbl, tbl_name = cls.TBL_MAP[name]
+            rows = await BizDB.Query(["select * from {0}".format(tbl_name), []])
+            tbl.clear()
+            tbl.update({r['id']: r for r in rows})
+        cls.stats['loads'] += 1
+        cls.stats['loaded'] = True
+
+    @classmethod
+    async def Reload(cls, kind, ids):
+        """
+        refresh rows of ids from db
+        """
+        tbl, tbl_name = cls.TBL_MAP[kind]
+        rows = await BizDB.Query([rg_lib.Sqlite.GenInSql("select * from {0} where id in ".format(tbl_name), ids),
+                                  ids])
+        for i in ids:
+            tbl.pop(i, None)
+        tbl.update({r['id']: r for r in rows})
+
+    @classmethod
+    def Discard(cls, kind, ids):
+        for i in ids:
+            cls.TBL_MAP[kind][0].pop(i, None)
+
+    @classmethod
+    def Patch(cls, kind, rowid, **kwargs):
+        row = cls.TBL_MAP[kind][0].get(rowid)
+        if row is not None:
+            row.update(kwargs)
+
+    @classmethod
+    async def Rows(cls, kind, ids=None):
+        """
+        :param kind: 'sensor' or 'switch'
+        :param ids: None for all rows
+        :return: copies of rows, unknown ids are looked up in db
+        """
+        if not cls.stats['loaded']:
+            await cls.Load()
+        tbl = cls.TBL_MAP[kind][0]
+        if ids is None:
+            cls.stats['hits'] += 1
+            return [dict(r) for r in tbl.values()]
+        missing = [i for i in ids if i not in tbl]
+        cls.stats['hits'] += len(ids) - len(missing)
+        if len(missing) > 0:
+            cls.stats['misses'] += len(missing)
+            await cls.Reload(kind, missing)
+        return [dict(tbl[i]) for i in ids if i in tbl]
+
+    @classmethod
+    async def Sensors(cls, sensorids=None):
+        return [models.Sensor.FromRow(r) for r in await cls.Rows('sensor', sensorids)]
+
+    @classmethod
+    def Switches(cls, switchids=None):
+        return cls.Rows('switch', switchids)
+
+    @classmethod
+    async def CheckConsistency(cls, repair=False):
+        """
+        :param repair: reload the registry when it differs from db
+        :return: {'sensor'/'switch': {'missing': ids only in db, 'extra': ids only in registry,
+                  'stale': ids with different rows}}
+        """
+        result = {}
+        for name, (tbl, tbl_name) in cls.TBL_MAP.items():
+            rows = await BizDB.Query(["select * from {0}".format(tbl_name), []])
+            db_tbl = {r['id']: r for r in rows}
+            result[name] = {'missing': [i for i in db_tbl if i not in tbl],
+                            'extra': [i for i in tbl if i not in db_tbl],
+                            'stale': [i for i in db_tbl if i in tbl and tbl[i] != db_tbl[i]]}
+            if repair and any(result[name].values()):
+                tbl.clear()
+                tbl.update(db_tbl)
+        return result
 
 
 class Sensor:
+    func_tbl = {}  # sensorid -> (func_body, compiled func or None if it needs redis)
+
     @classmethod
     async def Add(cls, sensor_tbl):
         mdl = models.Sensor.BeforeAdd(sensor_tbl)
         await BizDB.Interaction([models.Sensor.DynInsert(mdl, False)])
+        await Registry.Reload('sensor', [mdl['id']])
         return mdl['id']
 
     @classmethod
-    def Update(cls, sensor_tbl):
+    async def Update(cls, sensor_tbl):
         mdl = models.Sensor.BeforeSet(sensor_tbl)
-        return BizDB.Interaction([models.Sensor.DynUpdate(mdl, False)])
+        await BizDB.Interaction([models.Sensor.DynUpdate(mdl, False)])
+        await Registry.Reload('sensor', [mdl['id']])
+        cls.func_tbl.pop(mdl['id'], None)
+
+    @classmethod
+    async def Remove(cls, sensorids):
+        sensorids = sensorids if isinstance(sensorids, list) else [sensorids]
+        await BizDB.Interaction(models.Sensor.SqlRows_Remove(sensorids))
+        Registry.Discard('sensor', sensorids)
+        for sensorid in sensorids:
+            cls.func_tbl.pop(sensorid, None)
 
     @classmethod
-    def Remove(cls, sensorids):
-        return BizDB.Interaction(models.Sensor.SqlRows_Remove(sensorids))
+    def GetFunc(cls, sensor):
+        """
+        compile sensor func_body once, recompiled when func_body changes
+        :param sensor: models.Sensor
+        :return: func(argv) or None if func_body must be evaluated by redis
+        """
+        entry = cls.func_tbl.get(sensor['id'])
+        if entry is None or entry[0] != sensor['func_body']:
+            try:
+                func = rg_lib.LuaLite.Compile(sensor['func_body'])
+            except rg_lib.LuaLite.Unsupported as e:
+                log.msg("sensor {0} func_body evaluated by redis: {1}".format(sensor['id'], e))
+                func = None
+            entry = (sensor['func_body'], func)
+            cls.func_tbl[sensor['id']] = entry
+        return entry[1]
 
     @classmethod
     async def Query(cls, sql_row):
@@ -122,22 +346,27 @@ class Sensor:
         return rows[0] if rows else None
 
     @classmethod
-    def ById(cls, sensorid):
-        return cls.Get(["""select r1.* from rgw_sensor r1 where r1.id=?""", (sensorid,)])
+    async def ById(cls, sensorid):
+        rows = await Registry.Sensors([sensorid])
+        return rows[0] if rows else None
 
     @classmethod
     def SqlRows_UpdateVal(cls, sensors):
         return [["update rgw_sensor set val=?, uts=? where id=?", (i['val'], i['uts'], i['id'])] for i in sensors]
 
     @classmethod
-    def UpdateVal(cls, sensors):
-        return BizDB.Interaction(cls.SqlRows_UpdateVal(sensors))
+    async def UpdateVal(cls, sensors):
+        res = await BizDB.BulkInteraction(rg_lib.Sqlite.GroupSqlRows(cls.SqlRows_UpdateVal(sensors)))
+        for i in sensors:
+            Registry.Patch('sensor', i['id'], val=i['val'], uts=i['uts'])
+        return res
 
     @classmethod
-    def UpdateName(cls, sensorid, name, tag):
+    async def UpdateName(cls, sensorid, name, tag):
         sql_str = """update rgw_sensor set name=?, tag=? where id=?"""
         sql_args = [name, tag, sensorid]
-        return BizDB.Interaction([[sql_str, sql_args]])
+        await BizDB.Interaction([[sql_str, sql_args]])
+        Registry.Patch('sensor', sensorid, name=name, tag=tag)
 
     @classmethod
     def Search(cls, para):
@@ -156,16 +385,20 @@ class Sensor:
 
 class Switch:
     @classmethod
-    def Add(cls, switch_mdl):
-        return BizDB.Interaction([models.Switch.DynInsert(switch_mdl)])
+    async def Add(cls, switch_mdl):
+        await BizDB.Interaction([models.Switch.DynInsert(switch_mdl)])
+        await Registry.Reload('switch', [switch_mdl['id']])
 
     @classmethod
-    def Update(cls, switch_tbl):
-        return BizDB.Interaction([models.Switch.DynUpdate(switch_tbl)])
+    async def Update(cls, switch_tbl):
+        await BizDB.Interaction([models.Switch.DynUpdate(switch_tbl)])
+        await Registry.Reload('switch', [switch_tbl['id']])
 
     @classmethod
-    def Remove(cls, rowids):
-        return BizDB.Interaction(models.Switch.SqlRows_Remove(rowids))
+    async def Remove(cls, rowids):
+        rowids = rowids if isinstance(rowids, list) else [rowids]
+        await BizDB.Interaction(models.Switch.SqlRows_Remove(rowids))
+        Registry.Discard('switch', rowids)
 
     @classmethod
     async def Query(cls, sql_row):
@@ -177,17 +410,20 @@ class Switch:
         return rows[0] if rows else None
 
     @classmethod
-    def UpdateName(cls, switchid, name, tag):
+    async def UpdateName(cls, switchid, name, tag):
         sql_str = """update rgw_switch set name=?, tag=? where id=?"""
         sql_args = [name, tag, switchid]
-        return BizDB.Interaction([[sql_str, sql_args]])
+        await BizDB.Interaction([[sql_str, sql_args]])
+        Registry.Patch('switch', switchid, name=name, tag=tag)
 
     @classmethod
-    def UpdateUts(cls, switchids, uts):
+    async def UpdateUts(cls, switchids, uts):
         if not isinstance(switchids, list):
             switchids = [switchids]
         sql_rows = [["update rgw_switch set uts=? where id=?", [uts, sid]] for sid in switchids]
-        return BizDB.Interaction(sql_rows)
+        await BizDB.Interaction(sql_rows)
+        for sid in switchids:
+            Registry.Patch('switch', sid, uts=uts)
 
     @classmethod
     def Search(cls, para):
@@ -330,8 +566,119 @@ class PageKite:
             cls.manager.StartBackend(tbl['pagekite_frontend'], services)
 
 
+class TriggerIndex:
+    """
+    in process copy of the sensor triggers with their conditions and switches, indexed
+    by sensorid and refreshed by SensorTrigger.Upsert and Remove. the active window
+    boundaries of all triggers form a sorted timeline, the active set is only
+    recomputed when the current ts crosses one of them
+    """
+    trigger_tbl = {}  # triggerid -> trigger mdl with 'sensors': [{sensorid, op, rval}], 'switches': [rows],
+    # 'cond': compiled conditions
+
+    sensor_tbl = {}  # sensorid -> set of triggerids
+
+    timeline = []  # sorted distinct start_ts/stop_ts
+
+    active = {'key': None, 'ids': set()}  # timeline position the active ids were computed at
+
+    stats = {'loads': 0, 'loaded': False, 'evaluated': 0, 'skipped': 0}
+
+    @classmethod
+    async def Load(cls, triggerids=None):
+        """
+        :param triggerids: None for all triggers
+        """
+        sql_rows = [["select * from rgw_sensor_trigger", []],
+                    ["select triggerid, sensorid, op, rval from rgw_sensor_trigger_sensor", []],
+                    ["select * from rgw_sensor_trigger_switch", []]]
+        if triggerids is not None:
+            sql_rows = [[rg_lib.Sqlite.GenInSql(sql_rows[0][0] + " where id in ", triggerids), triggerids]] + \
+                       [[rg_lib.Sqlite.GenInSql(r[0] + " where triggerid in ", triggerids), triggerids]
+                        for r in sql_rows[1:]]
+        rows = await SensorTrigger.Query(sql_rows[0])
+        sensor_rows = await BizDB.Query(sql_rows[1])
+        switch_rows = await BizDB.Query(sql_rows[2])
+        if triggerids is None:
+            cls.trigger_tbl.clear()
+        else:
+            cls.Discard(triggerids)
+        for row in rows:
+            row['sensors'], row['switches'] = [], []
+            cls.trigger_tbl[row['id']] = row
+        for r in sensor_rows:
+            if r['triggerid'] in cls.trigger_tbl:
+                cls.trigger_tbl[r['triggerid']]['sensors'].append(r)
+        for r in switch_rows:
+            if r['triggerid'] in cls.trigger_tbl:
+                cls.trigger_tbl[r['triggerid']]['switches'].append(r)
+        for row in rows:
+            try:
+                row['cond'] = models.SensorTrigger.CompileCond(row['sensors'])
+            except rg_lib.RGError:
+                row['cond'] = None
+                log.msg("sensor trigger {0} has unsupported conditions".format(row['id']))
+        cls.Rebuild()
+        cls.stats['loads'] += 1
+        cls.stats['loaded'] = True
+
+    @classmethod
+    def Discard(cls, triggerids):
+        for triggerid in triggerids:
+            cls.trigger_tbl.pop(triggerid, None)
+        cls.Rebuild()
+
+    @classmethod
+    def Rebuild(cls):
+        cls.sensor_tbl.clear()
+        bounds = set()
+        for triggerid, mdl in cls.trigger_tbl.items():
+            for s in mdl['sensors']:
+                cls.sensor_tbl.setdefault(s['sensorid'], set()).add(triggerid)
+            bounds.update([ts_val for ts_val in (mdl['start_ts'], mdl['stop_ts']) if ts_val > 0])
+        cls.timeline[:] = sorted(bounds)
+        cls.active['key'] = None
+
+    @classmethod
+    def IsActive(cls, mdl, ts_val):
+        return (mdl['start_ts'] == 0 or mdl['start_ts'] < ts_val) and (mdl['stop_ts'] == 0 or mdl['stop_ts'] > ts_val)
+
+    @classmethod
+    def Active(cls, ts_val):
+        """
+        :return: set of triggerids active at ts_val
+        """
+        idx = bisect.bisect_right(cls.timeline, ts_val)
+        key = (idx, idx > 0 and cls.timeline[idx - 1] == ts_val)
+        if cls.active['key'] != key:
+            cls.active['ids'] = {i for i, mdl in cls.trigger_tbl.items() if cls.IsActive(mdl, ts_val)}
+            cls.active['key'] = key
+        return cls.active['ids']
+
+    @classmethod
+    async def Affected(cls, sensorids, ts_val):
+        """
+        :param sensorids: sensors with new readings, None for all
+        :param ts_val:
+        :return: active trigger mdls depending on the sensors, ordered by id
+        """
+        if not cls.stats['loaded']:
+            await cls.Load()
+        active = cls.Active(ts_val)
+        if sensorids is None:
+            ids = active
+        else:
+            ids = set()
+            for sensorid in sensorids:
+                ids.update(cls.sensor_tbl.get(sensorid, ()))
+            ids &= active
+        cls.stats['evaluated'] += len(ids)
+        cls.stats['skipped'] += len(active) - len(ids)
+        return [cls.trigger_tbl[i] for i in sorted(ids)]
+
+
 class SensorTrigger:
-    mem_db = rg_lib.Sqlite.MakeMemoryConn()
+    interval_keys = rg_lib.ExpiringKeys()  # check intervals of fired triggers, mirrored to redis
 
     @classmethod
     async def Remove(cls, rowids):
@@ -351,6 +698,7 @@ class SensorTrigger:
             ])
             await cls.RemoveCheckInterval(rowid)
         await BizDB.Interaction(sql_rows)
+        TriggerIndex.Discard(rowids)
 
     @classmethod
     async def Query(cls, sql_row):
@@ -362,17 +710,51 @@ class SensorTrigger:
         return [models.SensorTrigger.FromRow(r) for r in rows]
 
     @classmethod
-    def SetCheckInterval(cls, mdl):
+    def WriteThrough(cls, cmd, *args, **kwargs):
+        """
+        mirror a check interval change to redis without waiting, the in process keys stay
+        authoritative and a failed write is only logged
+        """
+        try:
+            d = getattr(BizDB.redis_conn, cmd)(*args, **kwargs)
+            d.addErrback(log.err)
+        except Exception:
+            log.err()
+
+    @classmethod
+    async def LoadCheckIntervals(cls):
+        """
+        restore the check intervals kept in redis, called at startup
+        """
+        cls.interval_keys.Clear()
+        try:
+            cursor = 0
+            while True:
+                cursor, keys = await BizDB.redis_conn.scan(cursor, rgw_consts.Keys.SENSOR_TRIGGER_INTERVAL.format('*'))
+                for key in keys:
+                    ttl = await BizDB.redis_conn.ttl(key)
+                    if ttl > 0:
+                        cls.interval_keys.Set(key, ttl)
+                if int(cursor) == 0:
+                    break
+        except Exception:
+            log.err()
+
+    @classmethod
+    async def SetCheckInterval(cls, mdl):
         key = rgw_consts.Keys.SENSOR_TRIGGER_INTERVAL.format(mdl['id'])
-        return BizDB.redis_conn.set(key, 0, expire=mdl['check_interval'] * 60)
+        cls.interval_keys.Set(key, mdl['check_interval'] * 60)
+        cls.WriteThrough('set', key, 0, expire=mdl['check_interval'] * 60)
 
     @classmethod
-    def RemoveCheckInterval(cls, rowid):
-        return BizDB.redis_conn.delete(rgw_consts.Keys.SENSOR_TRIGGER_INTERVAL.format(rowid))
+    async def RemoveCheckInterval(cls, rowid):
+        key = rgw_consts.Keys.SENSOR_TRIGGER_INTERVAL.format(rowid)
+        cls.interval_keys.Delete(key)
+        cls.WriteThrough('delete', key)
 
     @classmethod
     async def InCheckInterval(cls, rowid):
-        return await BizDB.redis_conn.exists(rgw_consts.Keys.SENSOR_TRIGGER_INTERVAL.format(rowid)) > 0
+        return cls.interval_keys.Has(rgw_consts.Keys.SENSOR_TRIGGER_INTERVAL.format(rowid))
 
     @classmethod
     def __Add(cls, conn_obj, mdl):
@@ -422,8 +804,11 @@ class SensorTrigger:
 
     @classmethod
     async def Upsert(cls, mdl):
+        models.SensorTrigger.CompileCond(mdl['sensors'])
         rowid = await rg_lib.Sqlite.RunWithConn(BizDB.db_pool, cls.__Upsert, mdl)
         await cls.RemoveCheckInterval(rowid)
+        if TriggerIndex.stats['loaded']:
+            await TriggerIndex.Load([rowid])
         return rowid
 
     @classmethod
@@ -447,12 +832,6 @@ class SensorTrigger:
         else:
             return None
 
-    @classmethod
-    def Eval(cls, expr, args):
-        iter_obj = cls.mem_db.execute("select {0}".format(expr), tuple(args))
-        for i in iter_obj:
-            return i[0]
-
 
 class TriggerLog:
     @classmethod
@@ -461,13 +840,8 @@ class TriggerLog:
         :param trigger_log: models.TriggerLog or list of models.TriggerLog
         :return:
         """
-        sql_rows = []
-        if isinstance(trigger_log, list):
-            for mdl in trigger_log:
-                sql_rows.append(models.TriggerLog.DynInsert(mdl, True))
-        else:
-            sql_rows.append(models.TriggerLog.DynInsert(trigger_log, True))
-        return LogDB.Interaction(sql_rows)
+        mdls = trigger_log if isinstance(trigger_log, list) else [trigger_log]
+        return LogDB.BulkInteraction(models.TriggerLog.DynInsertMany(mdls, True))
 
     @classmethod
     def GetLatest(cls, count):
@@ -476,10 +850,18 @@ class TriggerLog:
         return LogDB.Query([sql_str, sql_args])
 
     @classmethod
-    def RemoveTTL(cls, ts_val):
-        return LogDB.Interaction([
-            ["delete from rgw_trigger_log where cts < ?", (ts_val,)]
+    async def RemoveTTL(cls, ts_val, limit):
+        """
+        :param ts_val:
+        :param limit: max rows deleted
+        :return: deleted rows
+        """
+        rows = await LogDB.Interaction([
+            ["""delete from rgw_trigger_log where rowid in
+                  (select rowid from rgw_trigger_log where cts < ? limit ?)""", (ts_val, limit)],
+            ["select changes() deleted", []]
         ])
+        return rows[0]['deleted']
 
 
 
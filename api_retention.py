@@ -0,0 +1,71 @@
+"""
+ttl deletion in bounded batches, each batch is a short write transaction
+and the reactor serves other requests between batches
+"""
+import rg_lib
+import settings
+
+progress_tbl = {}  # job name -> progress of the latest run
+
+vacuum_tbl = {}  # db name -> latest incremental vacuum
+
+
+def MakeProgress(name, ttl_ts):
+    return {'name': name, 'ttl_ts': ttl_ts, 'running': True, 'batches': 0, 'deleted': 0,
+            'start_ts': rg_lib.DateTime.ts(), 'stop_ts': None, 'error': None}
+
+
+def IsRunning(name):
+    return (name in progress_tbl) and progress_tbl[name]['running']
+
+
+async def RunChunked(name, remove_func, ttl_ts, limit):
+    """
+    :param name: job name
+    :param remove_func: async func(ttl_ts, limit) -> deleted count
+    :param ttl_ts: records before ttl_ts are removed
+    :param limit: max records per batch
+    :return: progress
+    """
+    if IsRunning(name):
+        return progress_tbl[name]
+    progress = MakeProgress(name, ttl_ts)
+    progress_tbl[name] = progress
+    try:
+        while True:
+            deleted = await remove_func(ttl_ts, limit)
+            progress['batches'] += 1
+            progress['deleted'] += deleted
+            if deleted < limit:
+                break
+            await rg_lib.Twisted.sleep(settings.RETENTION['pause'])
+    except Exception as e:
+        progress['error'] = str(e)
+        raise e
+    finally:
+        progress['running'] = False
+        progress['stop_ts'] = rg_lib.DateTime.ts()
+    return progress
+
+
+async def Vacuum(name, db_cls, pages):
+    """
+    give free pages back to the file system, no effect unless auto_vacuum is incremental
+    :param name: db name
+    :param db_cls: api_core.BizDB or api_core.LogDB
+    :param pages: max pages released
+    :return: released pages
+    """
+    rows = await db_cls.Query(["PRAGMA freelist_count", []])
+    free_pages = rows[0]['freelist_count']
+    released = 0
+    if min(free_pages, pages) > 0:
+        remaining = await db_cls.RunWithConn(rg_lib.Sqlite.IncrementalVacuum, min(free_pages, pages))
+        released = free_pages - remaining
+        free_pages = remaining
+    vacuum_tbl[name] = {'name': name, 'released': released, 'free_pages': free_pages, 'ts': rg_lib.DateTime.ts()}
+    return released
+
+
+def GetProgress():
+    return {'jobs': progress_tbl, 'vacuum': vacuum_tbl}
@@ -1,9 +1,17 @@
 import json
 from twisted.internet import error, defer
+from twisted.python import log
 import treq
 import rg_lib
 import api_core
 import models
+import settings
+
+device_module_tbl = {}  # deviceid -> moduleid, from EM.ListDevice
+
+module_refresh_ts = [0]  # latest reload of device_module_tbl
+
+sem_tbl = {}  # moduleid -> DeferredSemaphore limiting concurrent ReadDevice chunks
 
 
 async def Req(rpc_no, method, params, timeout):
@@ -27,6 +35,38 @@ async def Req(rpc_no, method, params, timeout):
         raise rg_lib.RGError(rg_lib.ErrorType.Timeout())
 
 
+def GetReadCfg(moduleid):
+    """
+    :param moduleid: None for devices of unknown module
+    :return: {chunk_size, concurrency, device_timeout}
+    """
+    cfg = dict(settings.RXG_READ['default'])
+    cfg.update(settings.RXG_READ['modules'].get(moduleid, {}))
+    return cfg
+
+
+def GetSemaphore(moduleid, concurrency):
+    if moduleid not in sem_tbl or sem_tbl[moduleid].limit != concurrency:
+        sem_tbl[moduleid] = defer.DeferredSemaphore(concurrency)
+    return sem_tbl[moduleid]
+
+
+async def LoadDeviceModule(deviceids):
+    """
+    reload the deviceid -> moduleid cache when ids are unknown, at most every module_refresh seconds
+    """
+    curr_ts = rg_lib.DateTime.ts()
+    unknown = [i for i in deviceids if i not in device_module_tbl]
+    if len(unknown) > 0 and curr_ts - module_refresh_ts[0] >= settings.RXG_READ['module_refresh']:
+        module_refresh_ts[0] = curr_ts
+        try:
+            for list_no in ('sensor', 'switch'):
+                devs = await EM.ListDevice(list_no)
+                device_module_tbl.update({dev['id']: dev.get('moduleid') for dev in devs})
+        except rg_lib.RGError:
+            log.err()
+
+
 class ZbModule:
     @classmethod
     async def Req(cls, method, params, timeout):
@@ -123,13 +163,52 @@ class EM:
         """
         return cls.Req('ListDevice', [{'list_no': list_no}], 3)
 
+    @classmethod
+    async def ReadChunk(cls, sem, deviceids, timeout, failed):
+        try:
+            return await sem.run(lambda: defer.ensureDeferred(cls.Req('ReadDevice', [{'deviceids': deviceids}],
+                                                                      timeout)))
+        except Exception as e:
+            log.msg("ReadDevice chunk of {0} devices failed: {1!r}".format(len(deviceids), e))
+            failed.update({deviceid: e for deviceid in deviceids})
+            return []
+
+    @classmethod
+    async def ReadDeviceChunks(cls, deviceids):
+        """
+        ids are grouped by zigbee module and split in chunks, chunks of a module run with
+        bounded concurrency, each with its own timeout, see settings.RXG_READ
+        :param deviceids:
+        :return: (list of devices, {deviceid: error} of failed chunks)
+        """
+        await LoadDeviceModule(deviceids)
+        module_tbl = {}
+        for deviceid in deviceids:
+            module_tbl.setdefault(device_module_tbl.get(deviceid), []).append(deviceid)
+        failed = {}
+        chunk_defers = []
+        for moduleid, ids in module_tbl.items():
+            cfg = GetReadCfg(moduleid)
+            sem = GetSemaphore(moduleid, cfg['concurrency'])
+            for idx in range(0, len(ids), cfg['chunk_size']):
+                chunk = ids[idx:idx + cfg['chunk_size']]
+                chunk_defers.append(defer.ensureDeferred(cls.ReadChunk(sem, chunk,
+                                                                       (len(chunk) + 1) * cfg['device_timeout'],
+                                                                       failed)))
+        devs = []
+        for chunk in await defer.gatherResults(chunk_defers, consumeErrors=True):
+            devs.extend(chunk)
+        return devs, failed
+
     @classmethod
     async def ReadDevice(cls, deviceids, valid_vals_only):
         """
         :param deviceids:
-        :return: list of devices
+        :return: list of devices, partial if some chunks failed, raise RGError if all failed
         """
-        devs = await cls.Req('ReadDevice', [{'deviceids': deviceids}], (len(deviceids) + 1) * 100)
+        devs, failed = await cls.ReadDeviceChunks(deviceids)
+        if len(failed) > 0 and len(failed) >= len(set(deviceids)):
+            raise next(iter(failed.values()))
         if valid_vals_only:
             return [dev for dev in devs if models.XYDevice.ValsNotEmpty(dev)]
         else:
@@ -1,103 +1,290 @@
+import heapq
+import collections
 from twisted.python import log
 import rg_lib
 import rgw_consts
 import api_core
 import api_sensor_data
+import api_sensor_filter
+import api_sensor_ring
 import api_switch_action
 import api_rxg
 import models
+import settings
 
+poll_heap = []  # (due_ts, deviceid)
 
-def ListSensor():
-    sql_str = """select r1.id id, 
-                        r1.extra_arg0 extra_arg0,
-                        r1.deviceid deviceid,
-                        r1.val_offset val_offset,
-                        r1.data_no data_no,
-                         COALESCE(r1.func_body,'') func_body
-                  from rgw_sensor r1"""
-    return api_core.BizDB.Query([sql_str, []])
+poll_tbl = {}  # deviceid -> {'interval', 'due_ts', 'empty_reads', 'reads'}
+
+last_reading_tbl = {}  # deviceid -> (ts, vals) of the latest ingested reading, polled or pushed
+
+ingest_stats = {source: {'batches': 0, 'readings': 0, 'duplicates': 0, 'unknown': 0, 'stale': 0, 'last_ts': None}
+                for source in ('poll', 'push')}
+
+ingest_window = collections.deque()  # (ts, readings) of the last minute
+
+
+async def ListSensor():
+    sensors = await api_core.Registry.Rows('sensor')
+    return [{'id': s['id'], 'extra_arg0': s['extra_arg0'], 'deviceid': s['deviceid'], 'val_offset': s['val_offset'],
+             'data_no': s['data_no'], 'func_body': s['func_body'] or ''} for s in sensors]
+
+
+def GetInterval(deviceid, data_nos):
+    """
+    :param deviceid:
+    :param data_nos: data_no of the device sensors
+    :return: seconds between reads, the device cfg overrides the fastest data_no
+    """
+    cfg = settings.SENSOR_SCAN
+    if deviceid in cfg['devices']:
+        return cfg['devices'][deviceid]
+    return min([cfg['data_no'].get(no, cfg['interval']) for no in data_nos] or [cfg['interval']])
+
+
+def SchedulePoll(deviceid, interval, due_ts):
+    if deviceid not in poll_tbl:
+        poll_tbl[deviceid] = {'interval': interval, 'due_ts': due_ts, 'empty_reads': 0, 'reads': 0}
+        heapq.heappush(poll_heap, (due_ts, deviceid))
+    else:
+        poll_tbl[deviceid]['interval'] = interval
+
+
+def PopDue(curr_ts, dev_tbl):
+    """
+    :param curr_ts:
+    :param dev_tbl: {deviceid: sensors}, devices not in it are dropped
+    :return: due deviceids
+    """
+    result = []
+    while len(poll_heap) > 0 and poll_heap[0][0] <= curr_ts:
+        _, deviceid = heapq.heappop(poll_heap)
+        if deviceid not in dev_tbl:
+            poll_tbl.pop(deviceid, None)
+        elif poll_tbl[deviceid]['due_ts'] > curr_ts:
+            heapq.heappush(poll_heap, (poll_tbl[deviceid]['due_ts'], deviceid))  # pushed reading deferred it
+        else:
+            result.append(deviceid)
+    return result
+
+
+def Reschedule(deviceid, curr_ts, has_vals):
+    """
+    back off exponentially while the device returns no values
+    """
+    state = poll_tbl[deviceid]
+    state['reads'] += 1
+    state['empty_reads'] = 0 if has_vals else state['empty_reads'] + 1
+    delay = state['interval'] * (2 ** min(state['empty_reads'], 16))
+    state['due_ts'] = curr_ts + min(delay, max(settings.SENSOR_SCAN['max_backoff'], state['interval']))
+    heapq.heappush(poll_heap, (state['due_ts'], deviceid))
+
+
+async def ReadDue(deviceids, curr_ts):
+    """
+    :return: {deviceid: device with vals}
+    """
+    result, failed = {}, None
+    try:
+        devs, failed = await api_rxg.EM.ReadDeviceChunks(deviceids)
+        result = {dev['id']: dev for dev in devs if models.XYDevice.ValsNotEmpty(dev)}
+    finally:
+        # popped ids are always pushed back, a failed read is retried after one interval
+        for deviceid in deviceids:
+            if failed is None or deviceid in failed:
+                poll_tbl[deviceid]['due_ts'] = curr_ts + poll_tbl[deviceid]['interval']
+                heapq.heappush(poll_heap, (poll_tbl[deviceid]['due_ts'], deviceid))
+            else:
+                Reschedule(deviceid, curr_ts, deviceid in result)
+    return result
+
+
+async def GetSensorTbl():
+    """
+    :return: {deviceid: [sensor,...]}
+    """
+    sensor_tbl = {}
+    for sensor in await ListSensor():
+        sensor_tbl.setdefault(sensor['deviceid'], []).append(sensor)
+    return sensor_tbl
+
+
+def IsDuplicate(deviceid, ts_val, vals):
+    """
+    a reading not newer than the latest one of the device, or the same vals within
+    INGEST['dedup_secs'] (a push and a poll of one reading), is a duplicate
+    """
+    if deviceid in last_reading_tbl:
+        last_ts, last_vals = last_reading_tbl[deviceid]
+        if ts_val <= last_ts or (vals == last_vals and ts_val - last_ts < settings.INGEST['dedup_secs']):
+            return True
+    last_reading_tbl[deviceid] = (ts_val, vals)
+    return False
+
+
+def RecordIngest(source, readings, duplicates, unknown, stale, curr_ts):
+    stats = ingest_stats[source]
+    stats['batches'] += 1
+    stats['readings'] += readings
+    stats['duplicates'] += duplicates
+    stats['unknown'] += unknown
+    stats['stale'] += stale
+    stats['last_ts'] = curr_ts
+    ingest_window.append((curr_ts, readings))
+    while len(ingest_window) > 0 and ingest_window[0][0] <= curr_ts - 60:
+        ingest_window.popleft()
+
+
+def GetIngestStats():
+    """
+    :return: {'poll': {batches, readings, duplicates, unknown, stale, last_ts}, 'push': {...}, 'readings_per_min'}
+    """
+    curr_ts = rg_lib.DateTime.ts()
+    res = {source: dict(stats) for source, stats in ingest_stats.items()}
+    res['readings_per_min'] = sum(n for ts_val, n in ingest_window if ts_val > curr_ts - 60)
+    return res
+
+
+async def IngestDevices(devs, source, sensor_tbl=None):
+    """
+    shared path of polled and pushed readings: dedup, func_body transform, UpdateVal,
+    sensor data insert and trigger evaluation
+    :param devs: [{'id': deviceid, 'vals': [...], 'ts': optional reading ts}]
+    :param source: 'poll' or 'push'
+    :param sensor_tbl: {deviceid: [sensor,...]}, loaded if None
+    :return: {'readings', 'duplicates', 'unknown', 'stale'}, readings older than INGEST['max_age'] are stale
+    """
+    curr_ts = rg_lib.DateTime.ts()
+    if sensor_tbl is None:
+        sensor_tbl = await GetSensorTbl()
+    ready_sensors = []
+    duplicates, unknown, stale = 0, 0, 0
+    for dev in devs:
+        if dev['id'] not in sensor_tbl:
+            unknown += 1
+            continue
+        ts_val = curr_ts if dev.get('ts') is None else min(int(dev['ts']), curr_ts)
+        if ts_val < curr_ts - settings.INGEST['max_age']:
+            stale += 1
+            continue
+        if IsDuplicate(dev['id'], ts_val, dev['vals']):
+            duplicates += 1
+            continue
+        state = poll_tbl.get(dev['id'])
+        if source == 'push' and state:
+            state['due_ts'] = max(state['due_ts'], ts_val + state['interval'])
+        for sensor in sensor_tbl[dev['id']]:
+            if len(dev['vals']) > sensor['val_offset']:
+                sensor = dict(sensor)
+                sensor['val'] = dev['vals'][sensor['val_offset']]
+                sensor['uts'] = ts_val
+                if state:
+                    sensor['scan_interval'] = state['interval']
+                ready_sensors.append(sensor)
+    readings = len(devs) - duplicates - unknown - stale
+    RecordIngest(source, readings, duplicates, unknown, stale, curr_ts)
+    if len(ready_sensors) > 0:
+        await EvalFuncBody(ready_sensors)
+        api_sensor_ring.Add(ready_sensors)
+        await api_core.Sensor.UpdateVal(ready_sensors)
+        sensor_data_list = api_sensor_filter.Filter(ready_sensors)
+        if len(sensor_data_list) > 0:
+            await api_sensor_data.Add(sensor_data_list)
+        await HandleSensorTrigger([s['id'] for s in ready_sensors])
+    return {'readings': readings, 'duplicates': duplicates, 'unknown': unknown, 'stale': stale}
 
 
 async def ScanSensor():
+    """
+    read the devices whose poll is due, called every SENSOR_SCAN['tick'] seconds
+    """
     try:
-        ready_sensors = []
-        sensors = await ListSensor()
-        sensorids = [s['id'] for s in sensors]
-        devs = await api_rxg.EM.GetSensorVal(sensorids)
         curr_ts = rg_lib.DateTime.ts()
-        dev_tbl = {i['id']: i for i in devs}
-        for sensor in sensors:
-            if sensor['deviceid'] in dev_tbl:
-                dev = dev_tbl[sensor['deviceid']]
-                if len(dev['vals']) > sensor['val_offset']:
-                    sensor['val'] = dev['vals'][sensor['val_offset']]
-                    sensor['uts'] = curr_ts
-                    if models.Sensor.HasFuncBody(sensor):
-                        argv = [sensor['val'], sensor['extra_arg0']] if models.Sensor.HasExtraArg0(sensor) else [
-                            sensor['val']]
-                        bytes_obj = await rg_lib.TxRedis.Eval(api_core.BizDB.redis_conn,
-                                                              sensor['func_body'],
-                                                              args=argv)
-                        if bytes_obj:
-                            sensor['val'] = float(bytes_obj)
-                    ready_sensors.append(sensor)
-        if len(ready_sensors) > 0:
-            await api_core.Sensor.UpdateVal(ready_sensors)
-            sensor_data_list = [models.SensorData.Sync(s) for s in ready_sensors]
-            await api_sensor_data.Add(sensor_data_list)
-        await HandleSensorTrigger()
+        # the registry is in memory, devices added since the last tick are due at once
+        sensor_tbl = await GetSensorTbl()
+        for deviceid, dev_sensors in sensor_tbl.items():
+            SchedulePoll(deviceid, GetInterval(deviceid, [s['data_no'] for s in dev_sensors]), curr_ts)
+        if len(poll_heap) < 1 or poll_heap[0][0] > curr_ts:
+            return
+        dev_tbl = await ReadDue(PopDue(curr_ts, sensor_tbl), curr_ts)
+        if len(dev_tbl) > 0:
+            await IngestDevices(list(dev_tbl.values()), 'poll', sensor_tbl)
     except Exception as e:
         log.err()
 
 
-async def HandleSensorTrigger():
+async def EvalFuncBody(sensors):
+    """
+    transform raw vals by sensor func_body in one pass, scripts out of the
+    supported lua subset or failing locally are sent to redis EVAL,
+    a result of 0 or nil keeps the raw val
+    :param sensors: models.Sensor with raw val
+    :return:
+    """
+    remote = []
+    for sensor in sensors:
+        if models.Sensor.HasFuncBody(sensor):
+            argv = [sensor['val'], sensor['extra_arg0']] if models.Sensor.HasExtraArg0(sensor) else [sensor['val']]
+            func = api_core.Sensor.GetFunc(sensor)
+            if func is None:
+                remote.append((sensor, argv))
+                continue
+            try:
+                res = func(argv)
+            except rg_lib.LuaLite.RuntimeErr:
+                remote.append((sensor, argv))
+                continue
+            if res:
+                sensor['val'] = float(res)
+    for sensor, argv in remote:
+        bytes_obj = await rg_lib.TxRedis.Eval(api_core.BizDB.redis_conn, sensor['func_body'], args=argv)
+        if bytes_obj:
+            sensor['val'] = float(bytes_obj)
+
+
+async def HandleSensorTrigger(sensorids=None):
+    """
+    :param sensorids: sensors with new readings, only the active triggers depending on them
+                      are evaluated, None for all active triggers
+    """
     curr_ts = rg_lib.DateTime.ts()
-    sql_str = """select * from rgw_sensor_trigger
-                  where ((start_ts=0 and stop_ts=0) or 
-                        (start_ts>0 and stop_ts=0 and start_ts<?) or
-                        (start_ts=0 and stop_ts>0 and stop_ts>?) or
-                        (start_ts>0 and stop_ts>0 and start_ts<? and stop_ts>?))"""
+    triggers = await api_core.TriggerIndex.Affected(sensorids, curr_ts)
+    if len(triggers) < 1:
+        return
+    val_tbl = await GetTriggerInputs(triggers)
+    for trigger_mdl in [t for t in triggers if models.SensorTrigger.EvalCond(t['cond'], val_tbl)]:
+        await __HandleTriggerHelper(curr_ts, trigger_mdl)
+
 
-    sql_args = [curr_ts, curr_ts, curr_ts, curr_ts]
-    rows = await api_core.SensorTrigger.Query([sql_str, sql_args])
-    if len(rows) > 0:
-        for row in rows:
-            await __HandleTriggerHelper(curr_ts, row)
+async def GetTriggerInputs(triggers):
+    """
+    :return: {sensorid: latest avg} of the sensors the triggers depend on
+    """
+    sensorids = {s['sensorid'] for t in triggers for s in t['sensors']}
+    rows = await api_sensor_data.GetLatestAvgMany(sorted(sensorids))
+    return {sensorid: row['avg_val'] for sensorid, row in rows.items()}
 
 
 async def __HandleTriggerHelper(ts, trigger_mdl):
-    sensor_infos = await api_core.BizDB.Query(["""select sensorid, op,rval 
-                                               from rgw_sensor_trigger_sensor
-                                               where triggerid=?""",
-                                               (trigger_mdl['id'],)])
-    if len(sensor_infos) < 1:
-        return False
-    expr_args = []
-    for s in sensor_infos:
-        row = await api_sensor_data.GetLatestAvg(s['sensorid'])
-        if row:
-            expr_args.append((s['op'], row['avg_val'], s['rval']))
-    if len(expr_args) == len(sensor_infos):
-        sql, sql_args = models.SensorTrigger.GenAndExpr(expr_args)
-        res = api_core.SensorTrigger.Eval(sql, sql_args)
-        if res > 0:
-            has_valid_interval = await api_core.SensorTrigger.InCheckInterval(trigger_mdl['id'])
-            if not has_valid_interval:
-                switch_infos = await api_core.SensorTrigger.Query(["""select * from rgw_sensor_trigger_switch
-                                                                  where triggerid=?""", (trigger_mdl['id'],)])
-                on_switches = [s for s in switch_infos if s['switchid'] != rgw_consts.PLACEHODER and s['action_no'] == 'ON']
-                off_switchids = [s['switchid'] for s in switch_infos if s['switchid'] != rgw_consts.PLACEHODER and s['action_no'] == 'OFF']
-                if len(on_switches) > 0:
-                    await api_switch_action.Open2({s['switchid']: s['working_seconds'] for s in on_switches},
-                                                  rg_lib.DateTime.utc())
-                if len(off_switchids) > 0:
-                    await api_switch_action.Close(off_switchids)
-                if len(trigger_mdl['message']) > 0:
-                    await api_core.TriggerLog.Add(models.TriggerLog.make(ts, trigger_mdl['id'],
-                                                                         trigger_mdl['message']))
-                await SendEmail(trigger_mdl)
-                await api_core.SensorTrigger.SetCheckInterval(trigger_mdl)
+    """
+    run the actions of a trigger whose conditions hold, unless it is within its check interval.
+    the interval is set before the actions so a concurrent push or poll batch does not fire it twice
+    """
+    has_valid_interval = await api_core.SensorTrigger.InCheckInterval(trigger_mdl['id'])
+    if not has_valid_interval:
+        await api_core.SensorTrigger.SetCheckInterval(trigger_mdl)
+        switch_infos = trigger_mdl['switches']
+        on_switches = [s for s in switch_infos if s['switchid'] != rgw_consts.PLACEHODER and s['action_no'] == 'ON']
+        off_switchids = [s['switchid'] for s in switch_infos if s['switchid'] != rgw_consts.PLACEHODER and s['action_no'] == 'OFF']
+        if len(on_switches) > 0:
+            await api_switch_action.Open2({s['switchid']: s['working_seconds'] for s in on_switches},
+                                          rg_lib.DateTime.utc())
+        if len(off_switchids) > 0:
+            await api_switch_action.Close(off_switchids)
+        if len(trigger_mdl['message']) > 0:
+            await api_core.TriggerLog.Add(models.TriggerLog.make(ts, trigger_mdl['id'],
+                                                                 trigger_mdl['message']))
+        await SendEmail(trigger_mdl)
 
 
 async def ScanSwitch():
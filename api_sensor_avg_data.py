@@ -1,3 +1,5 @@
+import bisect
+import collections
 import models
 import api_core
 import rg_lib
@@ -10,28 +12,204 @@ def Add(sensor_data):
     :param sensor_data: models.SensorAvgData or list of models.SensorData
     :return:
     """
-    sql_rows = []
-    if isinstance(sensor_data, list):
-        for mdl in sensor_data:
-            sql_rows.append(models.SensorAvgData.DynInsert(mdl, True))
-    else:
-        sql_rows.append(models.SensorAvgData.DynInsert(sensor_data, True))
-    return api_core.LogDB.Interaction(sql_rows)
+    mdls = sensor_data if isinstance(sensor_data, list) else [sensor_data]
+    bulk_rows = models.SensorAvgData.DynInsertMany(mdls, True)
+    today_ts = models.SensorData.PartitionDay(rg_lib.DateTime.ts()) * rg_lib.DateTime.DAY_SECONDS
+    late_days = set([models.SensorData.PartitionDay(m['cts']) for m in mdls if m['cts'] < today_ts])
+    if len(late_days) > 0:
+        bulk_rows.append(models.SensorArchive.ReopenDays(late_days))
+    return api_core.LogDB.BulkInteraction(bulk_rows)
 
 
-def QueryMinAvg(start_dt, stop_dt, sensorids, mins_interval, count=10000):
+def QueryLiveMinAvg(start_dt, stop_dt, sensorids, mins_interval, count=10000):
+    """
+    :return: [(cts, avg_val, sensorid),...]
+    """
     sql_str = rg_lib.Sqlite.GenInSql("""with
                                             mins_cte(max_ts,min_ts) as
                                         (select strftime('%s', strftime('%Y-%m-%d %H:%M', min(cts), 'unixepoch', '+{0} minutes')),
                                          min(cts) from rgw_sensor_avg_data where cts>= ? and cts <?
                                          and strftime('%M',cts,'unixepoch')%?=0 group by strftime('%Y-%m-%d %H:%M', cts, 'unixepoch') limit {1})
                                          select cast(strftime('%s', strftime('%Y-%m-%d %H:%M', m1.min_ts, 'unixepoch')) as integer) cts,
-                                         avg(r1.val) avg_val, r1.sensorid, r1.data_no from
+                                         avg(r1.val) avg_val, k1.sensorid from
                                          rgw_sensor_avg_data r1 inner join mins_cte m1 on
-                                         (r1.cts>=m1.min_ts and r1.cts<m1.max_ts) where r1.sensorid in
+                                         (r1.cts>=m1.min_ts and r1.cts<m1.max_ts)
+                                         inner join rgw_sensor_key k1 on r1.sensor_key=k1.sensor_key
+                                         where k1.sensorid in
                   """.format(mins_interval, count), sensorids)
-    sql_str += """ group by strftime('%Y-%m-%d %H:%M', m1.min_ts, 'unixepoch'),r1.sensorid limit {0}""".format(
+    sql_str += """ group by strftime('%Y-%m-%d %H:%M', m1.min_ts, 'unixepoch'),r1.sensor_key limit {0}""".format(
         count)
     sql_args = [rg_lib.DateTime.dt2ts(start_dt),
                 rg_lib.DateTime.dt2ts(stop_dt), mins_interval] + sensorids
-    return api_core.LogDB.Query([sql_str, sql_args])
+    return api_core.LogDB.QueryTuples([sql_str, sql_args])
+
+
+async def GetKeyTbl(sensorids):
+    """
+    :param sensorids:
+    :return: {sensor_key: sensorid}
+    """
+    rows = await api_core.LogDB.Query(models.SensorKey.QuerySql(sensorids))
+    return {r['sensor_key']: r['sensorid'] for r in rows}
+
+
+def GetBuckets(cts_vals, mins_interval):
+    """
+    same buckets as mins_cte of QueryLiveMinAvg, one per minute of the hour aligned to mins_interval
+    which has rows, from its first row until mins_interval minutes after that minute
+    :param cts_vals: sorted
+    :param mins_interval:
+    :return: sorted [(min_ts, max_ts),...]
+    """
+    first_tbl = {}
+    for cts in cts_vals:
+        minute = int(cts) - int(cts) % 60
+        if minute // 60 % 60 % mins_interval == 0 and minute not in first_tbl:
+            first_tbl[minute] = cts
+    return sorted([(first_tbl[m], m + mins_interval * 60) for m in first_tbl])
+
+
+async def QueryArchiveMinAvg(start_ts, stop_ts, sensorids, mins_interval, count=10000):
+    """
+    :return: [(cts, avg_val, sensorid),...]
+    """
+    key_tbl = await GetKeyTbl(sensorids)
+    if len(key_tbl) < 1:
+        return []
+    keys = list(key_tbl.keys())
+    sql_str = rg_lib.Sqlite.GenInSql("""select sensor_key, day, data from rgw_sensor_archive
+                                        where day>=? and day<=? and sensor_key in """, keys)
+    # like the live query the last bucket takes its rows past stop_ts
+    rows = await api_core.LogDB.QueryTuples([sql_str, [models.SensorData.PartitionDay(start_ts),
+                                                       models.SensorData.PartitionDay(stop_ts - 1 + mins_interval * 60)] + keys])
+    rows_tbl = collections.defaultdict(dict)
+    for sensor_key, day, data in rows:
+        rows_tbl[sensor_key].update(models.SensorArchive.Unpack(day, data))
+    # stop_ts may be where the live rows start
+    sql_str = rg_lib.Sqlite.GenInSql("""select sensor_key, cts, val from rgw_sensor_avg_data
+                                        where cts>=? and cts<? and sensor_key in """, keys)
+    rows = await api_core.LogDB.QueryTuples([sql_str, [stop_ts, stop_ts + mins_interval * 60] + keys])
+    for sensor_key, cts, val in rows:
+        rows_tbl[sensor_key][cts] = val
+    # the live query finds the buckets over all sensors, the archived rows of the given ones stand in for them
+    buckets = GetBuckets(sorted(set([cts for pairs in rows_tbl.values() for cts in pairs
+                                     if start_ts <= cts < stop_ts])), mins_interval)
+    starts = [b[0] for b in buckets]
+    vals_tbl = collections.defaultdict(list)
+    for sensor_key, pairs in rows_tbl.items():
+        for cts, val in pairs.items():
+            idx = bisect.bisect_right(starts, cts) - 1
+            while idx >= 0 and cts < buckets[idx][1]:
+                vals_tbl[(starts[idx] - starts[idx] % 60, sensor_key)].append(val)
+                idx -= 1
+    order_tbl = {sid: idx for idx, sid in enumerate(sensorids)}
+    result = [(k[0], sum(v) / len(v), key_tbl[k[1]]) for k, v in vals_tbl.items()]
+    result.sort(key=lambda r: (r[0], order_tbl.get(r[2], 0)))
+    return result[:count]
+
+
+async def QueryMinAvgRows(start_dt, stop_dt, sensorids, mins_interval, count=10000):
+    """
+    ranges older than the live table are served from rgw_sensor_archive
+    :param start_dt:
+    :param stop_dt:
+    :param sensorids:
+    :param mins_interval:
+    :param count:
+    :return: [(cts, avg_val, sensorid),...]
+    """
+    start_ts, stop_ts = rg_lib.DateTime.dt2ts(start_dt), rg_lib.DateTime.dt2ts(stop_dt)
+    rows = await api_core.LogDB.Query(["select min(cts) min_cts from rgw_sensor_avg_data", []])
+    live_ts = stop_ts if rows[0]['min_cts'] is None else rows[0]['min_cts']
+    if start_ts < live_ts:
+        # the oldest live day is partly deleted once it has been archived
+        live_day = models.SensorData.PartitionDay(live_ts)
+        archived = await api_core.LogDB.Query(["select 1 from rgw_sensor_archive_day where day=?", [live_day]])
+        if len(archived) > 0:
+            live_ts = (live_day + 1) * rg_lib.DateTime.DAY_SECONDS
+        result = await QueryArchiveMinAvg(start_ts, min(stop_ts, live_ts), sensorids, mins_interval, count)
+    else:
+        result = []
+    if live_ts < stop_ts and len(result) < count:
+        result.extend(await QueryLiveMinAvg(max(start_ts, live_ts), stop_ts, sensorids, mins_interval,
+                                            count - len(result)))
+    return result
+
+
+async def QueryMinAvg(start_dt, stop_dt, sensorids, mins_interval, count=10000):
+    """
+    :return: [{cts, avg_val, sensorid},...]
+    """
+    rows = await QueryMinAvgRows(start_dt, stop_dt, sensorids, mins_interval, count)
+    return [{'cts': r[0], 'avg_val': r[1], 'sensorid': r[2]} for r in rows]
+
+
+async def ArchiveDay(day):
+    """
+    pack one utc day of rgw_sensor_avg_data into rgw_sensor_archive and record the day,
+    rows archived before are kept since their live rows may be deleted already
+    :param day: models.SensorData.PartitionDay
+    :return: archived sensors
+    """
+    start_ts = day * rg_lib.DateTime.DAY_SECONDS
+    rows = await api_core.LogDB.QueryTuples(["""select sensor_key, cts, val from rgw_sensor_avg_data
+                                                where cts>=? and cts<?""",
+                                             [start_ts, start_ts + rg_lib.DateTime.DAY_SECONDS]])
+    archived = await api_core.LogDB.QueryTuples(["select sensor_key, data from rgw_sensor_archive where day=?", [day]])
+    rows_tbl = collections.defaultdict(dict)
+    for sensor_key, data in archived:
+        rows_tbl[sensor_key].update(models.SensorArchive.Unpack(day, data))
+    for sensor_key, cts, val in rows:
+        rows_tbl[sensor_key][cts] = val
+    data_tbl = {k: models.SensorArchive.Pack(day, v.items()) for k, v in rows_tbl.items()}
+    await api_core.LogDB.BulkInteraction(models.SensorArchive.DynInsertMany(day, data_tbl))
+    return len(data_tbl)
+
+
+async def Archive(ts_val):
+    """
+    archive the days which end before ts_val and are not archived yet, days with late rows
+    are reopened by Add and archived again, must run before RemoveTTL
+    :param ts_val:
+    :return: archived days
+    """
+    rows = await api_core.LogDB.Query(["select min(cts) min_cts from rgw_sensor_avg_data", []])
+    if rows[0]['min_cts'] is None:
+        return []
+    first_day = models.SensorData.PartitionDay(rows[0]['min_cts'])
+    rows = await api_core.LogDB.Query(["select day from rgw_sensor_archive_day where day>=?", [first_day]])
+    archived = set([r['day'] for r in rows])
+    days = [d for d in range(first_day, models.SensorData.PartitionDay(ts_val)) if d not in archived]
+    for day in days:
+        await ArchiveDay(day)
+    return days
+
+
+async def RemoveTTL(ts_val, limit):
+    """
+    :param ts_val:
+    :param limit: max rows deleted
+    :return: deleted rows
+    """
+    rows = await api_core.LogDB.Interaction([
+        ["""delete from rgw_sensor_avg_data where (sensor_key, cts) in
+              (select sensor_key, cts from rgw_sensor_avg_data where cts < ? limit ?)""", (ts_val, limit)],
+        ["select changes() deleted", []]
+    ])
+    return rows[0]['deleted']
+
+
+async def RemoveArchiveTTL(ts_val, limit):
+    """
+    :param ts_val:
+    :param limit: max sensor days deleted
+    :return: deleted sensor days
+    """
+    day = models.SensorData.PartitionDay(ts_val)
+    rows = await api_core.LogDB.Interaction([
+        ["delete from rgw_sensor_archive_day where day < ?", (day,)],
+        ["""delete from rgw_sensor_archive where rowid in
+              (select rowid from rgw_sensor_archive where day < ? limit ?)""", (day, limit)],
+        ["select changes() deleted", []]
+    ])
+    return rows[0]['deleted']
@@ -1,20 +1,71 @@
 import models
 import api_core
+import api_sensor_filter
+import api_sensor_ring
+import settings
 import rg_lib
 
+partition_days = set()
 
-def Add(sensor_data):
+sensor_keys = {}  # sensorid -> sensor_key, keys never change once assigned
+
+MANY_CHUNK = 900  # sensor keys per grouped query, below the 999 host parameters of older sqlite builds
+
+
+async def Init():
+    rows = await api_core.LogDB.Query(models.SensorData.ListPartitionSql())
+    days = [models.SensorData.PartitionDayOf(r['name']) for r in rows]
+    partition_days.clear()
+    partition_days.update([d for d in days if d is not None])
+    rows = await api_core.LogDB.Query(models.SensorKey.QuerySql())
+    sensor_keys.clear()
+    sensor_keys.update({r['sensorid']: r['sensor_key'] for r in rows})
+
+
+async def GetKey(sensorid):
+    """
+    :param sensorid:
+    :return: sensor_key, None if sensorid never logged
+    """
+    if sensorid not in sensor_keys:
+        rows = await api_core.LogDB.Query(models.SensorKey.QuerySql([sensorid]))
+        if len(rows) < 1:
+            return None
+        sensor_keys[sensorid] = rows[0]['sensor_key']
+    return sensor_keys[sensorid]
+
+
+async def GetKeys(sensorids):
+    """
+    :param sensorids:
+    :return: {sensorid: sensor_key} of the sensorids ever logged
+    """
+    missing = [sid for sid in sensorids if sid not in sensor_keys]
+    if len(missing) > 0:
+        rows = await api_core.LogDB.Query(models.SensorKey.QuerySql(missing))
+        sensor_keys.update({r['sensorid']: r['sensor_key'] for r in rows})
+    return {sid: sensor_keys[sid] for sid in sensorids if sid in sensor_keys}
+
+
+def GetSource(start_ts, stop_ts):
+    """
+    :param start_ts:
+    :param stop_ts: exclusive
+    :return: partition table or union all sub query covering the range, None if no data
+    """
+    days = range(models.SensorData.PartitionDay(start_ts), models.SensorData.PartitionDay(stop_ts - 1) + 1)
+    return models.SensorData.GenSource([d for d in days if d in partition_days])
+
+
+async def Add(sensor_data):
     """
     :param sensor_data: models.SensorData or list of models.SensorData
     :return:
     """
-    sql_rows = []
-    if isinstance(sensor_data, list):
-        for mdl in sensor_data:
-            sql_rows.append(models.SensorData.DynInsert(mdl, True))
-    else:
-        sql_rows.append(models.SensorData.DynInsert(sensor_data, True))
-    return api_core.LogDB.Interaction(sql_rows)
+    mdls = sensor_data if isinstance(sensor_data, list) else [sensor_data]
+    res = await api_core.LogDB.BulkInteraction(models.SensorData.DynInsertMany(mdls, True))
+    partition_days.update([models.SensorData.PartitionDay(mdl['cts']) for mdl in mdls])
+    return res
 
 
 async def GetMinAvg(start_dt, stop_dt, sensorid, exclude_max_min):
@@ -27,42 +78,180 @@ async def GetMinAvg(start_dt, stop_dt, sensorid, exclude_max_min):
     :return:
     """
     start_ts, stop_ts = rg_lib.DateTime.dt2ts(start_dt), rg_lib.DateTime.dt2ts(stop_dt)
-    if exclude_max_min:
-        sql_str = """with max_min_cte(sensorid, cts, val) as 
-                      (select r1.sensorid, r1.cts, max(r1.val) 
-                       from rgw_sensor_data r1
-                       where r1.sensorid=? and r1.cts>=? and r1.cts<? UNION 
-                       select r1.sensorid, r1.cts, min(r1.val) 
-                       from rgw_sensor_data r1
-                       where r1.sensorid=? and r1.cts>=? and r1.cts<?)
-
-                       select cast(strftime('%s', strftime('%Y-%m-%d %H:%M', r1.cts, 'unixepoch')) as integer) cts,
-                              avg(r1.val) avg_val, r1.sensorid, r1.data_no 
-                       from rgw_sensor_data r1
-                       where r1.sensorid =? and r1.cts>=? and r1.cts<? and r1.cts not in (select cts from max_min_cte) 
-                  """
-        sql_args = [sensorid, start_ts,stop_ts,
-                    sensorid, start_ts, stop_ts,
-                    sensorid, start_ts, stop_ts]
-    else:
-        sql_str = """select cast(strftime('%s', strftime('%Y-%m-%d %H:%M', r1.cts, 'unixepoch')) as integer) cts,
-                            avg(r1.val) avg_val, r1.sensorid, r1.data_no 
-                     from rgw_sensor_data r1
-                     where r1.sensorid =? and r1.cts>=? and r1.cts<?"""
-        sql_args = [sensorid, start_ts, stop_ts]
-    rows = await api_core.LogDB.Query([sql_str, sql_args])
-    if len(rows) > 0:
-        return rows[0] if (rows[0]['avg_val'] is not None) else None
+    cfg = api_sensor_filter.IsFiltered(sensorid)
+    if cfg:
+        return await GetFilteredMinAvg(cfg, start_ts, stop_ts, sensorid, exclude_max_min)
+    src = GetSource(start_ts, stop_ts)
+    sensor_key = await GetKey(sensorid)
+    if src is None or sensor_key is None:
+        return None
+    rows = await api_core.LogDB.Query(models.SensorData.MinAvgSql(src, sensor_key, start_ts, stop_ts, exclude_max_min))
+    if len(rows) > 0 and rows[0]['avg_val'] is not None:
+        rows[0]['sensorid'] = sensorid
+        return rows[0]
     else:
         return None
 
 
+async def GetMinAvgMany(start_dt, stop_dt, sensorids, exclude_max_min):
+    """
+    GetMinAvg of many sensors, the unfiltered ones share one grouped query, the stored
+    rows of the filtered ones are fetched in one query and rebuilt in process
+    :param start_dt:
+    :param stop_dt:
+    :param sensorids:
+    :param exclude_max_min:
+    :return: {sensorid: {cts, avg_val, sensorid}}, sensors without data are left out
+    """
+    start_ts, stop_ts = rg_lib.DateTime.dt2ts(start_dt), rg_lib.DateTime.dt2ts(stop_dt)
+    result = {}
+    cfg_tbl = {}
+    plain_ids = []
+    for sensorid in sensorids:
+        cfg = api_sensor_filter.IsFiltered(sensorid)
+        if cfg:
+            cfg_tbl[sensorid] = cfg
+        else:
+            plain_ids.append(sensorid)
+    if len(cfg_tbl) > 0:
+        result.update(await GetFilteredMinAvgMany(cfg_tbl, start_ts, stop_ts, exclude_max_min))
+    src = GetSource(start_ts, stop_ts)
+    if src is None or len(plain_ids) < 1:
+        return result
+    key_tbl = {sensor_key: sensorid for sensorid, sensor_key in (await GetKeys(plain_ids)).items()}
+    keys = list(key_tbl.keys())
+    for idx in range(0, len(keys), MANY_CHUNK):
+        rows = await api_core.LogDB.Query(models.SensorData.MinAvgManySql(src, keys[idx:idx + MANY_CHUNK],
+                                                                          start_ts, stop_ts, exclude_max_min))
+        for row in rows:
+            if row['avg_val'] is not None:
+                sensorid = key_tbl[row.pop('sensor_key')]
+                row['sensorid'] = sensorid
+                result[sensorid] = row
+    return result
+
+
+def FilteredMinAvg(cfg, start_ts, stop_ts, sensorid, points, exclude_max_min):
+    """
+    readings suppressed by api_sensor_filter are rebuilt from the stored rows around
+    the range and the unstored latest reading
+    :param points: sorted [(cts, val)] stored in [start_ts - max_interval, stop_ts + max_interval)
+    """
+    tail = api_sensor_filter.GetTail(sensorid)
+    if tail and (len(points) < 1 or tail[0] > points[-1][0]):
+        points.append(tail)
+    res = api_sensor_filter.MinAvg(api_sensor_filter.Reconstruct(cfg, api_sensor_filter.GetInterval(sensorid),
+                                                                 points, start_ts, stop_ts), exclude_max_min)
+    return {'cts': res[0], 'avg_val': res[1], 'sensorid': sensorid} if res else None
+
+
+async def GetFilteredMinAvg(cfg, start_ts, stop_ts, sensorid, exclude_max_min):
+    res = await GetFilteredMinAvgMany({sensorid: cfg}, start_ts, stop_ts, exclude_max_min)
+    return res.get(sensorid)
+
+
+async def GetFilteredMinAvgMany(cfg_tbl, start_ts, stop_ts, exclude_max_min):
+    """
+    :param cfg_tbl: {sensorid: filter cfg}
+    :return: {sensorid: {cts, avg_val, sensorid}}, the stored rows of all sensors come from one query
+    """
+    max_interval = max(cfg['max_interval'] for cfg in cfg_tbl.values())
+    src = GetSource(start_ts - max_interval, stop_ts + max_interval)
+    key_tbl = {sensor_key: sensorid for sensorid, sensor_key in (await GetKeys(list(cfg_tbl.keys()))).items()}
+    points_tbl = {sensorid: [] for sensorid in cfg_tbl}
+    keys = list(key_tbl.keys())
+    if src is not None:
+        for idx in range(0, len(keys), MANY_CHUNK):
+            rows = await api_core.LogDB.QueryTuples(models.SensorData.PointsManySql(
+                src, keys[idx:idx + MANY_CHUNK], start_ts - max_interval, stop_ts + max_interval))
+            for sensor_key, cts, val in rows:
+                sensorid = key_tbl[sensor_key]
+                cfg = cfg_tbl[sensorid]
+                if start_ts - cfg['max_interval'] <= cts < stop_ts + cfg['max_interval']:
+                    points_tbl[sensorid].append((cts, val))
+    result = {}
+    for sensorid, cfg in cfg_tbl.items():
+        row = FilteredMinAvg(cfg, start_ts, stop_ts, sensorid, points_tbl[sensorid], exclude_max_min)
+        if row:
+            result[sensorid] = row
+    return result
+
+
+async def InitRing():
+    """
+    rebuild api_sensor_ring from the rows of the last SENSOR_RING['span'] seconds,
+    filtered sensors get their reconstructed readings
+    """
+    curr_ts = rg_lib.DateTime.ts()
+    start_ts = curr_ts - settings.SENSOR_RING['span']
+    api_sensor_ring.Clear(start_ts)
+    lookback = max([cfg['max_interval'] for cfg in api_sensor_filter.cfg_tbl.values() if cfg] or [0])
+    src = GetSource(start_ts - lookback, curr_ts + 1)
+    if src is None:
+        return
+    sql_str = "select sensor_key, cts, val from {0} r1 where r1.cts>=? and r1.cts<=? order by sensor_key, cts".format(src)
+    rows = await api_core.LogDB.QueryTuples([sql_str, [start_ts - lookback, curr_ts]])
+    key_tbl = {sensor_key: sensorid for sensorid, sensor_key in sensor_keys.items()}
+    points_tbl = {}
+    for sensor_key, cts, val in rows:
+        if sensor_key in key_tbl:
+            points_tbl.setdefault(key_tbl[sensor_key], []).append((cts, val))
+    for sensorid, points in points_tbl.items():
+        cfg = api_sensor_filter.IsFiltered(sensorid)
+        if cfg:
+            points = api_sensor_filter.Reconstruct(cfg, api_sensor_filter.GetInterval(sensorid),
+                                                   points, start_ts, curr_ts + 1)
+        for cts, val in points:
+            if cts >= start_ts and val is not None:
+                api_sensor_ring.Push(sensorid, cts, val)
+
+
 async def GetLatestAvg(sensorid):
+    res = await GetLatestAvgMany([sensorid])
+    return res.get(sensorid)
+
+
+def LatestSpan(sensorid):
+    """
+    :return: seconds back from now averaged for the latest value, one minute or one poll
+             interval plus a scan tick for sensors read less often
+    """
+    return max(60, api_sensor_filter.GetInterval(sensorid) + settings.SENSOR_SCAN['tick'])
+
+
+async def GetLatestAvgMany(sensorids):
+    """
+    average of the latest readings, see LatestSpan, from api_sensor_ring, sensors not covered
+    by it share one grouped query per span
+    :param sensorids:
+    :return: {sensorid: {cts, avg_val, sensorid}}, sensors without data are left out
+    """
     curr_ts = rg_lib.DateTime.ts()
-    return await GetMinAvg(curr_ts - 60, curr_ts, sensorid, False)
+    result = {}
+    misses = {}  # span -> sensorids
+    for sensorid in sensorids:
+        span = LatestSpan(sensorid)
+        samples = api_sensor_ring.Window(sensorid, curr_ts - span, curr_ts + 1)
+        if samples is None:
+            misses.setdefault(span, []).append(sensorid)
+            continue
+        res = api_sensor_filter.MinAvg(samples, False)
+        if res:
+            result[sensorid] = {'cts': res[0], 'avg_val': res[1], 'sensorid': sensorid}
+    for span, ids in misses.items():
+        result.update(await GetMinAvgMany(curr_ts - span, curr_ts + 1, ids, False))
+    return result
 
 
-def RemoveTTL(ts_val):
-    return api_core.LogDB.Interaction([
-        ["delete from rgw_sensor_data where cts < ?", (ts_val,)]
-    ])
+async def RemoveTTL(ts_val, limit):
+    """
+    drop the day partitions which end before ts_val, oldest first
+    :param ts_val:
+    :param limit: max partitions dropped
+    :return: dropped partitions
+    """
+    days = sorted([d for d in partition_days if (d + 1) * rg_lib.DateTime.DAY_SECONDS <= ts_val])[:limit]
+    if len(days) > 0:
+        partition_days.difference_update(days)
+        await api_core.LogDB.Interaction([[models.SensorData.DropPartition(d), []] for d in days])
+    return len(days)
@@ -0,0 +1,213 @@
+"""
+storage filter between sensor scan and rgw_sensor_data, readings within the
+deadband (or inside the swinging door) are not written. a row is still written
+after max_interval seconds as heartbeat. suppressed readings are rebuilt on read,
+see Reconstruct
+"""
+import math
+import models
+import api_core
+import settings
+
+MODES = ('abs', 'pct', 'swinging_door')
+
+cfg_tbl = {}  # sensorid -> filter cfg, None if not filtered
+
+state_tbl = {}  # sensorid -> {'kept': (cts, val), 'last': (cts, val), 'snapshot', 'upper', 'lower'}
+
+stats_tbl = {}  # sensorid -> {'received', 'stored', 'suppressed', 'heartbeat'}
+
+interval_tbl = {}  # sensorid -> seconds between readings
+
+
+def GetCfg(sensorid, data_no):
+    """
+    :param sensorid:
+    :param data_no:
+    :return: {mode, dev, max_interval} or None, sensor cfg overrides data_no cfg
+    """
+    cfg = settings.SENSOR_FILTER['sensors'].get(sensorid,
+                                                settings.SENSOR_FILTER['data_no'].get(data_no,
+                                                                                      settings.SENSOR_FILTER['default']))
+    return cfg if cfg and cfg['mode'] in MODES else None
+
+
+async def Init():
+    rows = await api_core.Registry.Rows('sensor')
+    cfg_tbl.clear()
+    cfg_tbl.update({r['id']: GetCfg(r['id'], r['data_no']) for r in rows})
+    state_tbl.clear()
+
+
+def IsFiltered(sensorid):
+    """
+    :return: filter cfg or None
+    """
+    return cfg_tbl.get(sensorid, None)
+
+
+def GetInterval(sensorid):
+    """
+    :return: seconds between readings of the sensor
+    """
+    return interval_tbl.get(sensorid, settings.SENSOR_SCAN['interval'])
+
+
+def GetTail(sensorid):
+    """
+    :return: (cts, val) of the latest reading whether stored or not, None if unknown
+    """
+    return state_tbl[sensorid]['last'] if sensorid in state_tbl else None
+
+
+def GetStats(sensorid):
+    if sensorid not in stats_tbl:
+        stats_tbl[sensorid] = {'received': 0, 'stored': 0, 'suppressed': 0, 'heartbeat': 0}
+    return stats_tbl[sensorid]
+
+
+def ResetDoor(state, cts, val):
+    state['kept'] = (cts, val)
+    state['snapshot'] = None
+    state['upper'] = math.inf
+    state['lower'] = -math.inf
+
+
+def Deadband(cfg, state, cts, val):
+    """
+    :return: list of (cts, val) to be stored
+    """
+    kept_val = state['kept'][1]
+    dev = cfg['dev'] if cfg['mode'] == 'abs' else abs(kept_val) * cfg['dev'] / 100
+    if abs(val - kept_val) > dev:
+        ResetDoor(state, cts, val)
+        return [(cts, val)]
+    return []
+
+
+def DoorPoint(state, cts):
+    """
+    point at cts on the middle line of the open door
+    """
+    kept_ts, kept_val = state['kept']
+    return cts, kept_val + (state['upper'] + state['lower']) / 2 * (cts - kept_ts)
+
+
+def SwingingDoor(cfg, state, cts, val):
+    """
+    the door opens at the kept point and narrows with every reading, when no line
+    from the kept point stays within dev of all readings, the point of the last
+    open door at the previous reading is stored and the door restarts there,
+    so interpolating stored points never misses a reading by more than dev
+    :return: list of (cts, val) to be stored
+    """
+    kept_ts, kept_val = state['kept']
+    if cts <= kept_ts:
+        return []
+    upper = min(state['upper'], (val + cfg['dev'] - kept_val) / (cts - kept_ts))
+    lower = max(state['lower'], (val - cfg['dev'] - kept_val) / (cts - kept_ts))
+    if lower <= upper:
+        state['upper'], state['lower'], state['snapshot'] = upper, lower, (cts, val)
+        return []
+    point = DoorPoint(state, state['snapshot'][0])
+    ResetDoor(state, point[0], point[1])
+    state['upper'] = (val + cfg['dev'] - point[1]) / (cts - point[0])
+    state['lower'] = (val - cfg['dev'] - point[1]) / (cts - point[0])
+    state['snapshot'] = (cts, val)
+    return [point]
+
+
+def FilterOne(sensorid, cfg, cts, val):
+    """
+    :return: list of (cts, val) to be stored
+    """
+    stats = GetStats(sensorid)
+    stats['received'] += 1
+    state = state_tbl.get(sensorid, None)
+    if cfg is None or state is None or val is None:
+        result = [(cts, val)]
+        state = state_tbl.setdefault(sensorid, {})
+        ResetDoor(state, cts, val)
+    elif cfg['mode'] == 'swinging_door':
+        result = SwingingDoor(cfg, state, cts, val)
+        if cts - state['kept'][0] >= cfg['max_interval']:
+            stats['heartbeat'] += 1
+            point = DoorPoint(state, cts)
+            ResetDoor(state, point[0], point[1])
+            result.append(point)
+    elif cts - state['kept'][0] >= cfg['max_interval']:
+        stats['heartbeat'] += 1
+        result = [(cts, val)]
+        ResetDoor(state, cts, val)
+    else:
+        result = Deadband(cfg, state, cts, val)
+    state['last'] = (cts, val)
+    stats['stored'] += len(result)
+    stats['suppressed'] = stats['received'] - stats['stored']
+    return result
+
+
+def Filter(sensors):
+    """
+    :param sensors: models.Sensor with val, uts, data_no
+    :return: [models.SensorData] to be stored
+    """
+    result = []
+    for sensor in sensors:
+        cfg = GetCfg(sensor['id'], sensor['data_no']) if 'data_no' in sensor else cfg_tbl.get(sensor['id'])
+        cfg_tbl[sensor['id']] = cfg
+        if 'scan_interval' in sensor:
+            interval_tbl[sensor['id']] = sensor['scan_interval']
+        for cts, val in FilterOne(sensor['id'], cfg, sensor['uts'], sensor['val']):
+            mdl = models.SensorData.make(cts)
+            mdl['sensorid'] = sensor['id']
+            mdl['val'] = val
+            result.append(mdl)
+    return result
+
+
+def Reconstruct(cfg, interval, points, start_ts, stop_ts):
+    """
+    rebuild the scanned readings between stored points: deadband holds the stored val,
+    swinging door interpolates, readings are spaced by the scan interval and
+    stop max_interval after a stored point (the sensor was offline after that)
+    :param cfg: filter cfg
+    :param interval: seconds between readings
+    :param points: sorted [(cts, val)] stored rows plus the unstored tail
+    :param start_ts:
+    :param stop_ts: exclusive
+    :return: [(cts, val)] in [start_ts, stop_ts)
+    """
+    samples = []
+    for idx, (cts, val) in enumerate(points):
+        if start_ts <= cts < stop_ts:
+            samples.append((cts, val))
+        nxt = points[idx + 1] if idx + 1 < len(points) else None
+        end_ts = min(cts + cfg['max_interval'], stop_ts)
+        if nxt is not None:
+            end_ts = min(end_ts, nxt[0] - interval / 2)
+        k = max(1, math.ceil((start_ts - cts) / interval))
+        while cts + k * interval < end_ts:
+            ts_val = cts + k * interval
+            if cfg['mode'] == 'swinging_door' and nxt is not None:
+                samples.append((ts_val, val + (nxt[1] - val) * (ts_val - cts) / (nxt[0] - cts)))
+            else:
+                samples.append((ts_val, val))
+            k += 1
+    return samples
+
+
+def MinAvg(samples, exclude_max_min):
+    """
+    same result as api_sensor_data.GetMinAvg sql
+    :param samples: sorted [(cts, val)]
+    :param exclude_max_min:
+    :return: (minute cts, avg_val) or None
+    """
+    if exclude_max_min and len(samples) > 0:
+        excluded = {max(samples, key=lambda s: s[1])[0], min(samples, key=lambda s: s[1])[0]}
+        samples = [s for s in samples if s[0] not in excluded]
+    if len(samples) < 1:
+        return None
+    cts = int(samples[0][0])
+    return cts - cts % 60, sum(s[1] for s in samples) / len(samples)
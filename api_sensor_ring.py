@@ -0,0 +1,107 @@
+"""
+fixed size ring of the latest (ts, val) readings per sensor, filled by ingestion and
+rebuilt from the log table at startup (api_sensor_data.InitRing), so triggers and live
+views read recent values without querying rgw_sensor_data
+"""
+import array
+import settings
+
+ring_tbl = {}  # sensorid -> {'ts': array, 'val': array, 'head': next write idx, 'count', 'since'}
+
+stats = {'hits': 0, 'misses': 0}
+
+loaded_ts = None  # readings since this ts are all in the rings, None before InitRing
+
+
+def MakeRing(since):
+    capacity = settings.SENSOR_RING['capacity']
+    return {'ts': array.array('d', [0.0]) * capacity, 'val': array.array('d', [0.0]) * capacity,
+            'head': 0, 'count': 0, 'since': since}
+
+
+def Clear(since):
+    global loaded_ts
+    ring_tbl.clear()
+    loaded_ts = since
+
+
+def Push(sensorid, ts_val, val):
+    """
+    readings not newer than the latest one of the sensor are ignored
+    """
+    ring = ring_tbl.get(sensorid)
+    if ring is None:
+        ring = ring_tbl[sensorid] = MakeRing(ts_val if loaded_ts is None else loaded_ts)
+    capacity = len(ring['ts'])
+    if ring['count'] > 0 and ts_val <= ring['ts'][(ring['head'] - 1) % capacity]:
+        return
+    ring['ts'][ring['head']] = ts_val
+    ring['val'][ring['head']] = val
+    ring['head'] = (ring['head'] + 1) % capacity
+    if ring['count'] < capacity:
+        ring['count'] += 1
+    else:
+        ring['since'] = max(ring['since'], ring['ts'][ring['head']])
+
+
+def Add(sensors):
+    """
+    :param sensors: [sensor with id, uts, val], non numeric vals are skipped
+    """
+    for sensor in sensors:
+        try:
+            Push(sensor['id'], sensor['uts'], float(sensor['val']))
+        except (TypeError, ValueError):
+            pass
+
+
+def Latest(sensorid):
+    """
+    :return: (ts, val) or None
+    """
+    ring = ring_tbl.get(sensorid)
+    if ring is None or ring['count'] < 1:
+        return None
+    idx = (ring['head'] - 1) % len(ring['ts'])
+    return ring['ts'][idx], ring['val'][idx]
+
+
+def Window(sensorid, start_ts, stop_ts):
+    """
+    :param sensorid:
+    :param start_ts:
+    :param stop_ts: exclusive
+    :return: sorted [(ts, val)] in [start_ts, stop_ts), None if the ring does not hold every reading since start_ts
+    """
+    ring = ring_tbl.get(sensorid)
+    since = ring['since'] if ring else loaded_ts
+    if since is None or start_ts < since:
+        stats['misses'] += 1
+        return None
+    stats['hits'] += 1
+    if ring is None:
+        return []
+    capacity = len(ring['ts'])
+    samples = []
+    for k in range(1, ring['count'] + 1):
+        idx = (ring['head'] - k) % capacity
+        ts_val = ring['ts'][idx]
+        if ts_val < start_ts:
+            break
+        if ts_val < stop_ts:
+            samples.append((ts_val, ring['val'][idx]))
+    samples.reverse()
+    return samples
+
+
+def Summary(sensorid, start_ts, stop_ts):
+    """
+    :return: {'count', 'avg_val', 'min_val', 'max_val'} of [start_ts, stop_ts), None if not in the ring
+    """
+    samples = Window(sensorid, start_ts, stop_ts)
+    if samples is None:
+        return None
+    vals = [s[1] for s in samples]
+    if len(vals) < 1:
+        return {'count': 0, 'avg_val': None, 'min_val': None, 'max_val': None}
+    return {'count': len(vals), 'avg_val': sum(vals) / len(vals), 'min_val': min(vals), 'max_val': max(vals)}
@@ -127,8 +127,7 @@ async def UpdateNextStep(switchid, dt_obj):
 
 
 async def DoAction(dt_obj):
-    sql_str = "select id from rgw_switch"
-    switches = await api_core.BizDB.Query([sql_str, []])
+    switches = await api_core.Registry.Switches()
     for i in switches:
         try:
             await Acquire(i['id'])
@@ -161,23 +160,24 @@ async def GetSuccOn(switchid):
 
 
 async def AutoSync():
-    sql_str = "select id from rgw_switch"
     sql_str1 = "select switchid, op_status from rgw_switch_action where switchid=?"
-    switches = await api_core.BizDB.Query([sql_str, []])
+    switches = await api_core.Registry.Switches()
     validids = []
+    devs, failed = await api_rxg.EM.ReadDeviceChunks([i['id'] for i in switches])
+    dev_tbl = {dev['id']: dev for dev in devs if models.XYDevice.ValsNotEmpty(dev)}
     for i in switches:
-        dev_mdls = await api_rxg.EM.ReadDevice([i['id']], True)
-        if len(dev_mdls) > 0:
+        if i['id'] in dev_tbl:
+            dev_mdl = dev_tbl[i['id']]
             validids.append(i['id'])
             try:
                 await Acquire(i['id'])
                 row = await api_core.BizDB.Get([sql_str1, [i['id']]])
                 if row:
                     if row['op_status'] == 1:
-                        if dev_mdls[0]['vals'][0] == models.SwitchAction.OFF:
-                            await api_rxg.EM.OpenSwitch(dev_mdls[0]['id'])
+                        if dev_mdl['vals'][0] == models.SwitchAction.OFF:
+                            await api_rxg.EM.OpenSwitch(dev_mdl['id'])
                 else:
-                    if dev_mdls[0]['vals'][0] == models.SwitchAction.ON:
+                    if dev_mdl['vals'][0] == models.SwitchAction.ON:
                         await api_rxg.EM.CloseSwitch(i['id'])
             finally:
                 Release(i['id'])
@@ -48,14 +48,24 @@ def Remove(sql_rows):
     return api_core.BizDB.Interaction(sql_rows)
 
 
-def RemoveTTL(ts_val):
-    return api_core.BizDB.Interaction([
+async def RemoveTTL(ts_val, limit):
+    """
+    :param ts_val:
+    :param limit: max schedules deleted
+    :return: deleted schedules
+    """
+    rows = await api_core.BizDB.Interaction([
         ["""delete from rgw_switch_schedule_switch 
-                 where scheduleid in (select id from rgw_switch_schedule where (stop_ts < ?) and (next_run_ts is null))""",
-         (ts_val,)],
-        ["delete from rgw_switch_schedule where (stop_ts < ?) and (next_run_ts is null)",
-         (ts_val,)]
+                 where scheduleid in (select id from rgw_switch_schedule where (stop_ts < ?) and (next_run_ts is null)
+                                      order by rowid limit ?)""",
+         (ts_val, limit)],
+        ["""delete from rgw_switch_schedule where rowid in
+                 (select rowid from rgw_switch_schedule where (stop_ts < ?) and (next_run_ts is null)
+                  order by rowid limit ?)""",
+         (ts_val, limit)],
+        ["select changes() deleted", []]
     ])
+    return rows[0]['deleted']
 
 
 async def CheckConflict(schedule_mdl):
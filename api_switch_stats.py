@@ -34,7 +34,7 @@ def __OpenSession(session):
 
 
 def AddDuration(duration_mdl):
-    return rg_lib.Sqlite.RunInteraction(api_core.LogDB.db_pool, [models.SwitchOpDuration.DynInsert(duration_mdl, True)])
+    return api_core.LogDB.Interaction([models.SwitchOpDuration.DynInsert(duration_mdl, True)])
 
 
 def __CloseSession(switchid, uts):
@@ -93,16 +93,11 @@ async def HandleOpenSession(session, ts_val):
                 await AddDuration(duration_tbl)
 
 
-def GetSum(start_ts, stop_ts, switchid):
-    def __helper(sqlite_conn):
-        cur = sqlite_conn.cursor()
-        cur.execute("BEGIN")
-        sql_str = """select switchid, sum(val) val from rgw_switch_op_duration
-                     where start_ts>=? and stop_ts<=? and status=? and switchid =?"""
-        cur.execute(sql_str, (start_ts, stop_ts, models.Switch.ON, switchid))
-        for i in cur:
-            return i['val'] if i['val'] else 0
-    return api_core.LogDB.db_pool.runWithConnection(__helper)
+async def GetSum(start_ts, stop_ts, switchid):
+    sql_str = """select sum(val) val from rgw_switch_op_duration
+                 where start_ts>=? and stop_ts<=? and status=? and switchid =?"""
+    rows = await api_core.LogDB.QueryTuples([sql_str, (start_ts, stop_ts, models.Switch.ON, switchid)])
+    return rows[0][0] if rows[0][0] else 0
 
 
 async def GetMonthlyUsage(year, month, switchid, tz_obj):
@@ -133,28 +128,18 @@ async def GetDetail(switchid, start, stop):
     """
 
     def Prediate(arg1, arg2):
-        return arg1['start_ts'] == arg2['stop_ts']
+        return arg1[0] == arg2[1]
 
     def MergeGroup(group):
-        if len(group) == 1:
-            return models.SwitchOpDuration.make(group[0]['start_ts'],
-                                                group[0]['stop_ts'], group[0]['switchid'],
-                                                'ON', (group[0]['stop_ts'] - group[0]['start_ts']))
-        else:
-            return models.SwitchOpDuration.make(group[0]['start_ts'],
-                                                group[-1]['stop_ts'], group[0]['switchid'],
-                                                'ON', (group[-1]['stop_ts'] - group[0]['start_ts']))
-
-    def __helper(sqlite_conn):
-        sqlite_conn.execute("BEGIN")
-        sql_str = """select * from rgw_switch_op_duration where start_ts>=? and stop_ts<=? and 
-                          switchid=? and status=?"""
-        sql_args = [rg_lib.DateTime.dt2ts(start), rg_lib.DateTime.dt2ts(stop), switchid, 'ON']
-        return [rg_lib.Sqlite.FilterRow(i) for i in sqlite_conn.execute(sql_str, tuple(sql_args))]
-
-    rows = await api_core.LogDB.db_pool.runWithConnection(__helper)
-    result = {"recs": rows}
-    grps = rg_lib.Collect.Grouping(result['recs'], Prediate)
+        return models.SwitchOpDuration.make(group[0][0], group[-1][1], switchid,
+                                            'ON', (group[-1][1] - group[0][0]))
+
+    sql_str = """select start_ts, stop_ts from rgw_switch_op_duration where start_ts>=? and stop_ts<=? and 
+                      switchid=? and status=?"""
+    sql_args = [rg_lib.DateTime.dt2ts(start), rg_lib.DateTime.dt2ts(stop), switchid, 'ON']
+    rows = await api_core.LogDB.QueryTuples([sql_str, sql_args])
+    result = {}
+    grps = rg_lib.Collect.Grouping(rows, Prediate)
     result['recs'] = [MergeGroup(grp) for grp in grps if len(grp) > 0]
     result['total_val'] = sum([i['val'] for i in result['recs']])
     return result
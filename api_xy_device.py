@@ -26,6 +26,8 @@ async def SyncSensor():
     sql_args = [d['id'] for d in devs]
     sql_rows.append([sql_str, sql_args])
     await api_core.BizDB.Interaction(sql_rows)
+    await api_core.Registry.Load('sensor')
+    api_core.Sensor.func_tbl.clear()
 
 
 async def SyncSwitch():
@@ -39,6 +41,7 @@ async def SyncSwitch():
     sql_args = [d['id'] for d in devs]
     sql_rows.append([sql_str, sql_args])
     await api_core.BizDB.Interaction(sql_rows)
+    await api_core.Registry.Load('switch')
 
 
 def GenSwitch(switches, devices):
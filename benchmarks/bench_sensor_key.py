@@ -0,0 +1,87 @@
+"""
+bytes per row and range scan speed of sensor data keyed by sensorid text vs sensor_key,
+run from the project root: python -m benchmarks.bench_sensor_key
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import timeit
+import rg_lib
+import models
+
+TEXT_FIELDS = [
+    {'name': 'sensorid', 'type': 'varchar(64) not null'},
+    {'name': 'cts', 'type': 'datetime not null'},
+    {'name': 'data_no', 'type': 'varchar(64) not null'},
+    {'name': 'val', 'type': 'double not null'},
+]
+
+
+def SensorIds(sensor_count):
+    return ['00124b0018e1f2a{0}_0'.format(i) for i in range(sensor_count)]
+
+
+def FillText(conn_obj, sensorids, start_ts, rows_per_sensor):
+    conn_obj.execute(rg_lib.Sqlite.CreateTable('sensor_data', TEXT_FIELDS, 'PRIMARY key(sensorid, cts)'))
+    conn_obj.executemany("insert into sensor_data(sensorid, cts, data_no, val) values(?,?,?,?)",
+                         ((sid, start_ts + i * 60, 'temperature', 20.5 + i % 7)
+                          for i in range(rows_per_sensor) for sid in sensorids))
+
+
+def FillKey(conn_obj, sensorids, start_ts, rows_per_sensor):
+    models.SensorKey.Init(conn_obj)
+    conn_obj.execute(rg_lib.Sqlite.CreateTable('sensor_data', models.SensorData.TBL_FIELDS,
+                                               'PRIMARY key(sensor_key, cts)', 'WITHOUT ROWID'))
+    sql_row = models.SensorKey.AddMany(sensorids)
+    conn_obj.executemany(sql_row[0], sql_row[1])
+    keys = {r[1]: r[0] for r in conn_obj.execute(models.SensorKey.QuerySql()[0])}
+    conn_obj.executemany("insert into sensor_data(sensor_key, cts, val) values(?,?,?)",
+                         ((keys[sid], start_ts + i * 60, 20.5 + i % 7)
+                          for i in range(rows_per_sensor) for sid in sensorids))
+    return keys
+
+
+def FileSize(conn_obj):
+    page_count = conn_obj.execute("pragma page_count").fetchone()[0]
+    page_size = conn_obj.execute("pragma page_size").fetchone()[0]
+    return page_count * page_size
+
+
+def BenchScan(label, conn_obj, sql_str, args_seq, repeat):
+    def Run():
+        for args in args_seq:
+            conn_obj.execute(sql_str, args).fetchall()
+    best = min(timeit.repeat(Run, number=1, repeat=repeat))
+    print("{0:<28}{1:>10.1f} us/query".format(label, best * 1e6 / len(args_seq)))
+
+
+def main(sensor_count=200, rows_per_sensor=1440, queries=500, repeat=5):
+    sensorids = SensorIds(sensor_count)
+    start_ts = 1600000000
+    rows = sensor_count * rows_per_sensor
+    windows = []
+    for _ in range(queries):
+        ts = start_ts + random.randrange(rows_per_sensor - 60) * 60
+        windows.append((random.choice(sensorids), ts, ts + 3600))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        text_conn = sqlite3.connect(os.path.join(tmp_dir, 'text.db3'))
+        key_conn = sqlite3.connect(os.path.join(tmp_dir, 'key.db3'))
+        with text_conn:
+            FillText(text_conn, sensorids, start_ts, rows_per_sensor)
+        with key_conn:
+            keys = FillKey(key_conn, sensorids, start_ts, rows_per_sensor)
+        print("rows: {0}, sensors: {1}".format(rows, sensor_count))
+        print("{0:<28}{1:>10.1f} bytes/row".format("sensorid text", FileSize(text_conn) / rows))
+        print("{0:<28}{1:>10.1f} bytes/row".format("sensor_key", FileSize(key_conn) / rows))
+        BenchScan("1h avg, sensorid text", text_conn,
+                  "select avg(val) from sensor_data where sensorid=? and cts>=? and cts<?", windows, repeat)
+        BenchScan("1h avg, sensor_key", key_conn,
+                  "select avg(val) from sensor_data where sensor_key=? and cts>=? and cts<?",
+                  [(keys[w[0]], w[1], w[2]) for w in windows], repeat)
+        text_conn.close()
+        key_conn.close()
+
+
+if __name__ == "__main__":
+    main()
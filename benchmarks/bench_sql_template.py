@@ -0,0 +1,69 @@
+"""
+per row cost of building insert/update statements for the log writers,
+run from the project root: python -m benchmarks.bench_sql_template
+"""
+import timeit
+import rg_lib
+import models
+
+
+def LegacyInsert(table_name, rec_tbl, ignored=False):
+    terms = []
+    args = []
+    marks = []
+    for key in rec_tbl:
+        terms.append(key)
+        marks.append("?")
+        args.append(rec_tbl[key])
+    if ignored:
+        insert_sql = "insert or ignore into {0}(".format(table_name)
+    else:
+        insert_sql = "insert into {0}(".format(table_name)
+    insert_sql += ",".join(terms)
+    insert_sql += ") values ("
+    insert_sql += ",".join(marks)
+    insert_sql += ")"
+    return [insert_sql, args]
+
+
+def LegacyUpdate(table_name, mdl):
+    terms = []
+    args = []
+    for key in mdl:
+        if key != 'id':
+            terms.append("{0}=?".format(key))
+            args.append(mdl[key])
+    update_sql = "update {0} set ".format(table_name)
+    update_sql += ",".join(terms)
+    update_sql += " where id=?"
+    args.append(mdl['id'])
+    return [update_sql, args]
+
+
+def MakeRows(count):
+    sensor_data = [models.SensorData.Sync({'id': '00124b0018e1f2a{0}_0'.format(i), 'uts': 1600000000 + i,
+                                           'data_no': 'temperature', 'val': 20.5})
+                   for i in range(count)]
+    sensors = [{'id': '00124b0018e1f2a{0}_0'.format(i), 'name': 'sensor {0}'.format(i), 'tag': '',
+                'val_unit': 'C', 'val_precision': 1} for i in range(count)]
+    return sensor_data, sensors
+
+
+def Bench(label, func, rows, repeat):
+    best = min(timeit.repeat(lambda: [func(r) for r in rows], number=1, repeat=repeat))
+    print("{0:<32}{1:>10.3f} us/row".format(label, best * 1e6 / len(rows)))
+
+
+def main(count=500, repeat=20):
+    sensor_data, sensors = MakeRows(count)
+    print("rows: {0}, best of {1}".format(count, repeat))
+    Bench("SensorData insert (legacy)", lambda r: LegacyInsert(models.SensorData.TBL, r, True),
+          sensor_data, repeat)
+    Bench("SensorData insert (current)", lambda r: models.SensorData.DynInsert(r, True), sensor_data, repeat)
+    Bench("Sensor update (legacy)", lambda r: LegacyUpdate(models.Sensor.TBL, r), sensors, repeat)
+    Bench("Sensor update (cached)", lambda r: models.Sensor.DynUpdate(r, False), sensors, repeat)
+    print(rg_lib.Sqlite.TemplateCacheInfo())
+
+
+if __name__ == "__main__":
+    main()
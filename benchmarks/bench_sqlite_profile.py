@@ -0,0 +1,85 @@
+"""
+replays the sensor ingestion and chart query mix of the log database under each
+settings.SQLITE_PROFILES entry. pass a directory on the target medium to measure it,
+run from the project root: python -m benchmarks.bench_sqlite_profile [dir]
+"""
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import rg_lib
+import settings
+import models
+
+
+def OpenDb(db_path, profile):
+    conn_obj = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+    rg_lib.Sqlite.SetAutoVacuum(conn_obj)
+    rg_lib.Sqlite.SetPageSize(conn_obj, profile['page_size'])
+    rg_lib.Sqlite.SetWalMode(conn_obj, profile)
+    conn_obj.execute("BEGIN")
+    models.SensorKey.Init(conn_obj)
+    models.SensorAvgData.Init(conn_obj)
+    conn_obj.execute("COMMIT")
+    return conn_obj
+
+
+def Ingest(conn_obj, bulk_rows):
+    conn_obj.execute("BEGIN")
+    cursor_obj = conn_obj.cursor()
+    for bulk_row in bulk_rows:
+        rg_lib.Sqlite.ExecBulkRow(cursor_obj, bulk_row)
+    cursor_obj.close()
+    conn_obj.execute("COMMIT")
+
+
+def Replay(conn_obj, sensor_count, minutes, start_ts):
+    """
+    every simulated minute: raw rows of 5 scans plus one avg row per sensor,
+    then a one minute avg per sensor and a chart query over the last hour
+    """
+    sensorids = ['00124b0018e1f2a{0}_0'.format(i) for i in range(sensor_count)]
+    res = {'ingest': 0.0, 'minute_avg': 0.0, 'chart': 0.0, 'rows': 0}
+    for minute in range(minutes):
+        minute_ts = start_ts + minute * 60
+        raw = [{'sensorid': sid, 'cts': minute_ts + scan * 12, 'val': 20.0 + scan} for scan in range(5)
+               for sid in sensorids]
+        avg = [{'sensorid': sid, 'cts': minute_ts, 'val': 22.0} for sid in sensorids]
+        t1 = time.perf_counter()
+        Ingest(conn_obj, models.SensorData.DynInsertMany(raw, True) + models.SensorAvgData.DynInsertMany(avg, True))
+        t2 = time.perf_counter()
+        src = models.SensorData.PartitionName(models.SensorData.PartitionDay(minute_ts))
+        for sid in sensorids:
+            conn_obj.execute("""select avg(r1.val) from {0} r1 where r1.sensor_key={1}
+                                and r1.cts>=? and r1.cts<?""".format(src, models.SensorKey.KEY_EXPR),
+                             (sid, minute_ts, minute_ts + 60)).fetchall()
+        t3 = time.perf_counter()
+        conn_obj.execute(rg_lib.Sqlite.GenInSql("""select r1.cts, r1.val, k1.sensorid from rgw_sensor_avg_data r1
+                                                   inner join rgw_sensor_key k1 on r1.sensor_key=k1.sensor_key
+                                                   where r1.cts>=? and r1.cts<? and k1.sensorid in """,
+                                                sensorids[:8]),
+                         [minute_ts - 3600, minute_ts + 60] + sensorids[:8]).fetchall()
+        t4 = time.perf_counter()
+        res['ingest'] += t2 - t1
+        res['minute_avg'] += t3 - t2
+        res['chart'] += t4 - t3
+        res['rows'] += len(raw) + len(avg)
+    return res
+
+
+def main(base_dir=None, sensor_count=200, minutes=60):
+    start_ts = 1600000000
+    print("sensors: {0}, minutes: {1}".format(sensor_count, minutes))
+    for name, profile in settings.SQLITE_PROFILES.items():
+        with tempfile.TemporaryDirectory(dir=base_dir) as tmp_dir:
+            conn_obj = OpenDb(os.path.join(tmp_dir, 'log.db3'), profile)
+            res = Replay(conn_obj, sensor_count, minutes, start_ts)
+            conn_obj.close()
+        print("{0:<10} ingest {1:>9.0f} rows/s  minute avg {2:>7.2f} ms/sensor  chart {3:>7.2f} ms".format(
+            name, res['rows'] / res['ingest'], res['minute_avg'] * 1000 / (sensor_count * minutes),
+            res['chart'] * 1000 / minutes))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,89 @@
+"""
+queries and time per trigger scan, one latest avg query per (trigger, sensor) pair
+vs one grouped models.SensorData.MinAvgManySql query,
+run from the project root: python -m benchmarks.bench_trigger_queries
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import timeit
+import rg_lib
+import models
+
+SINGLE_SQL = """select cast(strftime('%s', strftime('%Y-%m-%d %H:%M', r1.cts, 'unixepoch')) as integer) cts,
+                       avg(r1.val) avg_val
+                from {0} r1
+                where r1.sensor_key=? and r1.cts>=? and r1.cts<?"""
+
+
+def Fill(conn_obj, sensorids, day, stop_ts, interval, rows_per_sensor):
+    models.SensorKey.Init(conn_obj)
+    conn_obj.execute(models.SensorData.CreatePartition(day))
+    sql_row = models.SensorKey.AddMany(sensorids)
+    conn_obj.executemany(sql_row[0], sql_row[1])
+    keys = {r[1]: r[0] for r in conn_obj.execute(models.SensorKey.QuerySql()[0])}
+    conn_obj.executemany("insert into {0}(sensor_key, cts, val) values(?,?,?)".format(models.SensorData.PartitionName(day)),
+                         ((keys[sid], stop_ts - i * interval, 20 + random.random())
+                          for i in range(1, rows_per_sensor + 1) for sid in sensorids))
+    return keys
+
+
+def MakeTriggers(sensorids, trigger_count, max_terms):
+    return [random.sample(sensorids, random.randint(1, max_terms)) for _ in range(trigger_count)]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, statement):
+        self.count += 1
+
+
+def ScanPerPair(conn_obj, src, keys, triggers, start_ts, stop_ts):
+    res = {}
+    for trigger in triggers:
+        for sid in trigger:
+            res[sid] = conn_obj.execute(SINGLE_SQL.format(src), (keys[sid], start_ts, stop_ts)).fetchone()
+    return res
+
+
+def ScanGrouped(conn_obj, src, keys, triggers, start_ts, stop_ts):
+    sensorids = sorted({sid for trigger in triggers for sid in trigger})
+    sql_str, sql_args = models.SensorData.MinAvgManySql(src, [keys[sid] for sid in sensorids],
+                                                        start_ts, stop_ts, False)
+    return {r[0]: r for r in conn_obj.execute(sql_str, sql_args)}
+
+
+def Bench(label, conn_obj, func, repeat):
+    counter = QueryCounter()
+    conn_obj.set_trace_callback(counter)
+    func()
+    conn_obj.set_trace_callback(None)
+    best = min(timeit.repeat(func, number=1, repeat=repeat))
+    print("{0:<28}{1:>10} queries/scan{2:>12.2f} ms/scan".format(label, counter.count, best * 1e3))
+
+
+def main(sensor_count=500, trigger_count=200, max_terms=4, interval=12, rows_per_sensor=300, repeat=5):
+    sensorids = ['00124b0018e1f2a{0}_0'.format(i) for i in range(sensor_count)]
+    day = 19000
+    stop_ts = day * rg_lib.DateTime.DAY_SECONDS + 43200
+    start_ts = stop_ts - 60
+    triggers = MakeTriggers(sensorids, trigger_count, max_terms)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn_obj = sqlite3.connect(os.path.join(tmp_dir, 'log.db3'))
+        with conn_obj:
+            keys = Fill(conn_obj, sensorids, day, stop_ts, interval, rows_per_sensor)
+        src = models.SensorData.PartitionName(day)
+        print("sensors: {0}, triggers: {1}, (trigger, sensor) pairs: {2}".format(
+            sensor_count, trigger_count, sum(len(t) for t in triggers)))
+        Bench("per (trigger, sensor) pair", conn_obj,
+              lambda: ScanPerPair(conn_obj, src, keys, triggers, start_ts, stop_ts), repeat)
+        Bench("one grouped query", conn_obj,
+              lambda: ScanGrouped(conn_obj, src, keys, triggers, start_ts, stop_ts), repeat)
+        conn_obj.close()
+
+
+if __name__ == "__main__":
+    main()
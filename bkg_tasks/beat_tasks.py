@@ -1,4 +1,4 @@
-from twisted.internet import defer, task
+from twisted.internet import defer
 from twisted.python import log
 from apscheduler.schedulers.background import BackgroundScheduler
 from twisted.internet import threads
@@ -13,9 +13,11 @@ import api_switch_schedule
 from bkg_tasks import remove_ttl_record
 from bkg_tasks import sync_sensor_data
 from bkg_tasks import reboot_all
+from bkg_tasks import db_maintenance
+from bkg_tasks import task_runner
+import settings
 
 scheduler = BackgroundScheduler()
-jobs_tbl = {}
 
 
 async def DoSwitchSchedule():
@@ -33,37 +35,40 @@ async def DoSwitchSchedule():
 
 async def Setup():
     from twisted.internet import reactor
-    t_obj1 = task.LoopingCall(lambda: defer.ensureDeferred(DoSwitchSchedule()))
-    t_obj1.start(1, False)
-
-    t_obj2 = task.LoopingCall(lambda: defer.ensureDeferred(api_scan_device.ScanSensor()))
-    t_obj2.start(12, False)
-    jobs_tbl['fetch_sensor_val'] = t_obj2
-
-    t_obj3 = task.LoopingCall(lambda: defer.ensureDeferred(handle_switch_on_stats.HandleSession()))
-    t_obj3.start(10, False)
-
-    t_obj4 = task.LoopingCall(lambda: defer.ensureDeferred(api_scan_device.ScanSwitch()))
-    t_obj4.start(5, False)
-    jobs_tbl['sync_switch_status'] = t_obj4
-
-    t_obj5 = task.LoopingCall(lambda: defer.ensureDeferred(handle_switch_action.RunTask()))
-    t_obj5.start(1, False)
+    task_runner.Start('switch_schedule', DoSwitchSchedule, 1)
+    task_runner.Start('fetch_sensor_val', api_scan_device.ScanSensor, settings.SENSOR_SCAN['tick'])
+    task_runner.Start('switch_on_session', handle_switch_on_stats.HandleSession, 10)
+    task_runner.Start('sync_switch_status', api_scan_device.ScanSwitch, 5)
+    task_runner.Start('switch_action', handle_switch_action.RunTask, 1, 'coalesce')
 
     every_mins_trigger_obj = CronTrigger(second=1)
     scheduler.add_job(threads.blockingCallFromThread, every_mins_trigger_obj,
-                      args=(reactor, lambda: defer.ensureDeferred(sync_sensor_data.Run())),
+                      args=(reactor, lambda: defer.ensureDeferred(task_runner.RunOnce('sync_sensor_data',
+                                                                                      sync_sensor_data.Run))),
                       replace_existing=True, id='sync_sensor_data')
 
     every_5mins_trigger_obj = CronTrigger(minute='0,5,10,15,20,25,30,35,40,45,50,55', second=59)
     scheduler.add_job(threads.blockingCallFromThread, every_5mins_trigger_obj,
-                      args=(reactor, lambda: defer.ensureDeferred(remove_ttl_record.Run())),
+                      args=(reactor, lambda: defer.ensureDeferred(task_runner.RunOnce('remove_ttl',
+                                                                                      remove_ttl_record.Run))),
                       replace_existing=True, id='remove_ttl')
     scheduler.add_job(threads.blockingCallFromThread, every_5mins_trigger_obj,
-                      args=(reactor, lambda: defer.ensureDeferred(handle_switch_on_stats.HandleOpenSession())),
+                      args=(reactor, lambda: defer.ensureDeferred(
+                          task_runner.RunOnce('switch_open_session', handle_switch_on_stats.HandleOpenSession))),
                       replace_existing=True, id='switch_open_session')
 
+    checkpoint_trigger_obj = CronTrigger(minute='*/{0}'.format(settings.DB_MAINTENANCE['checkpoint_mins']),
+                                         second=30)
+    scheduler.add_job(threads.blockingCallFromThread, checkpoint_trigger_obj,
+                      args=(reactor, lambda: defer.ensureDeferred(db_maintenance.RunCheckpoint())),
+                      replace_existing=True, id='db_checkpoint')
+
     local_tz = await api_core.SysCfg.GetTimezone()
+    quiet_hour_trigger_obj = CronTrigger(hour=settings.DB_MAINTENANCE['quiet_hour'], minute=17, second=0,
+                                         timezone=local_tz)
+    scheduler.add_job(threads.blockingCallFromThread, quiet_hour_trigger_obj,
+                      args=(reactor, lambda: defer.ensureDeferred(db_maintenance.RunDaily())),
+                      replace_existing=True, id='db_maintenance')
     every_monday_trigger_obj = CronTrigger(day_of_week=0, hour=0, minute=0, second=59, timezone=local_tz)
     scheduler.add_job(threads.blockingCallFromThread, every_monday_trigger_obj,
                       args=(reactor, lambda: defer.ensureDeferred(reboot_all.Run())),
@@ -73,4 +78,5 @@ async def Setup():
 
 
 def Close():
+    task_runner.StopAll()
     scheduler.shutdown(False)
@@ -0,0 +1,102 @@
+import os.path as os_path
+import time
+import datetime
+import functools
+from twisted.python import log
+import rg_lib
+import api_core
+import settings
+
+stats_tbl = {}  # db name -> latest maintenance results
+
+
+def GetDbs():
+    return [('biz', api_core.BizDB, settings.BIZ_DB['path']),
+            ('log', api_core.LogDB, settings.LOG_DB['path'])]
+
+
+def WalBytes(db_path):
+    wal_path = db_path + '-wal'
+    return os_path.getsize(wal_path) if os_path.exists(wal_path) else 0
+
+
+def IsQuiet(db_cls):
+    """
+    no queued or committing writes on the log writer, biz db writes are rare
+    """
+    writer = getattr(db_cls, 'writer', None)
+    return writer is None or (writer.GetStats()['pending_requests'] == 0 and not writer.flushing)
+
+
+def GetStats(name):
+    if name not in stats_tbl:
+        stats_tbl[name] = {'passive': None, 'truncate': None, 'checkpoints': 0, 'optimize': None,
+                           'analyze': None, 'quick_check': None}
+    return stats_tbl[name]
+
+
+async def Checkpoint(name, db_cls, db_path, mode):
+    """
+    :param name: db name
+    :param db_cls: api_core.BizDB or api_core.LogDB
+    :param db_path:
+    :param mode: PASSIVE or TRUNCATE
+    :return: {mode, busy, wal_pages, moved_pages, wal_bytes_before, wal_bytes_after, seconds}
+    """
+    def __helper(conn_obj):
+        start_ts = time.perf_counter()
+        row = conn_obj.execute("PRAGMA wal_checkpoint({0})".format(mode)).fetchone()
+        return list(row) + [time.perf_counter() - start_ts]
+
+    wal_bytes = WalBytes(db_path)
+    busy, wal_pages, moved_pages, seconds = await db_cls.RunWithConn(__helper)
+    res = {'mode': mode, 'ts': rg_lib.DateTime.ts(), 'busy': busy, 'wal_pages': wal_pages,
+           'moved_pages': moved_pages, 'wal_bytes_before': wal_bytes, 'wal_bytes_after': WalBytes(db_path),
+           'seconds': seconds}
+    stats = GetStats(name)
+    stats[mode.lower()] = res
+    stats['checkpoints'] += 1
+    return res
+
+
+async def RunPragma(name, key, run_func, sql_str):
+    def __helper(conn_obj):
+        start_ts = time.perf_counter()
+        rows = conn_obj.execute(sql_str).fetchall()
+        return [list(r) for r in rows], time.perf_counter() - start_ts
+
+    rows, seconds = await run_func(__helper)
+    GetStats(name)[key] = {'ts': rg_lib.DateTime.ts(), 'seconds': seconds, 'result': rows[:10]}
+    return rows
+
+
+async def RunCheckpoint():
+    """
+    PASSIVE never blocks, the wal is truncated only when it is large and the writer is idle
+    """
+    for name, db_cls, db_path in GetDbs():
+        try:
+            res = await Checkpoint(name, db_cls, db_path, 'PASSIVE')
+            if res['wal_bytes_after'] > settings.DB_MAINTENANCE['truncate_wal_bytes'] and IsQuiet(db_cls):
+                await Checkpoint(name, db_cls, db_path, 'TRUNCATE')
+        except Exception:
+            log.err()
+
+
+async def RunDaily():
+    """
+    runs in the quiet hour: truncate the wal, refresh planner statistics and check the files
+    """
+    tz_obj = await api_core.SysCfg.GetTimezone()
+    full_analyze = datetime.datetime.now(tz_obj).weekday() == settings.DB_MAINTENANCE['analyze_weekday']
+    for name, db_cls, db_path in GetDbs():
+        try:
+            await Checkpoint(name, db_cls, db_path, 'TRUNCATE')
+            if full_analyze:
+                await RunPragma(name, 'analyze', db_cls.RunWithConn, "ANALYZE")
+            else:
+                await RunPragma(name, 'optimize', db_cls.RunWithConn, "PRAGMA optimize")
+            await RunPragma(name, 'quick_check', functools.partial(rg_lib.Sqlite.RunWithConn, db_cls.read_pool),
+                            "PRAGMA quick_check")
+        except Exception:
+            log.err()
@@ -10,7 +10,7 @@ async def __GetSwtiches():
     """
     :return: (switch on ids, switch off ids)
     """
-    rows = await api_core.BizDB.Query(['select id from rgw_switch'])
+    rows = await api_core.Registry.Switches()
     onids, offids = [], []
     for row in rows:
         action = await api_switch_action.GetSuccOn(row['id'])
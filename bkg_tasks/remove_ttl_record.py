@@ -2,16 +2,28 @@ from twisted.python import log
 import rg_lib
 import api_core
 import api_sensor_data
+import api_sensor_avg_data
+import api_switch_schedule
+import api_retention
 import settings
 
 
 async def Run():
     try:
         curr_ts = rg_lib.DateTime.ts()
-        await api_sensor_data.RemoveTTL(curr_ts - settings.LOG_DB['ttl'])
-        await api_core.TriggerLog.RemoveTTL(curr_ts - settings.LOG_DB['ttl'])
+        await api_retention.RunChunked('sensor_data', api_sensor_data.RemoveTTL,
+                                       curr_ts - settings.LOG_DB['ttl'], settings.RETENTION['batch_partitions'])
+        # completed days are archived before their averages expire
+        await api_sensor_avg_data.Archive(curr_ts - 600)
+        await api_retention.RunChunked('sensor_avg_data', api_sensor_avg_data.RemoveTTL,
+                                       curr_ts - settings.LOG_DB['ttl'], settings.RETENTION['batch_rows'])
+        await api_retention.RunChunked('sensor_archive', api_sensor_avg_data.RemoveArchiveTTL,
+                                       curr_ts - settings.LOG_DB['archive_ttl'], settings.RETENTION['batch_rows'])
+        await api_retention.RunChunked('trigger_log', api_core.TriggerLog.RemoveTTL,
+                                       curr_ts - settings.LOG_DB['ttl'], settings.RETENTION['batch_rows'])
+        await api_retention.RunChunked('switch_schedule', api_switch_schedule.RemoveTTL,
+                                       curr_ts - settings.BIZ_DB['ttl'], settings.RETENTION['batch_rows'])
+        await api_retention.Vacuum('log', api_core.LogDB, settings.RETENTION['vacuum_pages'])
+        await api_retention.Vacuum('biz', api_core.BizDB, settings.RETENTION['vacuum_pages'])
     except Exception:
         log.err()
-
-
-
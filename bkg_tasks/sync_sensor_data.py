@@ -10,14 +10,11 @@ import models
 async def Run():
     try:
         curr_dt = rg_lib.DateTime.utc()
-        sensors = await api_core.BizDB.Query(["select id from rgw_sensor", []])
+        sensors = await api_core.Registry.Rows('sensor')
         sensorids = [s['id'] for s in sensors]
         start_dt = (curr_dt - datetime.timedelta(seconds=60)).replace(second=0)
-        mdls = []
-        for sid in sensorids:
-            row = await api_sensor_data.GetMinAvg(start_dt, curr_dt, sid, True)
-            if row:
-                mdls.append(models.SensorAvgData.Sync(row))
+        rows = await api_sensor_data.GetMinAvgMany(start_dt, curr_dt, sensorids, True)
+        mdls = [models.SensorAvgData.Sync(rows[sid]) for sid in sensorids if sid in rows]
         if len(mdls) > 0:
             await api_sensor_avg_data.Add(mdls)
     except Exception:
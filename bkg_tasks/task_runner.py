@@ -0,0 +1,159 @@
+"""
+periodic and cron jobs with run stats, a job never overlaps itself: the next tick is
+scheduled when the current run finishes, ticks missed meanwhile are skipped or
+coalesced into one immediate run. under sustained overrun the period is stretched
+"""
+import math
+import time
+from twisted.internet import defer
+from twisted.python import log
+import settings
+
+jobs_tbl = {}  # job name -> job state
+
+
+def MakeJob(name, func, period, policy):
+    return {'name': name, 'func': func, 'period': period, 'base_period': period, 'policy': policy,
+            'running': False, 'delayed_call': None, 'due_ts': None,
+            'runs': 0, 'errors': 0, 'overruns': 0, 'skipped': 0, 'coalesced': 0,
+            'consecutive_overruns': 0, 'consecutive_ok': 0, 'stretched': 0,
+            'last_duration': None, 'max_duration': 0, 'total_duration': 0,
+            'last_lag': None, 'max_lag': 0, 'last_start_ts': None}
+
+
+def Now():
+    from twisted.internet import reactor
+    return reactor.seconds()
+
+
+def RecordRun(job, start_ts, duration):
+    job['runs'] += 1
+    job['last_start_ts'] = start_ts
+    job['last_duration'] = duration
+    job['max_duration'] = max(job['max_duration'], duration)
+    job['total_duration'] += duration
+
+
+def AdjustPeriod(job, duration):
+    """
+    stretch the period after stretch_after overruns in a row, shrink it back after recover_after normal runs
+    """
+    cfg = settings.TASK_RUNNER
+    if duration > job['period']:
+        job['overruns'] += 1
+        job['consecutive_overruns'] += 1
+        job['consecutive_ok'] = 0
+        if job['consecutive_overruns'] >= cfg['stretch_after'] and \
+                job['period'] < job['base_period'] * cfg['max_stretch']:
+            job['period'] = min(job['period'] * 2, job['base_period'] * cfg['max_stretch'])
+            job['stretched'] += 1
+            job['consecutive_overruns'] = 0
+            log.msg("job {0} overran, period stretched to {1}s".format(job['name'], job['period']))
+    else:
+        job['consecutive_overruns'] = 0
+        job['consecutive_ok'] += 1
+        if job['consecutive_ok'] >= cfg['recover_after'] and job['period'] > job['base_period']:
+            job['period'] = max(job['period'] / 2, job['base_period'])
+            job['consecutive_ok'] = 0
+
+
+def Schedule(job, due_ts):
+    from twisted.internet import reactor
+    job['due_ts'] = due_ts
+    job['delayed_call'] = reactor.callLater(max(due_ts - Now(), 0), lambda: defer.ensureDeferred(Tick(job)))
+
+
+async def Tick(job):
+    job['delayed_call'] = None
+    start_ts = Now()
+    lag = start_ts - job['due_ts']
+    job['last_lag'] = lag
+    job['max_lag'] = max(job['max_lag'], lag)
+    job['running'] = True
+    begin = time.monotonic()
+    try:
+        await job['func']()
+    except Exception:
+        job['errors'] += 1
+        log.err()
+    finally:
+        job['running'] = False
+    duration = time.monotonic() - begin
+    RecordRun(job, start_ts, duration)
+    AdjustPeriod(job, duration)
+    if jobs_tbl.get(job['name']) is not job:
+        return
+    curr_ts = Now()
+    next_ts = job['due_ts'] + job['period']
+    if next_ts <= curr_ts:
+        missed = int(math.floor((curr_ts - job['due_ts']) / job['period']))
+        if job['policy'] == 'coalesce':
+            job['coalesced'] += missed
+            next_ts = curr_ts
+        else:
+            job['skipped'] += missed
+            next_ts = job['due_ts'] + (missed + 1) * job['period']
+    Schedule(job, next_ts)
+
+
+def Start(name, func, period, policy='skip', now=False):
+    """
+    :param name: job name
+    :param func: async func()
+    :param period: seconds
+    :param policy: 'skip' drops ticks missed by a long run, 'coalesce' runs once right after it
+    :param now: run the first tick immediately
+    :return: job state
+    """
+    Stop(name)
+    job = MakeJob(name, func, period, policy)
+    jobs_tbl[name] = job
+    Schedule(job, Now() if now else Now() + period)
+    return job
+
+
+def Stop(name):
+    job = jobs_tbl.pop(name, None)
+    if job and job['delayed_call'] and job['delayed_call'].active():
+        job['delayed_call'].cancel()
+
+
+def StopAll():
+    for name in list(jobs_tbl.keys()):
+        Stop(name)
+
+
+async def RunOnce(name, func):
+    """
+    run a cron job with the same stats, skipped while its previous run is active
+    """
+    if name not in jobs_tbl:
+        jobs_tbl[name] = MakeJob(name, func, None, 'cron')
+    job = jobs_tbl[name]
+    if job['running']:
+        job['skipped'] += 1
+        return
+    start_ts = Now()
+    job['running'] = True
+    begin = time.monotonic()
+    try:
+        await func()
+    except Exception:
+        job['errors'] += 1
+        log.err()
+    finally:
+        job['running'] = False
+    RecordRun(job, start_ts, time.monotonic() - begin)
+
+
+def GetStats():
+    """
+    :return: {job name: {period, base_period, runs, errors, overruns, skipped, coalesced, stretched,
+              last_duration, max_duration, avg_duration, last_lag, max_lag, running}}
+    """
+    result = {}
+    for name, job in jobs_tbl.items():
+        tbl = {k: v for k, v in job.items() if k not in ('func', 'delayed_call', 'consecutive_ok')}
+        tbl['avg_duration'] = job['total_duration'] / job['runs'] if job['runs'] > 0 else None
+        result[name] = tbl
+    return result
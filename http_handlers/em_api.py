@@ -12,6 +12,8 @@ import api_auth
 import api_switch_action
 import api_switch_schedule
 import api_sensor_avg_data
+import api_sensor_data
+import api_sensor_ring
 import api_switch_stats
 import sensor_log_report
 import monthly_switch_usage_report
@@ -27,14 +29,7 @@ async def GetSwitch(req_handler, arg):
     try:
         await api_req_limit.CheckHTTP(req_handler)
         await api_auth.CheckRight(arg['token'])
-        if "switchids" in arg:
-            sql_str = rg_lib.Sqlite.GenInClause("select id, name, iconid, tag, uts from rgw_switch where id in ",
-                                                arg['switchids'])
-            sql_args = arg['switchids']
-        else:
-            sql_str = "select id, name, iconid, tag, uts from rgw_switch"
-            sql_args = []
-        switches = await api_core.BizDB.Query([sql_str, sql_args])
+        switches = await api_core.Registry.Switches(arg.get('switchids'))
         curr = rg_lib.DateTime.ts()
         for s in switches:
             if (s['uts'] is None) or s['uts'] < (curr - 90):
@@ -173,16 +168,24 @@ async def GetSensor(req_handler, para):
     """
     :param req_handler:
     :param para: {}
-    :return: {groupids: [groupid,...], data_tbl: {groupid->[sensor data]}}
+    :return: [sensor with "recent": {count, avg_val, min_val, max_val} of the latest readings or None],
+             only avg_val is known for sensors not in api_sensor_ring
     """
     try:
         await api_req_limit.CheckHTTP(req_handler)
-        if "sensorids" in para:
-            sql_str = rg_lib.Sqlite.GenInClause("""select * from rgw_sensor where id in """,
-                                                para['sensorids'])
-        else:
-            sql_str = """select * from rgw_sensor"""
-        return await api_core.Sensor.Query([sql_str, []])
+        sensors = await api_core.Registry.Sensors(para.get('sensorids'))
+        curr_ts = rg_lib.DateTime.ts()
+        for sensor in sensors:
+            sensor['recent'] = api_sensor_ring.Summary(sensor['id'], curr_ts - api_sensor_data.LatestSpan(sensor['id']),
+                                                       curr_ts + 1)
+        misses = [sensor['id'] for sensor in sensors if sensor['recent'] is None]
+        if len(misses) > 0:
+            rows = await api_sensor_data.GetLatestAvgMany(misses)
+            for sensor in sensors:
+                if sensor['id'] in rows:
+                    sensor['recent'] = {'count': None, 'avg_val': rows[sensor['id']]['avg_val'],
+                                        'min_val': None, 'max_val': None}
+        return sensors
     except Exception:
         rg_lib.Cyclone.HandleErrInException()
 
@@ -211,14 +214,7 @@ async def FindSensorMinsAvgLog(req_handler, para):
                                                      para['mins_interval'], 2000)
         result = {"sensorids": para['sensorids'], "log_tbl": collections.defaultdict(list),
                   'ts_series': rg_lib.DateTime.GetMinSeries(start_ts, stop_ts, para['mins_interval'], 'ts')}
-        sql_str = rg_lib.Sqlite.GenInSql("""select r1.id,
-                                                   r1.data_no,
-                                                   r1.name, 
-                                                   r1.val_unit,
-                                                   r1.val_precision
-                                            from rgw_sensor r1 where r1.id in """,
-                                         para['sensorids'])
-        tbls2 = await api_core.Sensor.Query([sql_str, para['sensorids']])
+        tbls2 = await api_core.Registry.Sensors(para['sensorids'])
         for tbl in tbls:
             result['log_tbl'][str(tbl['sensorid'])].append(tbl)
         result['sensors_tbl'] = {str(t['id']): t for t in tbls2}
@@ -0,0 +1,38 @@
+import rg_lib
+import models
+import api_req_limit
+import api_auth
+import api_scan_device
+import settings
+
+
+async def PushReadings(req_handler, arg):
+    """
+    :param req_handler:
+    :param arg: {"key": gateway key, "devices": [{"id": deviceid, "vals": [...], "ts": optional reading ts}]}
+    :return: {"readings", "duplicates", "unknown", "stale"}
+    """
+    try:
+        await api_req_limit.CheckHTTP(req_handler, settings.INGEST['rate'])
+        api_auth.CheckIngestKey(arg.get('key'))
+        devs = arg['devices']
+        if len(devs) > settings.INGEST['max_devices']:
+            raise rg_lib.RGError(models.ErrorTypes.UnsupportedOp())
+        devs = [dev for dev in devs if models.XYDevice.ValsNotEmpty(dev)]
+        return await api_scan_device.IngestDevices(devs, 'push')
+    except Exception:
+        rg_lib.Cyclone.HandleErrInException()
+
+
+async def GetIngestStats(req_handler, arg):
+    """
+    :param req_handler:
+    :param arg: {token}
+    :return: {"poll": {batches, readings, duplicates, unknown, stale, last_ts}, "push": {...}, "readings_per_min"}
+    """
+    try:
+        await api_req_limit.CheckHTTP(req_handler)
+        await api_auth.CheckRight(arg['token'])
+        return api_scan_device.GetIngestStats()
+    except Exception:
+        rg_lib.Cyclone.HandleErrInException()
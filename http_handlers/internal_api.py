@@ -6,6 +6,7 @@ from http_handlers import sensor_api, switch_api, \
     sensor_trigger_api as cond_api
 from . import zb_module_api
 from . import zb_device_api
+from . import ingest_api
 
 
 class Base(rg_lib.AsyncDynFuncHandler):
@@ -41,7 +42,17 @@ class SysCfg(Base):
                          "RebootSys": functools.partial(sys_cfg_api.RebootSys, self),
                          "RestartSys": functools.partial(sys_cfg_api.RestartSys, self),
                          'RegisterDevice': functools.partial(sys_cfg_api.RegisterDevice, self),
-                         'SyncDevice': functools.partial(sys_cfg_api.SyncDevice, self)}
+                         'SyncDevice': functools.partial(sys_cfg_api.SyncDevice, self),
+                         'GetDbStats': functools.partial(sys_cfg_api.GetDbStats, self),
+                         'GetRetentionProgress': functools.partial(sys_cfg_api.GetRetentionProgress, self),
+                         'GetSqlStats': functools.partial(sys_cfg_api.GetSqlStats, self),
+                         'ResetSqlStats': functools.partial(sys_cfg_api.ResetSqlStats, self),
+                         'GetDbMaintenance': functools.partial(sys_cfg_api.GetDbMaintenance, self),
+                         'StartBackup': functools.partial(sys_cfg_api.StartBackup, self),
+                         'GetBackupProgress': functools.partial(sys_cfg_api.GetBackupProgress, self),
+                         'GetSensorFilterStats': functools.partial(sys_cfg_api.GetSensorFilterStats, self),
+                         'CheckRegistry': functools.partial(sys_cfg_api.CheckRegistry, self),
+                         'GetTaskStats': functools.partial(sys_cfg_api.GetTaskStats, self)}
 
 
 class SensorAdm(Base):
@@ -97,3 +108,9 @@ class ZbDeviceAdm(Base):
                          'GetDeviceOpErrorCount': functools.partial(zb_device_api.GetOpErrorCount, self),
                          'RebootDevice': functools.partial(zb_device_api.Reboot, self)
                          }
+
+
+class Ingest(Base):
+    def initialize(self, **kwargs):
+        self.FUNC_TBL = {'PushReadings': functools.partial(ingest_api.PushReadings, self),
+                         'GetIngestStats': functools.partial(ingest_api.GetIngestStats, self)}
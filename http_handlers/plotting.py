@@ -41,24 +41,20 @@ class SensorHourlyLogHandler(cyclone_web.RequestHandler):
             tz_offset = para.get('tz_offset', 0)
             mins = para.get('mins')
             sensorids = para.get('sensorids')
-            sql_str = rg_lib.Sqlite.GenInSql(
-                """select COALESCE(r1.name,'') name, r1.id, r1.data_no,r1.val_precision, 
-                         r1.val_unit from rgw_sensor r1 where r1.id in """,
-                sensorids)
-            sensors = await api_core.BizDB.Query([sql_str, sensorids])
+            sensors = await api_core.Registry.Rows('sensor', sensorids)
             sensors_tbl = {s['id']: s for s in sensors}
             curr = rg_lib.DateTime.ts()
             start_ts = curr - hours * 3600
             start_ts = rg_lib.DateTime.dt2ts(rg_lib.DateTime.ts2dt(start_ts).replace(minute=0, second=0))
             dt_series = rg_lib.DateTime.GetMinSeries(start_ts, curr, mins, 'datetime')
             ts_series = [rg_lib.DateTime.dt2ts(i) for i in dt_series]
-            rows = await api_sensor_avg_data.QueryMinAvg(start_ts, curr, sensorids, mins, 2000)
+            rows = await api_sensor_avg_data.QueryMinAvgRows(start_ts, curr, sensorids, mins, 2000)
             rows_tbl = collections.OrderedDict()
             for r in rows:
-                if r['cts'] in rows_tbl:
-                    rows_tbl[r['cts']].append(r)
+                if r[0] in rows_tbl:
+                    rows_tbl[r[0]].append(r)
                 else:
-                    rows_tbl[r['cts']] = [r]
+                    rows_tbl[r[0]] = [r]
             if len(dt_series) > 9:
                 steps = 1 + len(dt_series) // 9
             else:
@@ -78,9 +74,9 @@ class SensorHourlyLogHandler(cyclone_web.RequestHandler):
                 sensor = sensors_tbl[sensorid]
                 for _, cts in enumerate(rows_tbl.keys()):
                     for row in rows_tbl[cts]:
-                        if row['sensorid'] == sensorid and cts in ts_series:
+                        if row[2] == sensorid and cts in ts_series:
                             idx = ts_series.index(cts)
-                            vals[idx] = {'value': row['avg_val'],
+                            vals[idx] = {'value': row[1],
                                          'formatter': functools.partial(GetValLabel, sensor_mdl=sensor)}
                 chart_obj.add(sensors_tbl[sensorid]['name'], vals)
             temp = chart_obj.render(True)
@@ -6,7 +6,7 @@ import api_auth
 
 
 async def __GetSensor(sensorid):
-    return await api_core.Sensor.Get(["""select r1.* from rgw_sensor r1 where r1.id=?""", (sensorid,)])
+    return await api_core.Sensor.ById(sensorid)
 
 
 async def AddSensor(req_handler, arg):
@@ -6,8 +6,8 @@ import api_auth
 
 
 async def __GetSwitch(rowid):
-    tbl = await api_core.Switch.Get(["""select r1.* from rgw_switch r1 where r1.id=?""", (rowid,)])
-    return tbl
+    rows = await api_core.Registry.Switches([rowid])
+    return rows[0] if rows else None
 
 
 async def AddSwitch(req_handler, arg):
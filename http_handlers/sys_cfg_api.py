@@ -5,6 +5,11 @@ import api_core
 import api_req_limit
 import api_xy_device
 import api_auth
+import api_retention
+import api_backup
+import api_sensor_filter
+from bkg_tasks import db_maintenance
+from bkg_tasks import task_runner
 import settings
 
 
@@ -84,3 +89,149 @@ async def SyncDevice(req_handler, arg):
     except Exception:
         rg_lib.Cyclone.HandleErrInException()
 
+
+
+async def GetDbStats(req_handler, arg):
+    """
+    :param req_handler:
+    :param arg: {token}
+    :return: {"biz": {pool stats}, "log": {pool stats, writer stats}}
+    """
+    try:
+        await api_req_limit.CheckHTTP(req_handler)
+        await api_auth.CheckRight(arg['token'])
+        return {'biz': api_core.BizDB.GetStats(), 'log': api_core.LogDB.GetStats()}
+    except Exception:
+        rg_lib.Cyclone.HandleErrInException()
+
+
+async def GetRetentionProgress(req_handler, arg):
+    """
+    :param req_handler:
+    :param arg: {token}
+    :return: {"jobs": {name->progress}, "vacuum": {db name->released pages}}
+    """
+    try:
+        await api_req_limit.CheckHTTP(req_handler)
+        await api_auth.CheckRight(arg['token'])
+        return api_retention.GetProgress()
+    except Exception:
+        rg_lib.Cyclone.HandleErrInException()
+
+
+async def GetSqlStats(req_handler, arg):
+    """
+    :param req_handler:
+    :param arg: {token, top: optional count of statements}
+    :return: {"buckets_ms", "sql": [histogram,...], "pool_wait": histogram, "slow_log": [{sql, ms, ts, plan}]}
+    """
+    try:
+        await api_req_limit.CheckHTTP(req_handler)
+        await api_auth.CheckRight(arg['token'])
+        return rg_lib.SqlStats.GetStats(arg.get('top', 30))
+    except Exception:
+        rg_lib.Cyclone.HandleErrInException()
+
+
+async def ResetSqlStats(req_handler, arg):
+    """
+    :param req_handler:
+    :param arg: {token}
+    :return:
+    """
+    try:
+        await api_req_limit.CheckHTTP(req_handler)
+        await api_auth.CheckRight(arg['token'])
+        rg_lib.SqlStats.Reset()
+        return "ok"
+    except Exception:
+        rg_lib.Cyclone.HandleErrInException()
+
+
+async def GetDbMaintenance(req_handler, arg):
+    """
+    :param req_handler:
+    :param arg: {token}
+    :return: {db name: {passive, truncate, checkpoints, optimize, analyze, quick_check}, "wal_bytes": {db name: bytes}}
+    """
+    try:
+        await api_req_limit.CheckHTTP(req_handler)
+        await api_auth.CheckRight(arg['token'])
+        res = dict(db_maintenance.stats_tbl)
+        res['wal_bytes'] = {name: db_maintenance.WalBytes(path) for name, _, path in db_maintenance.GetDbs()}
+        return res
+    except Exception:
+        rg_lib.Cyclone.HandleErrInException()
+
+
+async def StartBackup(req_handler, arg):
+    """
+    :param req_handler:
+    :param arg: {token, db: "biz"|"log", mode: "full"|"incremental"}
+    :return: backup progress
+    """
+    try:
+        await api_req_limit.CheckHTTP(req_handler)
+        await api_auth.CheckRight(arg['token'])
+        return api_backup.Start(arg['db'], arg.get('mode', 'full'))
+    except Exception:
+        rg_lib.Cyclone.HandleErrInException()
+
+
+async def GetBackupProgress(req_handler, arg):
+    """
+    :param req_handler:
+    :param arg: {token, id: optional backup id}
+    :return: backup progress, list of all when id omitted
+    """
+    try:
+        await api_req_limit.CheckHTTP(req_handler)
+        await api_auth.CheckRight(arg['token'])
+        return api_backup.GetProgress(arg.get('id'))
+    except Exception:
+        rg_lib.Cyclone.HandleErrInException()
+
+
+async def GetSensorFilterStats(req_handler, arg):
+    """
+    :param req_handler:
+    :param arg: {token}
+    :return: {sensorid: {received, stored, suppressed, heartbeat, cfg}}
+    """
+    try:
+        await api_req_limit.CheckHTTP(req_handler)
+        await api_auth.CheckRight(arg['token'])
+        return {sensorid: dict(stats, cfg=api_sensor_filter.IsFiltered(sensorid))
+                for sensorid, stats in api_sensor_filter.stats_tbl.items()}
+    except Exception:
+        rg_lib.Cyclone.HandleErrInException()
+
+
+async def CheckRegistry(req_handler, arg):
+    """
+    :param req_handler:
+    :param arg: {token, repair: optional boolean, reload registry if it differs from db}
+    :return: {stats: {hits, misses, loads, loaded}, sensor: {missing, extra, stale}, switch: {...}}
+    """
+    try:
+        await api_req_limit.CheckHTTP(req_handler)
+        await api_auth.CheckRight(arg['token'])
+        res = await api_core.Registry.CheckConsistency(arg.get('repair', False))
+        res['stats'] = dict(api_core.Registry.stats)
+        return res
+    except Exception:
+        rg_lib.Cyclone.HandleErrInException()
+
+
+async def GetTaskStats(req_handler, arg):
+    """
+    :param req_handler:
+    :param arg: {token}
+    :return: {job name: {period, runs, overruns, skipped, coalesced, stretched, last_duration, max_lag,...}}
+    """
+    try:
+        await api_req_limit.CheckHTTP(req_handler)
+        await api_auth.CheckRight(arg['token'])
+        return task_runner.GetStats()
+    except Exception:
+        rg_lib.Cyclone.HandleErrInException()
@@ -260,9 +260,7 @@ class ViewSensorMinsAvgTrend(UIBase):
             sensorids = c_escape.json_decode(c_escape.url_unescape(temp_str))
             if len(sensorids) < 1:
                 raise cyclone_web.HTTPError(404, 'no sensor')
-            sql_str = rg_lib.Sqlite.GenInSql("""select COALESCE(name,'') name, id from rgw_sensor where id in """,
-                                             sensorids)
-            sensors = await api_core.BizDB.Query([sql_str, sensorids])
+            sensors = await api_core.Registry.Rows('sensor', sensorids)
             if len(sensors) > 0:
                 self.render(rgw_consts.TPL_NAMES.VIEW_SENSOR_MINS_AVG_TREND,
                             app_js_dir=settings.WEB['js_dir'],
@@ -308,10 +306,7 @@ class ViewSensorMinsAvgData(UIBase):
             if len(sensorids) < 1:
                 raise cyclone_web.HTTPError(404, 'no sensor')
 
-            sql_str = rg_lib.Sqlite.GenInSql("""select COALESCE(name,'') name, id
-                                                        from rgw_sensor where id in """,
-                                             sensorids)
-            sensors = await api_core.BizDB.Query([sql_str, sensorids])
+            sensors = await api_core.Registry.Rows('sensor', sensorids)
             sensors_tbl = {i['id']: i for i in sensors}
             if len(sensors) > 0:
                 self.render(rgw_consts.TPL_NAMES.VIEW_SENSOR_MINS_AVG_DATA,
@@ -360,9 +355,10 @@ class ViewSwitchOnLogDetail(UIBase):
             temp = self.get_argument('switchid', '')
             if len(temp) == 0:
                 raise cyclone_web.HTTPError(404, 'no switch')
-            row = await api_core.Switch.Get(["select id, name from rgw_switch where id=?", (temp,)])
-            if row is None:
+            rows = await api_core.Registry.Switches([temp])
+            if len(rows) < 1:
                 raise cyclone_web.HTTPError(404, 'no switch')
+            row = rows[0]
             label_tbl = self.GetLabel()[ulang]
             self.render(rgw_consts.TPL_NAMES.VIEW_SWITCH_ON_LOG_DETAIL,
                         app_js_dir=settings.WEB['js_dir'],
@@ -424,9 +420,7 @@ class ViewSensorRecentTrend(UIBase):
             plotting_no = self.get_argument('plotting_no', '1')
             if len(sensorids) < 1:
                 raise cyclone_web.HTTPError(404, 'no sensor')
-            sql_str = rg_lib.Sqlite.GenInSql("""select COALESCE(name,'') name, id from rgw_sensor where id in """,
-                                             sensorids)
-            sensors = await api_core.BizDB.Query([sql_str, sensorids])
+            sensors = await api_core.Registry.Rows('sensor', sensorids)
             if len(sensors) > 0:
                 label_tbl = self.GetLabelTbl()[ulang]
                 self.render(rgw_consts.TPL_NAMES.VIEW_SENSORS_RECENT_TREND,
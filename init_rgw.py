@@ -27,7 +27,7 @@ def SetRXG(connid):
 
 def main():
     with rg_lib.DbConnWrap(sqlite3.connect(settings.BIZ_DB['path'], check_same_thread=False)) as conn:
-        conn.conn_obj.execute("PRAGMA journal_mode=WAL")
+        rg_lib.Sqlite.Rebuild(conn.conn_obj, settings.SQLITE_PROFILES[settings.BIZ_DB['profile']])
         conn.conn_obj.execute("PRAGMA synchronous=1")
     with rg_lib.DbConnWrap(sqlite3.connect(settings.BIZ_DB['path'], check_same_thread=False)) as conn:
         conn.conn_obj.execute("drop table if exists rgw_sys_cfg")
@@ -0,0 +1,34 @@
+import sqlite3
+import rg_lib
+import settings
+import models
+
+
+def MigrateSensorData(connid):
+    models.SensorKey.Init(connid)
+    days = models.SensorData.Migrate(connid)
+    print('sensor data partitions: {0}'.format([models.SensorData.PartitionName(d) for d in days]))
+
+
+def MigrateSensorAvgData(connid):
+    if models.SensorKey.MigrateTable(connid, models.SensorAvgData.TBL, models.SensorAvgData.CreateTableSql()):
+        connid.execute(models.SensorAvgData.IDX1)
+        print('sensor avg data keyed by sensor_key')
+
+
+def main():
+    """
+    offline migration of rgw_log.db3, rgw does the same on start up
+    """
+    with rg_lib.DbConnWrap(sqlite3.connect(settings.LOG_DB['path'], check_same_thread=False)) as conn:
+        conn.conn_obj.execute("BEGIN")
+        MigrateSensorData(conn.conn_obj)
+        MigrateSensorAvgData(conn.conn_obj)
+    with rg_lib.DbConnWrap(sqlite3.connect(settings.LOG_DB['path'], check_same_thread=False)) as conn:
+        # auto_vacuum and page_size of an existing file only change by rebuilding it
+        page_size = rg_lib.Sqlite.Rebuild(conn.conn_obj, settings.SQLITE_PROFILES[settings.LOG_DB['profile']])
+        print('page size: {0}'.format(page_size))
+
+
+if __name__ == "__main__":
+    main()
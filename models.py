@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 import numbers
+import math
+import sys
+import array
+import zlib
 import apscheduler.util as aps_util
 import json
 import bson
 import datetime
+import functools
 import pytz
 import rg_lib
 import rgw_consts
@@ -411,22 +416,17 @@ class SwitchOpDuration:
 
     @classmethod
     def DynInsert(cls, mdl, ignored=False):
-        terms = []
-        args = []
-        marks = []
-        for key in mdl:
-            terms.append(key)
-            marks.append("?")
-            args.append(mdl[key])
-        if ignored:
-            insert_sql = "insert or ignore into rgw_switch_op_duration("
-        else:
-            insert_sql = "insert into rgw_switch_op_duration("
-        insert_sql += ",".join(terms)
-        insert_sql += ") values ("
-        insert_sql += ",".join(marks)
-        insert_sql += ")"
-        return [insert_sql, args]
+        sql = rg_lib.Sqlite.InsertTemplate(cls.TBL, tuple(mdl.keys()), 'ignore' if ignored else '')
+        return [sql, tuple(mdl.values())]
+
+    @classmethod
+    def DynInsertMany(cls, rec_tbls, ignored=False):
+        """
+        :param rec_tbls: list of rows
+        :param ignored:
+        :return: bulk rows [[sql, [args,...]],...]
+        """
+        return rg_lib.Sqlite.GenBulkInsert(cls.TBL, rec_tbls, ignored)
 
     @classmethod
     def make(cls, start_ts, stop_ts, switchid, status, val):
@@ -582,20 +582,11 @@ class Sensor:
 
     @classmethod
     def DynUpdate(cls, mdl, is_ignored):
-        terms = []
-        args = []
-        for key in mdl:
-            if key != 'id':
-                terms.append("{0}=?".format(key))
-                args.append(mdl[key])
-        if is_ignored:
-            update_sql = "update or ignore rgw_sensor set"
-        else:
-            update_sql = "update rgw_sensor set "
-        update_sql += ",".join(terms)
-        update_sql += " where id=?"
+        columns = tuple([key for key in mdl if key != 'id'])
+        update_sql = rg_lib.Sqlite.UpdateTemplate(cls.TBL, columns, 'id', 'ignore' if is_ignored else '')
+        args = [mdl[key] for key in columns]
         args.append(mdl['id'])
-        return [update_sql, args]
+        return [update_sql, tuple(args)]
 
     @classmethod
     def DynInsert(cls, rec_tbl, is_ignored):
@@ -648,25 +639,262 @@ class Sensor:
         return row
 
 
+class SensorKey:
+    """
+    log tables keep a small integer sensor_key per row instead of the sensorid text
+    """
+    TBL = "rgw_sensor_key"
+
+    TBL_FIELDS = [
+        {'name': 'sensor_key', 'type': 'integer primary key'},
+        {'name': 'sensorid', 'type': 'varchar(64) not null'}
+    ]
+
+    IDX1 = """create unique index if not exists rgw_sensor_key_idx1 on rgw_sensor_key(sensorid)"""
+
+    KEY_EXPR = "(select sensor_key from rgw_sensor_key where sensorid=?)"
+
+    @classmethod
+    def Init(cls, conn_obj):
+        conn_obj.execute(rg_lib.Sqlite.CreateTable(cls.TBL, cls.TBL_FIELDS))
+        conn_obj.execute(cls.IDX1)
+
+    @classmethod
+    def QuerySql(cls, sensorids=None):
+        """
+        :param sensorids: None for all keys
+        :return: [sql, args]
+        """
+        if sensorids is None:
+            return ["select sensor_key, sensorid from rgw_sensor_key", []]
+        else:
+            return [rg_lib.Sqlite.GenInSql("select sensor_key, sensorid from rgw_sensor_key where sensorid in ",
+                                           sensorids), list(sensorids)]
+
+    @classmethod
+    def AddMany(cls, sensorids):
+        """
+        :param sensorids:
+        :return: bulk row which registers the missing keys
+        """
+        return ["insert or ignore into rgw_sensor_key(sensorid) values(?)", [(sid,) for sid in sensorids]]
+
+    @classmethod
+    def MigrateTable(cls, conn_obj, table_name, create_sql):
+        """
+        convert a log table keyed by sensorid text into (sensor_key, cts, val) layout
+        :param conn_obj:
+        :param table_name:
+        :param create_sql: creates table_name in the new layout
+        :return: True if converted
+        """
+        cols = [r[1] for r in conn_obj.execute("pragma table_info({0})".format(table_name))]
+        if 'sensorid' not in cols:
+            return False
+        old_tbl = table_name + "_old"
+        conn_obj.execute("alter table {0} rename to {1}".format(table_name, old_tbl))
+        conn_obj.execute(create_sql)
+        conn_obj.execute("""insert or ignore into rgw_sensor_key(sensorid)
+                            select distinct sensorid from {0}""".format(old_tbl))
+        conn_obj.execute("""insert or ignore into {0}(sensor_key, cts, val)
+                            select k.sensor_key, r1.cts, r1.val from {1} r1
+                            inner join rgw_sensor_key k on k.sensorid=r1.sensorid""".format(table_name, old_tbl))
+        conn_obj.execute("drop table {0}".format(old_tbl))
+        return True
+
+    @classmethod
+    def UniqueIds(cls, rec_tbls):
+        sensorids = []
+        found = set()
+        for rec_tbl in rec_tbls:
+            if rec_tbl['sensorid'] not in found:
+                found.add(rec_tbl['sensorid'])
+                sensorids.append(rec_tbl['sensorid'])
+        return sensorids
+
+
 class SensorData:
-    FIELDS = ['cts', 'sensorid', 'data_no', 'val']
+    """
+    rows are stored in one table per utc day, retention drops whole partitions.
+    partitions are WITHOUT ROWID tables keyed by (sensor_key, cts), see SensorKey
+    """
+    FIELDS = ['cts', 'sensorid', 'val']
+
+    TBL = "rgw_sensor_data"  # legacy single table, only read by Migrate
 
-    TBL = "rgw_sensor_data"
+    PARTITION_PREFIX = "rgw_sensor_data_p"
 
     TBL_FIELDS = [
-        {'name': 'sensorid', 'type': 'varchar(64) not null'},
+        {'name': 'sensor_key', 'type': 'integer not null'},
         {'name': 'cts', 'type': 'datetime not null'},
-        {'name': 'data_no', 'type': 'varchar(64) not null'},
         {'name': 'val', 'type': 'double not null'},
     ]
 
-    IDX1 = """create index if not exists rgw_sensor_data_idx1 on rgw_sensor_data(cts)"""
-
     @classmethod
     def Init(cls, conn_obj):
-        conn_obj.execute(rg_lib.Sqlite.CreateTable(cls.TBL, cls.TBL_FIELDS,
-                                                   'PRIMARY key(sensorid, cts)'))
-        conn_obj.execute(cls.IDX1)
+        cls.Migrate(conn_obj)
+
+    @classmethod
+    def PartitionDay(cls, ts_val):
+        return int(ts_val) // rg_lib.DateTime.DAY_SECONDS
+
+    @classmethod
+    @functools.lru_cache(maxsize=64)
+    def PartitionName(cls, day):
+        dt_obj = rg_lib.DateTime.ts2dt(day * rg_lib.DateTime.DAY_SECONDS)
+        return "{0}{1}".format(cls.PARTITION_PREFIX, dt_obj.strftime('%Y%m%d'))
+
+    @classmethod
+    def PartitionDayOf(cls, table_name):
+        """
+        :param table_name:
+        :return: day number or None if it is not a partition
+        """
+        suffix = table_name[len(cls.PARTITION_PREFIX):]
+        if table_name.startswith(cls.PARTITION_PREFIX) and len(suffix) == 8 and suffix.isdigit():
+            dt_obj = datetime.datetime.strptime(suffix, '%Y%m%d')
+            return cls.PartitionDay(rg_lib.DateTime.dt2ts(dt_obj))
+        else:
+            return None
+
+    @classmethod
+    def CreatePartition(cls, day):
+        return rg_lib.Sqlite.CreateTable(cls.PartitionName(day), cls.TBL_FIELDS,
+                                         'PRIMARY key(sensor_key, cts)', 'WITHOUT ROWID')
+
+    @classmethod
+    def DropPartition(cls, day):
+        return "drop table if exists {0}".format(cls.PartitionName(day))
+
+    @classmethod
+    def ListPartitionSql(cls):
+        return ["select name from sqlite_master where type='table' and name like ?",
+                (cls.PARTITION_PREFIX + '%',)]
+
+    @classmethod
+    def ListPartition(cls, conn_obj):
+        """
+        :param conn_obj:
+        :return: sorted days
+        """
+        sql_row = cls.ListPartitionSql()
+        days = [cls.PartitionDayOf(r[0]) for r in conn_obj.execute(sql_row[0], sql_row[1])]
+        return sorted([d for d in days if d is not None])
+
+    @classmethod
+    def PointsManySql(cls, src, sensor_keys, start_ts, stop_ts):
+        """
+        :return: [sql, args], rows of sensor_key, cts, val in [start_ts, stop_ts) ordered by sensor_key, cts
+        """
+        sql_str = """with key_cte(sensor_key) as (values {1})
+                     select r1.sensor_key, r1.cts, r1.val
+                     from {0} r1
+                     where r1.sensor_key in (select sensor_key from key_cte) and r1.cts>=? and r1.cts<?
+                     order by r1.sensor_key, r1.cts""".format(src, ",".join(["(?)"] * len(sensor_keys)))
+        return [sql_str, list(sensor_keys) + [start_ts, stop_ts]]
+
+    @classmethod
+    def MinAvgManySql(cls, src, sensor_keys, start_ts, stop_ts, exclude_max_min):
+        """
+        average of [start_ts, stop_ts) per sensor_key in one grouped query, the max and
+        min rows of each sensor are excluded the same way as api_sensor_data.GetMinAvg
+        :param src: GenSource result
+        :param sensor_keys:
+        :param start_ts:
+        :param stop_ts: exclusive
+        :param exclude_max_min:
+        :return: [sql, args], rows of sensor_key, cts (minute), avg_val
+        """
+        sql_str = """with key_cte(sensor_key) as (values {1}),
+                          range_cte as (select r1.sensor_key, r1.cts, r1.val
+                                        from {0} r1
+                                        where r1.sensor_key in (select sensor_key from key_cte) and
+                                              r1.cts>=? and r1.cts<?)""".format(src, ",".join(["(?)"] * len(sensor_keys)))
+        if exclude_max_min:
+            sql_str += """,
+                          max_min_cte(sensor_key, cts) as
+                          (select sensor_key, cts from (select sensor_key, cts, max(val) from range_cte group by sensor_key)
+                           UNION
+                           select sensor_key, cts from (select sensor_key, cts, min(val) from range_cte group by sensor_key))"""
+        sql_str += """
+                      select r1.sensor_key,
+                             cast(strftime('%s', strftime('%Y-%m-%d %H:%M', min(r1.cts), 'unixepoch')) as integer) cts,
+                             avg(r1.val) avg_val
+                      from range_cte r1 {0}
+                      group by r1.sensor_key""".format("""where not exists (select 1 from max_min_cte r2
+                                                                           where r2.sensor_key=r1.sensor_key and
+                                                                                 r2.cts=r1.cts)"""
+                                                       if exclude_max_min else "")
+        return [sql_str, list(sensor_keys) + [start_ts, stop_ts]]
+
+    @classmethod
+    def MinAvgSql(cls, src, sensor_key, start_ts, stop_ts, exclude_max_min):
+        """
+        average of [start_ts, stop_ts) of one sensor_key, cts is the minute of its first row like MinAvgManySql
+        :return: [sql, args], one row of cts (minute), avg_val
+        """
+        if exclude_max_min:
+            sql_str = """with max_min_cte(cts, val) as
+                          (select r1.cts, max(r1.val)
+                           from {0} r1
+                           where r1.sensor_key=? and r1.cts>=? and r1.cts<? UNION
+                           select r1.cts, min(r1.val)
+                           from {0} r1
+                           where r1.sensor_key=? and r1.cts>=? and r1.cts<?)
+
+                           select cast(strftime('%s', strftime('%Y-%m-%d %H:%M', min(r1.cts), 'unixepoch')) as integer) cts,
+                                  avg(r1.val) avg_val
+                           from {0} r1
+                           where r1.sensor_key=? and r1.cts>=? and r1.cts<? and r1.cts not in (select cts from max_min_cte)
+                      """.format(src)
+            return [sql_str, [sensor_key, start_ts, stop_ts] * 3]
+        sql_str = """select cast(strftime('%s', strftime('%Y-%m-%d %H:%M', min(r1.cts), 'unixepoch')) as integer) cts,
+                            avg(r1.val) avg_val
+                     from {0} r1
+                     where r1.sensor_key=? and r1.cts>=? and r1.cts<?""".format(src)
+        return [sql_str, [sensor_key, start_ts, stop_ts]]
+
+    @classmethod
+    def GenSource(cls, days):
+        """
+        :param days: partitions to read
+        :return: table name or union all sub query, None if no partition
+        """
+        if len(days) < 1:
+            return None
+        elif len(days) == 1:
+            return cls.PartitionName(days[0])
+        else:
+            return "(" + " union all ".join(["select * from {0}".format(cls.PartitionName(d))
+                                              for d in days]) + ")"
+
+    @classmethod
+    def Migrate(cls, conn_obj):
+        """
+        move rows of the legacy single table into day partitions, then drop it.
+        partitions still keyed by sensorid are converted to sensor_key layout
+        :param conn_obj:
+        :return: migrated days
+        """
+        migrated = [d for d in cls.ListPartition(conn_obj)
+                    if SensorKey.MigrateTable(conn_obj, cls.PartitionName(d), cls.CreatePartition(d))]
+        rows = list(conn_obj.execute("select name from sqlite_master where type='table' and name=?",
+                                     (cls.TBL,)))
+        if len(rows) < 1:
+            return migrated
+        conn_obj.execute("""insert or ignore into rgw_sensor_key(sensorid)
+                            select distinct sensorid from {0}""".format(cls.TBL))
+        days = [r[0] for r in conn_obj.execute("select distinct cast(cts/? as integer) from {0}".format(cls.TBL),
+                                               (rg_lib.DateTime.DAY_SECONDS,))]
+        for day in days:
+            conn_obj.execute(cls.CreatePartition(day))
+            conn_obj.execute("""insert or ignore into {0}(sensor_key, cts, val)
+                                select k.sensor_key, r1.cts, r1.val from {1} r1
+                                inner join rgw_sensor_key k on k.sensorid=r1.sensorid
+                                where r1.cts>=? and r1.cts<?""".format(cls.PartitionName(day), cls.TBL),
+                             (day * rg_lib.DateTime.DAY_SECONDS, (day + 1) * rg_lib.DateTime.DAY_SECONDS))
+        conn_obj.execute("drop table {0}".format(cls.TBL))
+        return sorted(set(migrated + days))
 
     @classmethod
     def make(cls, ts):
@@ -682,24 +910,39 @@ class SensorData:
             tbl['sensorid'] = sensor_mdl['id']
         return tbl
 
+    @classmethod
+    @functools.lru_cache(maxsize=64)
+    def InsertSql(cls, day, ignored=False):
+        return "insert {0}into {1}(sensor_key, cts, val) values({2}, ?, ?)".format(
+            'or ignore ' if ignored else '', cls.PartitionName(day), SensorKey.KEY_EXPR)
+
     @classmethod
     def DynInsert(cls, rec_tbl, ignored=False):
-        terms = []
-        args = []
-        marks = []
-        for key in rec_tbl:
-            terms.append(key)
-            marks.append("?")
-            args.append(rec_tbl[key])
-        if ignored:
-            insert_sql = "insert or ignore into rgw_sensor_data("
-        else:
-            insert_sql = "insert into rgw_sensor_data("
-        insert_sql += ",".join(terms)
-        insert_sql += ") values ("
-        insert_sql += ",".join(marks)
-        insert_sql += ")"
-        return [insert_sql, args]
+        """
+        the key of rec_tbl['sensorid'] must be registered already, see SensorKey.AddMany
+        """
+        return [cls.InsertSql(cls.PartitionDay(rec_tbl['cts']), ignored),
+                (rec_tbl['sensorid'], rec_tbl['cts'], rec_tbl['val'])]
+
+    @classmethod
+    def DynInsertMany(cls, rec_tbls, ignored=False):
+        """
+        rows are routed to their day partition, which is created when missing
+        :param rec_tbls: list of rows
+        :param ignored:
+        :return: bulk rows [[sql, [args,...]],...]
+        """
+        day_tbl = {}
+        for rec_tbl in rec_tbls:
+            day = cls.PartitionDay(rec_tbl['cts'])
+            if day not in day_tbl:
+                day_tbl[day] = []
+            day_tbl[day].append((rec_tbl['sensorid'], rec_tbl['cts'], rec_tbl['val']))
+        bulk_rows = [SensorKey.AddMany(SensorKey.UniqueIds(rec_tbls))]
+        for day in day_tbl:
+            bulk_rows.append([cls.CreatePartition(day), [[]]])
+            bulk_rows.append([cls.InsertSql(day, ignored), day_tbl[day]])
+        return bulk_rows
 
 
 class SensorTrigger:
@@ -821,25 +1064,79 @@ class SensorTrigger:
         insert_sql += ")"
         return [insert_sql, args]
 
+    COND_OPS = {'=': lambda c: c == 0, '==': lambda c: c == 0, '!=': lambda c: c != 0, '<>': lambda c: c != 0,
+                '<': lambda c: c < 0, '<=': lambda c: c <= 0, '>': lambda c: c > 0, '>=': lambda c: c >= 0,
+                'is': lambda c: c == 0, 'is not': lambda c: c != 0}
+
+    @classmethod
+    def SqlValue(cls, val):
+        """
+        value as sqlite binds it, NaN is NULL
+        """
+        return None if isinstance(val, float) and math.isnan(val) else val
+
     @classmethod
-    def GenExpr(cls, op):
-        return "(? {0} ?)".format(op)
+    def SqlRank(cls, val):
+        if val is None:
+            return 0
+        elif isinstance(val, numbers.Number):
+            return 1
+        elif isinstance(val, str):
+            return 2
+        return 3
 
     @classmethod
-    def GenAndExpr(cls, terms):
+    def SqlCompare(cls, lval, rval):
         """
-        :param terms: [(op, lval, rval),...]
-        :return: sql, sql_args
+        sqlite order of values without column affinity: NULL < numbers < text < blob,
+        numbers compare by value, text by BINARY collation (utf-8 byte order, the same
+        as code point order)
+        :return: -1, 0, 1
         """
-        sql = " and ".join([cls.GenExpr(term[0]) for term in terms])
-        sql_args = []
-        for term in terms:
-            sql_args.append(term[1])
+        lrank, rrank = cls.SqlRank(lval), cls.SqlRank(rval)
+        if lrank != rrank:
+            return -1 if lrank < rrank else 1
+        elif lrank == 0:
+            return 0
+        return (lval > rval) - (lval < rval)
+
+    @classmethod
+    def CompileCond(cls, sensors):
+        """
+        :param sensors: [{sensorid, op, rval}], conditions and-ed together
+        :return: {'op': 'and', 'terms': [{'op', 'sensorid', 'rval'}]}, rval is a number if it parses as one
+        """
+        terms = []
+        for sensor in sensors:
+            op = " ".join(str(sensor['op']).lower().split())
+            if op not in cls.COND_OPS:
+                raise rg_lib.RGError(ErrorTypes.UnsupportedOp())
             try:
-                sql_args.append(float(term[2]))
+                rval = float(sensor['rval'])
             except ValueError:
-                sql_args.append(term[2])
-        return sql, sql_args
+                rval = sensor['rval']
+            terms.append({'op': op, 'sensorid': sensor['sensorid'], 'rval': cls.SqlValue(rval)})
+        return {'op': 'and', 'terms': terms}
+
+    @classmethod
+    def EvalCond(cls, cond, val_tbl):
+        """
+        same result as "select (? op ?) and ..." on sqlite, NULL counts as false
+        :param cond: CompileCond result or None
+        :param val_tbl: {sensorid: val}, a trigger with a sensor missing is false
+        :return: boolean
+        """
+        if cond is None or len(cond['terms']) < 1:
+            return False
+        for term in cond['terms']:
+            if term['sensorid'] not in val_tbl:
+                return False
+            lval = cls.SqlValue(val_tbl[term['sensorid']])
+            if term['op'] not in ('is', 'is not') and (lval is None or term['rval'] is None):
+                return False
+            if not cls.COND_OPS[term['op']](cls.SqlCompare(lval, term['rval'])):
+                return False
+        return True
 
     @classmethod
     def FromRow(cls, row):
@@ -883,42 +1180,40 @@ class TriggerLog:
 
     @classmethod
     def DynInsert(cls, rec_tbl, ignored=False):
-        terms = []
-        args = []
-        marks = []
-        for key in rec_tbl:
-            terms.append(key)
-            marks.append("?")
-            args.append(rec_tbl[key])
-        if ignored:
-            insert_sql = "insert or ignore into rgw_trigger_log("
-        else:
-            insert_sql = "insert into rgw_trigger_log("
-        insert_sql += ",".join(terms)
-        insert_sql += ") values ("
-        insert_sql += ",".join(marks)
-        insert_sql += ")"
-        return [insert_sql, args]
+        sql = rg_lib.Sqlite.InsertTemplate(cls.TBL, tuple(rec_tbl.keys()), 'ignore' if ignored else '')
+        return [sql, tuple(rec_tbl.values())]
+
+    @classmethod
+    def DynInsertMany(cls, rec_tbls, ignored=False):
+        """
+        :param rec_tbls: list of rows
+        :param ignored:
+        :return: bulk rows [[sql, [args,...]],...]
+        """
+        return rg_lib.Sqlite.GenBulkInsert(cls.TBL, rec_tbls, ignored)
 
 
 class SensorAvgData:
-    FIELDS = ['cts', 'sensorid', 'data_no', 'val']
+    FIELDS = ['cts', 'sensorid', 'val']
 
     TBL = "rgw_sensor_avg_data"
 
     TBL_FIELDS = [
-        {'name': 'sensorid', 'type': 'varchar(64) not null'},
+        {'name': 'sensor_key', 'type': 'integer not null'},
         {'name': 'cts', 'type': 'datetime not null'},
-        {'name': 'data_no', 'type': 'varchar(64) not null'},
         {'name': 'val', 'type': 'double not null'},
     ]
 
     IDX1 = """create index if not exists rgw_sensor_avg_data_idx1 on rgw_sensor_avg_data(cts)"""
 
+    @classmethod
+    def CreateTableSql(cls):
+        return rg_lib.Sqlite.CreateTable(cls.TBL, cls.TBL_FIELDS, 'PRIMARY key(sensor_key, cts)', 'WITHOUT ROWID')
+
     @classmethod
     def Init(cls, conn_obj):
-        conn_obj.execute(rg_lib.Sqlite.CreateTable(cls.TBL, cls.TBL_FIELDS,
-                                                   'PRIMARY key(sensorid, cts)'))
+        SensorKey.MigrateTable(conn_obj, cls.TBL, cls.CreateTableSql())
+        conn_obj.execute(cls.CreateTableSql())
         conn_obj.execute(cls.IDX1)
 
     @classmethod
@@ -935,21 +1230,115 @@ class SensorAvgData:
             tbl['val'] = sensor_data['avg_val']
         return tbl
 
+    @classmethod
+    def InsertSql(cls, ignored=False):
+        return "insert {0}into rgw_sensor_avg_data(sensor_key, cts, val) values({1}, ?, ?)".format(
+            'or ignore ' if ignored else '', SensorKey.KEY_EXPR)
+
     @classmethod
     def DynInsert(cls, rec_tbl, ignored=False):
-        terms = []
-        args = []
-        marks = []
-        for key in rec_tbl:
-            terms.append(key)
-            marks.append("?")
-            args.append(rec_tbl[key])
-        if ignored:
-            insert_sql = "insert or ignore into rgw_sensor_avg_data("
-        else:
-            insert_sql = "insert into rgw_sensor_avg_data("
-        insert_sql += ",".join(terms)
-        insert_sql += ") values ("
-        insert_sql += ",".join(marks)
-        insert_sql += ")"
-        return [insert_sql, args]
+        """
+        the key of rec_tbl['sensorid'] must be registered already, see SensorKey.AddMany
+        """
+        return [cls.InsertSql(ignored), (rec_tbl['sensorid'], rec_tbl['cts'], rec_tbl['val'])]
+
+    @classmethod
+    def DynInsertMany(cls, rec_tbls, ignored=False):
+        """
+        :param rec_tbls: list of rows
+        :param ignored:
+        :return: bulk rows [[sql, [args,...]],...]
+        """
+        return [SensorKey.AddMany(SensorKey.UniqueIds(rec_tbls)),
+                [cls.InsertSql(ignored), [(r['sensorid'], r['cts'], r['val']) for r in rec_tbls]]]
+
+
+class SensorArchive:
+    """
+    one row per sensor and utc day of rgw_sensor_avg_data, data is zlib of
+    delta encoded uint32 timestamps followed by float32 values,
+    rgw_sensor_archive_day holds the archived days, empty ones included
+    """
+    TBL = "rgw_sensor_archive"
+
+    DAY_TBL = "rgw_sensor_archive_day"
+
+    TBL_FIELDS = [
+        {'name': 'sensor_key', 'type': 'integer not null'},
+        {'name': 'day', 'type': 'integer not null'},
+        {'name': 'data', 'type': 'blob not null'}
+    ]
+
+    DAY_TBL_FIELDS = [
+        {'name': 'day', 'type': 'integer not null'},
+        {'name': 'sensors', 'type': 'integer not null'}
+    ]
+
+    IDX1 = """create index if not exists rgw_sensor_archive_idx1 on rgw_sensor_archive(day)"""
+
+    @classmethod
+    def Init(cls, conn_obj):
+        conn_obj.execute(rg_lib.Sqlite.CreateTable(cls.TBL, cls.TBL_FIELDS, 'PRIMARY key(sensor_key, day)'))
+        conn_obj.execute(cls.IDX1)
+        conn_obj.execute(rg_lib.Sqlite.CreateTable(cls.DAY_TBL, cls.DAY_TBL_FIELDS, 'PRIMARY key(day)'))
+
+    @classmethod
+    def Pack(cls, day, rows):
+        """
+        :param day: SensorData.PartitionDay
+        :param rows: [(cts, val),...] within the day
+        :return: bytes
+        """
+        prev_ts = day * rg_lib.DateTime.DAY_SECONDS
+        deltas, vals = array.array('I'), array.array('f')
+        for cts, val in sorted(rows):
+            deltas.append(int(cts) - prev_ts)
+            vals.append(val)
+            prev_ts = int(cts)
+        if sys.byteorder != 'little':
+            deltas.byteswap()
+            vals.byteswap()
+        return zlib.compress(deltas.tobytes() + vals.tobytes())
+
+    @classmethod
+    def Unpack(cls, day, data):
+        """
+        :param day:
+        :param data: bytes made by Pack
+        :return: [(cts, val),...] sorted by cts
+        """
+        raw = zlib.decompress(data)
+        count = len(raw) // 8
+        deltas, vals = array.array('I'), array.array('f')
+        deltas.frombytes(raw[:count * 4])
+        vals.frombytes(raw[count * 4:])
+        if sys.byteorder != 'little':
+            deltas.byteswap()
+            vals.byteswap()
+        cts = day * rg_lib.DateTime.DAY_SECONDS
+        rows = []
+        for delta, val in zip(deltas, vals):
+            cts += delta
+            rows.append((cts, val))
+        return rows
+
+    @classmethod
+    def DynInsertMany(cls, day, data_tbl):
+        """
+        :param day:
+        :param data_tbl: {sensor_key: bytes}
+        :return: bulk rows
+        """
+        return [["insert or replace into rgw_sensor_archive(sensor_key, day, data) values(?,?,?)",
+                 [(sensor_key, day, data_tbl[sensor_key]) for sensor_key in data_tbl]],
+                ["insert or replace into rgw_sensor_archive_day(day, sensors) values(?,?)",
+                 [(day, len(data_tbl))]]]
+
+    @classmethod
+    def ReopenDays(cls, days):
+        """
+        days which got late rows are archived again
+        :param days:
+        :return: bulk row
+        """
+        return ["delete from rgw_sensor_archive_day where day=?", [(day,) for day in days]]
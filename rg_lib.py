@@ -1,5 +1,11 @@
 import sys
+import re
+import time
+import threading
+import collections
+import heapq
 import sqlite3
+import functools
 import base64
 import datetime
 import numbers
@@ -171,14 +177,230 @@ class Cyclone:
         return temp + '(.*)'
 
 
+class SqlStats:
+    """
+    latency histograms keyed by normalized sql, pool wait time and slow statements
+    with their query plan. Record and RecordWait are called from the pool threads.
+    """
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+    MAX_SQL = 500  # later statements are counted under OTHER
+    OTHER = '<other>'
+    enabled = True
+    slow_ms = 200
+    lock = threading.Lock()
+    sql_tbl = {}
+    wait_hist = None
+    slow_log = collections.deque(maxlen=50)
+
+    @classmethod
+    def Setup(cls, enabled, slow_ms, slow_log_size):
+        cls.enabled = enabled
+        cls.slow_ms = slow_ms
+        with cls.lock:
+            cls.slow_log = collections.deque(cls.slow_log, maxlen=slow_log_size)
+
+    @classmethod
+    @functools.lru_cache(maxsize=512)
+    def Normalize(cls, sql):
+        """
+        literals and in lists become ?, day partitions share one name
+        """
+        sql = " ".join(sql.split())
+        sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+        sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+        sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?,...)", sql)
+        sql = re.sub(r"rgw_sensor_data_p\d{8}", "rgw_sensor_data_p*", sql)
+        sql = re.sub(r"(select \* from rgw_sensor_data_p\*)(?: union all select \* from rgw_sensor_data_p\*)+",
+                     r"\1 union all ...", sql)
+        return sql
+
+    @classmethod
+    def MakeHist(cls):
+        return {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'buckets': [0] * (len(cls.BUCKETS_MS) + 1)}
+
+    @classmethod
+    def AddToHist(cls, hist, ms):
+        hist['count'] += 1
+        hist['total_ms'] += ms
+        hist['max_ms'] = max(hist['max_ms'], ms)
+        idx = 0
+        while idx < len(cls.BUCKETS_MS) and ms > cls.BUCKETS_MS[idx]:
+            idx += 1
+        hist['buckets'][idx] += 1
+
+    @classmethod
+    def Explain(cls, conn_obj, sql, args):
+        if sql.lstrip()[0:4].lower() not in ('sele', 'with', 'inse', 'upda', 'dele', 'repl'):
+            return []
+        try:
+            cursor_obj = conn_obj.cursor()
+            cursor_obj.row_factory = None
+            rows = cursor_obj.execute("EXPLAIN QUERY PLAN " + sql, args).fetchall()
+            cursor_obj.close()
+            return [r[-1] for r in rows]
+        except sqlite3.Error as e:
+            return [str(e)]
+
+    @classmethod
+    def Record(cls, conn_obj, sql, args, seconds):
+        """
+        :param conn_obj: connection which ran sql, used to explain slow statements
+        :param sql:
+        :param args:
+        :param seconds:
+        :return:
+        """
+        if not cls.enabled:
+            return
+        ms = seconds * 1000
+        key = cls.Normalize(sql)
+        plan = cls.Explain(conn_obj, sql, args) if ms >= cls.slow_ms else None
+        with cls.lock:
+            if key not in cls.sql_tbl and len(cls.sql_tbl) >= cls.MAX_SQL:
+                key = cls.OTHER
+            if key not in cls.sql_tbl:
+                cls.sql_tbl[key] = cls.MakeHist()
+            cls.AddToHist(cls.sql_tbl[key], ms)
+            if plan is not None:
+                cls.slow_log.append({'sql': key, 'ms': ms, 'ts': DateTime.ts(), 'plan': plan})
+
+    @classmethod
+    def RecordWait(cls, seconds):
+        if not cls.enabled:
+            return
+        with cls.lock:
+            if cls.wait_hist is None:
+                cls.wait_hist = cls.MakeHist()
+            cls.AddToHist(cls.wait_hist, seconds * 1000)
+
+    @classmethod
+    def GetStats(cls, top=30):
+        """
+        :param top: statements with the most total time
+        :return: {"buckets_ms", "sql": [{sql, count, total_ms, max_ms, buckets}], "pool_wait", "slow_log"}
+        """
+        with cls.lock:
+            items = sorted(cls.sql_tbl.items(), key=lambda i: i[1]['total_ms'], reverse=True)[:top]
+            return {'buckets_ms': list(cls.BUCKETS_MS),
+                    'sql': [dict(v, sql=k, buckets=list(v['buckets'])) for k, v in items],
+                    'pool_wait': dict(cls.wait_hist) if cls.wait_hist else cls.MakeHist(),
+                    'slow_log': list(cls.slow_log)}
+
+    @classmethod
+    def Reset(cls):
+        with cls.lock:
+            cls.sql_tbl = {}
+            cls.wait_hist = None
+            cls.slow_log.clear()
+
+
+class ConnPool(adbapi.ConnectionPool):
+    """
+    adbapi pool counting how busy it is
+    """
+
+    def __init__(self, *args, **kwargs):
+        adbapi.ConnectionPool.__init__(self, *args, **kwargs)
+        self.stats = {'calls': 0, 'active': 0, 'peak_active': 0, 'errors': 0}
+
+    def __Done(self, res):
+        self.stats['active'] -= 1
+        if isinstance(res, failure.Failure):
+            self.stats['errors'] += 1
+        return res
+
+    def runWithConnection(self, func, *args, **kw):
+        submit_ts = time.perf_counter()
+
+        def __Timed(conn_obj, *args2, **kw2):
+            SqlStats.RecordWait(time.perf_counter() - submit_ts)
+            return func(conn_obj, *args2, **kw2)
+
+        self.stats['calls'] += 1
+        self.stats['active'] += 1
+        self.stats['peak_active'] = max(self.stats['peak_active'], self.stats['active'])
+        d = adbapi.ConnectionPool.runWithConnection(self, __Timed, *args, **kw)
+        d.addBoth(self.__Done)
+        return d
+
+    def GetStats(self):
+        res = dict(self.stats)
+        res['cp_min'], res['cp_max'] = self.min, self.max
+        res['waiting'] = max(0, res['active'] - self.max)
+        return res
+
+
 class Sqlite:
     @classmethod
-    def SetWalMode(cls, conn_obj):
+    def SetWalMode(cls, conn_obj, profile=None):
+        """
+        :param conn_obj:
+        :param profile: settings.SQLITE_PROFILES item, None for the defaults
+        :return:
+        """
         conn_obj.execute("PRAGMA journal_mode=WAL")
-        conn_obj.execute("PRAGMA synchronous=1")
-        conn_obj.execute("PRAGMA cache_size=2000")  # 2000*page_size
+        if profile is None:
+            conn_obj.execute("PRAGMA synchronous=1")
+            conn_obj.execute("PRAGMA cache_size=2000")  # 2000*page_size
+        else:
+            cls.ApplyProfile(conn_obj, profile)
         conn_obj.row_factory = sqlite3.Row
 
+    @classmethod
+    def ApplyProfile(cls, conn_obj, profile):
+        """
+        per connection pragmas of a tuning profile, page_size is handled by SetPageSize
+        """
+        conn_obj.execute("PRAGMA synchronous={0}".format(int(profile['synchronous'])))
+        conn_obj.execute("PRAGMA cache_size={0}".format(int(profile['cache_size'])))
+        conn_obj.execute("PRAGMA mmap_size={0}".format(int(profile['mmap_size'])))
+        conn_obj.execute("PRAGMA temp_store={0}".format(profile['temp_store']))
+        conn_obj.execute("PRAGMA wal_autocheckpoint={0}".format(int(profile['wal_autocheckpoint'])))
+
+    @classmethod
+    def SetPageSize(cls, conn_obj, page_size):
+        """
+        takes effect on a new database only, see Rebuild for an existing one
+        """
+        conn_obj.execute("PRAGMA page_size={0}".format(int(page_size)))
+
+    @classmethod
+    def Rebuild(cls, conn_obj, profile=None):
+        """
+        VACUUM so page_size and auto_vacuum apply to an existing database,
+        page_size can not change in WAL mode, so the journal is switched around it.
+        must run outside a transaction with no other connection open
+        :param conn_obj:
+        :param profile: settings.SQLITE_PROFILES item
+        :return: page_size after rebuild
+        """
+        conn_obj.execute("PRAGMA journal_mode=DELETE")
+        cls.SetAutoVacuum(conn_obj)
+        if profile is not None:
+            cls.SetPageSize(conn_obj, profile['page_size'])
+        conn_obj.execute("VACUUM")
+        conn_obj.execute("PRAGMA journal_mode=WAL")
+        return conn_obj.execute("PRAGMA page_size").fetchone()[0]
+
+    @classmethod
+    def SetAutoVacuum(cls, conn_obj):
+        """
+        takes effect on a new database only, an existing one needs VACUUM afterwards
+        """
+        conn_obj.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
+    @classmethod
+    def IncrementalVacuum(cls, conn_obj, pages):
+        """
+        incremental_vacuum frees one page per step, execute() stops it after the first step
+        since it has no result columns, executescript runs it to the end
+        :param conn_obj:
+        :param pages: max pages to release
+        :return: remaining free pages
+        """
+        conn_obj.executescript("PRAGMA incremental_vacuum({0})".format(int(pages)))
+        return conn_obj.execute("PRAGMA freelist_count").fetchone()[0]
+
     @classmethod
     def SetMemoryMode(cls, conn_obj):
         conn_obj.execute("PRAGMA journal_mode=MEMORY")
@@ -203,13 +425,29 @@ class Sqlite:
         return conn_obj
 
     @classmethod
-    def MakeConnPool(cls, db_path):
+    def MakeConnPool(cls, db_path, cp_min=3, cp_max=5, profile=None):
         def __Init(conn_obj):
-            cls.SetWalMode(conn_obj)
+            cls.SetAutoVacuum(conn_obj)
+            if profile is not None:
+                cls.SetPageSize(conn_obj, profile['page_size'])
+            cls.SetWalMode(conn_obj, profile)
             cls.SetB64EncodeFunc(conn_obj)
 
-        return adbapi.ConnectionPool("sqlite3", database=db_path, check_same_thread=False,
-                                     cp_openfun=__Init, timeout=32)
+        return ConnPool("sqlite3", database=db_path, check_same_thread=False,
+                        cp_openfun=__Init, timeout=32, cp_min=cp_min, cp_max=cp_max)
+
+    @classmethod
+    def MakeReadOnlyConnPool(cls, db_path, cp_min=1, cp_max=3, profile=None):
+        """
+        connections are opened with query_only, so they never take the write lock
+        """
+        def __Init(conn_obj):
+            cls.SetWalMode(conn_obj, profile)
+            cls.SetB64EncodeFunc(conn_obj)
+            conn_obj.execute("PRAGMA query_only=1")
+
+        return ConnPool("sqlite3", database=db_path, check_same_thread=False,
+                        cp_openfun=__Init, timeout=32, cp_min=cp_min, cp_max=cp_max)
 
     @classmethod
     def GenInClause(cls, count):
@@ -232,7 +470,7 @@ class Sqlite:
         return result
 
     @classmethod
-    def CreateTable(cls, table_name, fields, extra_arg=''):
+    def CreateTable(cls, table_name, fields, extra_arg='', table_opt=''):
         sql = "CREATE TABLE IF NOT EXISTS {0}".format(table_name)
         sql += '('
         field_str = ',\n'.join([u"{0} {1}".format(i['name'], i['type']) for i in fields])
@@ -240,26 +478,169 @@ class Sqlite:
         if len(extra_arg) > 0:
             sql += ',\n' + extra_arg
         sql += ')'
+        if len(table_opt) > 0:
+            sql += ' ' + table_opt
         return sql
 
     @classmethod
     def RunQuery(cls, conn_pool_obj, sql_rows):
         def __helper(conn_obj):
-            conn_obj.execute("BEGIN")
             sql_row = sql_rows[0]
             args = cls.FilterArgs(sql_row[1]) if len(sql_row) > 1 else []
-            return [cls.FilterRow(r) for r in conn_obj.execute(sql_row[0], args)]
+            start_ts = time.perf_counter()
+            rows = [cls.FilterRow(r) for r in conn_obj.execute(sql_row[0], args)]
+            SqlStats.Record(conn_obj, sql_row[0], args, time.perf_counter() - start_ts)
+            return rows
 
         return conn_pool_obj.runWithConnection(__helper)
 
+    @classmethod
+    def FilterTuple(cls, row_obj, binary_cols):
+        row_obj = list(row_obj)
+        for idx in binary_cols:
+            if isinstance(row_obj[idx], (bytes, sqlite3.Binary)):
+                row_obj[idx] = bson.Binary(bytes(row_obj[idx]))
+        return tuple(row_obj)
+
+    @classmethod
+    def RunTupleQuery(cls, conn_pool_obj, sql_row, binary_cols=()):
+        """
+        rows stay plain tuples, only the columns in binary_cols are wrapped in bson.Binary
+        :param conn_pool_obj:
+        :param sql_row: [sql, args]
+        :param binary_cols: indexes of blob columns
+        :return: (column names, [tuple,...])
+        """
+        def __helper(conn_obj):
+            cursor_obj = conn_obj.cursor()
+            cursor_obj.row_factory = None
+            args = cls.FilterArgs(sql_row[1]) if len(sql_row) > 1 else []
+            start_ts = time.perf_counter()
+            rows = cursor_obj.execute(sql_row[0], args).fetchall()
+            SqlStats.Record(conn_obj, sql_row[0], args, time.perf_counter() - start_ts)
+            names = [d[0] for d in cursor_obj.description] if cursor_obj.description else []
+            cursor_obj.close()
+            if len(binary_cols) > 0:
+                rows = [cls.FilterTuple(r, binary_cols) for r in rows]
+            return names, rows
+
+        return conn_pool_obj.runWithConnection(__helper)
+
+    @classmethod
+    def GroupSqlRows(cls, sql_rows):
+        """
+        merge adjacent sql rows sharing the same sql text, order is kept
+        :param sql_rows: [[sql, args],...]
+        :return: bulk rows [[sql, [args,...]],...]
+        """
+        bulk_rows = []
+        for sql_row in sql_rows:
+            sql_args = sql_row[1] if len(sql_row) > 1 else []
+            if len(bulk_rows) > 0 and bulk_rows[-1][0] == sql_row[0]:
+                bulk_rows[-1][1].append(sql_args)
+            else:
+                bulk_rows.append([sql_row[0], [sql_args]])
+        return bulk_rows
+
+    @classmethod
+    @functools.lru_cache(maxsize=256)
+    def InsertTemplate(cls, table_name, columns, conflict=''):
+        """
+        cached, rows with the same key set reuse one statement
+        :param table_name:
+        :param columns: tuple of column names
+        :param conflict: '' or 'ignore', 'replace'
+        :return: sql
+        """
+        if conflict:
+            insert_sql = "insert or {0} into {1}(".format(conflict, table_name)
+        else:
+            insert_sql = "insert into {0}(".format(table_name)
+        insert_sql += ",".join(columns)
+        insert_sql += ") values ("
+        insert_sql += ",".join(["?" for _ in columns])
+        insert_sql += ")"
+        return insert_sql
+
+    @classmethod
+    @functools.lru_cache(maxsize=256)
+    def UpdateTemplate(cls, table_name, columns, key_column, conflict=''):
+        """
+        cached, args are the column values followed by the key value
+        :param table_name:
+        :param columns: tuple of column names
+        :param key_column: column of where clause
+        :param conflict: '' or 'ignore', 'replace'
+        :return: sql
+        """
+        if conflict:
+            update_sql = "update or {0} {1} set ".format(conflict, table_name)
+        else:
+            update_sql = "update {0} set ".format(table_name)
+        update_sql += ",".join(["{0}=?".format(c) for c in columns])
+        update_sql += " where {0}=?".format(key_column)
+        return update_sql
+
+    @classmethod
+    def TemplateCacheInfo(cls):
+        return {'insert': cls.InsertTemplate.cache_info()._asdict(),
+                'update': cls.UpdateTemplate.cache_info()._asdict()}
+
+    @classmethod
+    def GenBulkInsert(cls, table_name, rec_tbls, ignored=False):
+        """
+        :param table_name:
+        :param rec_tbls: list of dict, rows with the same keys share one statement
+        :param ignored: insert or ignore
+        :return: bulk rows [[sql, [args,...]],...]
+        """
+        grp_tbl = {}
+        for rec_tbl in rec_tbls:
+            keys = tuple(rec_tbl.keys())
+            if keys not in grp_tbl:
+                grp_tbl[keys] = []
+            grp_tbl[keys].append(tuple(rec_tbl.values()))
+        conflict = 'ignore' if ignored else ''
+        return [[cls.InsertTemplate(table_name, keys, conflict), grp_tbl[keys]] for keys in grp_tbl]
+
+    @classmethod
+    def IsDml(cls, sql):
+        return sql.lstrip()[0:7].lower() in ('insert ', 'update ', 'delete ', 'replace')
+
+    @classmethod
+    def ExecBulkRow(cls, cursor_obj, bulk_row):
+        """
+        executemany only applies to dml, other statements still run one by one
+        :param cursor_obj:
+        :param bulk_row: [sql, [args,...]]
+        :return:
+        """
+        start_ts = time.perf_counter()
+        if len(bulk_row[1]) > 1 and cls.IsDml(bulk_row[0]):
+            cursor_obj.executemany(bulk_row[0], [cls.FilterArgs(args) for args in bulk_row[1]])
+        else:
+            for args in bulk_row[1]:
+                cursor_obj.execute(bulk_row[0], cls.FilterArgs(args))
+        if len(bulk_row[1]) > 0:
+            SqlStats.Record(cursor_obj.connection, bulk_row[0], cls.FilterArgs(bulk_row[1][0]),
+                            time.perf_counter() - start_ts)
+
     @classmethod
     def RunInteraction(cls, conn_pool_obj, sql_rows):
+        return cls.RunBulkInteraction(conn_pool_obj, cls.GroupSqlRows(sql_rows))
+
+    @classmethod
+    def RunBulkInteraction(cls, conn_pool_obj, bulk_rows):
+        """
+        :param conn_pool_obj:
+        :param bulk_rows: [[sql, [args,...]],...]
+        :return: rows fetched after the last statement
+        """
         def __helper(conn_obj):
             conn_obj.execute("BEGIN")
             cursor_obj = conn_obj.cursor()
-            for sql_row in sql_rows:
-                sql_args = cls.FilterArgs(sql_row[1])
-                cursor_obj.execute(sql_row[0], sql_args)
+            for bulk_row in bulk_rows:
+                cls.ExecBulkRow(cursor_obj, bulk_row)
             rows = cursor_obj.fetchall()
             cursor_obj.close()
             return [cls.FilterRow(r) for r in rows]
@@ -277,9 +658,17 @@ class Sqlite:
 
     @classmethod
     def RunWithConn(cls, conn_pool_obj, func_obj, *args, **kwargs):
+        def __Timed(conn_obj, *args2, **kwargs2):
+            start_ts = time.perf_counter()
+            try:
+                return func_obj(conn_obj, *args2, **kwargs2)
+            finally:
+                SqlStats.Record(conn_obj, "func:" + getattr(func_obj, '__name__', str(func_obj)), [],
+                                time.perf_counter() - start_ts)
+
         async def __run():
             try:
-                res = await conn_pool_obj.runWithConnection(func_obj, *args, **kwargs)
+                res = await conn_pool_obj.runWithConnection(__Timed, *args, **kwargs)
                 return res
             except sqlite3.IntegrityError:
                 raise RGError(ErrorType.SqliteIntegrityError())
@@ -289,6 +678,151 @@ class Sqlite:
         return __run()
 
 
+class SqliteWriter:
+    """
+    single writer, queued writes are committed together in one transaction per flush window.
+    every request runs inside its own savepoint, so a failed request only rolls back itself.
+    """
+    SAVEPOINT = "rgw_writer"
+
+    def __init__(self, conn_pool_obj, flush_interval, flush_rows):
+        """
+        :param conn_pool_obj: connection pool with one connection
+        :param flush_interval: seconds a request may wait for others
+        :param flush_rows: flush at once when queued rows reach it
+        """
+        self.conn_pool_obj = conn_pool_obj
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.pending = []
+        self.pending_rows = 0
+        self.flush_call = None
+        self.flushing = False
+        self.drain_waiters = []
+        self.stats = {'requests': 0, 'rows': 0, 'flushes': 0, 'failed_requests': 0,
+                      'max_batch_rows': 0, 'last_flush_seconds': 0}
+
+    def Submit(self, bulk_rows):
+        """
+        :param bulk_rows: [[sql, [args,...]],...]
+        :return: Deferred, fired with the rows of the last statement after commit
+        """
+        d = defer.Deferred()
+        self.pending.append((bulk_rows, d))
+        self.pending_rows += sum([len(r[1]) for r in bulk_rows])
+        self.stats['requests'] += 1
+        if self.pending_rows >= self.flush_rows:
+            self.Flush()
+        else:
+            self.__Schedule()
+        return d
+
+    def __Schedule(self):
+        from twisted.internet import reactor
+        if self.flush_call is None and not self.flushing:
+            self.flush_call = reactor.callLater(self.flush_interval, self.Flush)
+
+    def __CancelSchedule(self):
+        if self.flush_call is not None:
+            if self.flush_call.active():
+                self.flush_call.cancel()
+            self.flush_call = None
+
+    def __Write(self, conn_obj, batch):
+        conn_obj.execute("BEGIN")
+        cursor_obj = conn_obj.cursor()
+        results = []
+        for bulk_rows, _ in batch:
+            cursor_obj.execute("SAVEPOINT {0}".format(self.SAVEPOINT))
+            try:
+                for bulk_row in bulk_rows:
+                    Sqlite.ExecBulkRow(cursor_obj, bulk_row)
+                rows = [Sqlite.FilterRow(r) for r in cursor_obj.fetchall()]
+                cursor_obj.execute("RELEASE {0}".format(self.SAVEPOINT))
+                results.append((True, rows))
+            except Exception as e:
+                cursor_obj.execute("ROLLBACK TO {0}".format(self.SAVEPOINT))
+                cursor_obj.execute("RELEASE {0}".format(self.SAVEPOINT))
+                results.append((False, e))
+        cursor_obj.close()
+        return results
+
+    @classmethod
+    def MapErr(cls, err_obj):
+        if isinstance(err_obj, sqlite3.IntegrityError):
+            return RGError(ErrorType.SqliteIntegrityError())
+        else:
+            return err_obj
+
+    def Flush(self):
+        self.__CancelSchedule()
+        if self.flushing or len(self.pending) < 1:
+            return
+        batch, batch_rows = self.pending, self.pending_rows
+        self.pending, self.pending_rows = [], 0
+        self.flushing = True
+        start = time.time()
+
+        def __Done(results):
+            for (_, d), (succ, res) in zip(batch, results):
+                if succ:
+                    d.callback(res)
+                else:
+                    self.stats['failed_requests'] += 1
+                    d.errback(failure.Failure(self.MapErr(res)))
+
+        def __Fail(err):
+            self.stats['failed_requests'] += len(batch)
+            for _, d in batch:
+                d.errback(failure.Failure(self.MapErr(err.value)))
+
+        def __Next(_):
+            self.flushing = False
+            self.stats['flushes'] += 1
+            self.stats['rows'] += batch_rows
+            self.stats['max_batch_rows'] = max(self.stats['max_batch_rows'], batch_rows)
+            self.stats['last_flush_seconds'] = time.time() - start
+            if len(self.pending) > 0:
+                if self.pending_rows >= self.flush_rows or len(self.drain_waiters) > 0:
+                    self.Flush()
+                else:
+                    self.__Schedule()
+            else:
+                waiters, self.drain_waiters = self.drain_waiters, []
+                for w in waiters:
+                    w.callback(None)
+
+        d = self.conn_pool_obj.runWithConnection(self.__Write, batch)
+        d.addCallbacks(__Done, __Fail)
+        d.addErrback(log.err)
+        d.addBoth(__Next)
+
+    def Drain(self):
+        """
+        :return: Deferred, fired when every queued request is committed
+        """
+        if len(self.pending) < 1 and not self.flushing:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self.drain_waiters.append(d)
+        self.Flush()
+        return d
+
+    def RunWithConn(self, func_obj, *args):
+        """
+        for writes which are not sql rows, like checkpoints and vacuum, the pool has one connection
+        so func_obj(conn_obj, *args) runs between flushes and never competes with them for the write lock
+        :return: Deferred
+        """
+        return Sqlite.RunWithConn(self.conn_pool_obj, func_obj, *args)
+
+    def GetStats(self):
+        res = dict(self.stats)
+        res['pending_requests'] = len(self.pending)
+        res['pending_rows'] = self.pending_rows
+        return res
+
+
 class DbConnWrap:
     def __init__(self, conn_obj):
         self.conn_obj = conn_obj
@@ -329,6 +863,529 @@ class TxRedis:
         return conn_obj.eval(script, keys=keys, args=args)
 
 
+class ExpiringKeys:
+    """
+    in process keys with a ttl, a heap of expiry ts drops expired keys lazily on access.
+    stale heap entries of keys set again or deleted are skipped and compacted away
+    """
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.key_tbl = {}  # key -> expiry ts
+        self.heap = []  # (expiry ts, key)
+
+    def Purge(self):
+        curr_ts = self.clock()
+        while len(self.heap) > 0 and self.heap[0][0] <= curr_ts:
+            expiry_ts, key = heapq.heappop(self.heap)
+            if self.key_tbl.get(key) == expiry_ts:
+                del self.key_tbl[key]
+        if len(self.heap) > 2 * len(self.key_tbl) + 64:
+            self.heap = [(ts_val, key) for key, ts_val in self.key_tbl.items()]
+            heapq.heapify(self.heap)
+
+    def Set(self, key, ttl):
+        """
+        :param key:
+        :param ttl: seconds
+        """
+        expiry_ts = self.clock() + ttl
+        self.key_tbl[key] = expiry_ts
+        heapq.heappush(self.heap, (expiry_ts, key))
+
+    def Has(self, key):
+        self.Purge()
+        return key in self.key_tbl
+
+    def TTL(self, key):
+        """
+        :return: seconds left, None if the key does not exist
+        """
+        self.Purge()
+        return self.key_tbl[key] - self.clock() if key in self.key_tbl else None
+
+    def Delete(self, key):
+        return self.key_tbl.pop(key, None) is not None
+
+    def Clear(self):
+        self.key_tbl.clear()
+        self.heap.clear()
+
+    def __len__(self):
+        self.Purge()
+        return len(self.key_tbl)
+
+
+class LuaLite:
+    """
+    compiles the lua subset used by sensor func_body (locals, if/elseif/else, return,
+    arithmetic, comparisons, and/or/not, .., tonumber, tostring, math.*) into python closures,
+    results are converted the way redis EVAL converts lua values
+    """
+    class Unsupported(Exception):
+        pass
+
+    class RuntimeErr(Exception):
+        pass
+
+    TOKEN_RE = re.compile(r"""\s*(?:
+                              (?P<comment>--[^\n]*)|
+                              (?P<num>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)|
+                              (?P<str>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')|
+                              (?P<name>[A-Za-z_][A-Za-z_0-9]*)|
+                              (?P<op>\.\.|==|~=|<=|>=|[-+*/%^<>=(){}\[\];,.#])
+                              )""", re.VERBOSE)
+    KEYWORDS = {'and', 'break', 'do', 'else', 'elseif', 'end', 'false', 'for', 'function', 'if', 'in',
+                'local', 'nil', 'not', 'or', 'repeat', 'return', 'then', 'true', 'until', 'while'}
+    NUM_RE = re.compile(r'\s*(?:(-?)0[xX]([0-9a-fA-F]+)|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?))\s*$')
+    STR_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '\\': '\\', '"': '"', "'": "'", 'a': '\a', 'b': '\b',
+                   'f': '\f', 'v': '\v'}
+    CMP_OPS = ('<', '>', '<=', '>=')
+
+    @classmethod
+    def Tokenize(cls, script):
+        tokens, pos = [], 0
+        while pos < len(script):
+            m = cls.TOKEN_RE.match(script, pos)
+            if m is None or m.end() == pos:
+                if script[pos:].strip() == '':
+                    break
+                raise cls.Unsupported('unexpected char at {0}'.format(pos))
+            pos = m.end()
+            kind = m.lastgroup
+            if kind == 'comment':
+                if m.group(kind).startswith('--['):
+                    raise cls.Unsupported('long comment')
+            elif kind == 'num':
+                text = m.group(kind)
+                tokens.append(('num', float(int(text, 16)) if text[:2] in ('0x', '0X') else float(text)))
+            elif kind == 'str':
+                tokens.append(('str', cls.Unescape(m.group(kind)[1:-1])))
+            elif kind == 'name' and m.group(kind) in cls.KEYWORDS:
+                tokens.append(('kw', m.group(kind)))
+            else:
+                tokens.append((kind, m.group(kind)))
+        tokens.append(('eof', None))
+        return tokens
+
+    @classmethod
+    def Unescape(cls, text):
+        res, i = [], 0
+        while i < len(text):
+            if text[i] == '\\':
+                if text[i + 1] not in cls.STR_ESCAPES:
+                    raise cls.Unsupported('string escape')
+                res.append(cls.STR_ESCAPES[text[i + 1]])
+                i += 2
+            else:
+                res.append(text[i])
+                i += 1
+        return ''.join(res)
+
+    @classmethod
+    def ToNumber(cls, val):
+        if isinstance(val, float):
+            return val
+        if isinstance(val, str):
+            m = cls.NUM_RE.match(val)
+            if m:
+                if m.group(2):
+                    return -float(int(m.group(2), 16)) if m.group(1) else float(int(m.group(2), 16))
+                return float(m.group(3))
+        return None
+
+    @classmethod
+    def ToString(cls, val):
+        if val is None:
+            return 'nil'
+        elif isinstance(val, bool):
+            return 'true' if val else 'false'
+        elif isinstance(val, float):
+            return '%.14g' % val
+        else:
+            return val
+
+    @classmethod
+    def TypeName(cls, val):
+        if val is None:
+            return 'nil'
+        elif isinstance(val, bool):
+            return 'boolean'
+        elif isinstance(val, float):
+            return 'number'
+        else:
+            return 'string'
+
+    @classmethod
+    def Arith(cls, op, a, b):
+        x, y = cls.ToNumber(a), cls.ToNumber(b)
+        if x is None or y is None:
+            raise cls.RuntimeErr('attempt to perform arithmetic on a {0} value'.format(
+                cls.TypeName(a if x is None else b)))
+        if op == '+':
+            return x + y
+        elif op == '-':
+            return x - y
+        elif op == '*':
+            return x * y
+        elif op == '/':
+            if y == 0:
+                return math.nan if x == 0 or math.isnan(x) else math.copysign(math.inf, x) * math.copysign(1, y)
+            return x / y
+        elif op == '%':
+            return math.nan if y == 0 else x - math.floor(x / y) * y
+        else:
+            try:
+                return math.pow(x, y)
+            except (OverflowError, ValueError):
+                return math.nan
+
+    @classmethod
+    def Compare(cls, op, a, b):
+        if not ((isinstance(a, float) and isinstance(b, float)) or (isinstance(a, str) and isinstance(b, str))):
+            raise cls.RuntimeErr('attempt to compare {0} with {1}'.format(cls.TypeName(a), cls.TypeName(b)))
+        if op == '<':
+            return a < b
+        elif op == '>':
+            return a > b
+        elif op == '<=':
+            return a <= b
+        else:
+            return a >= b
+
+    @classmethod
+    def Equal(cls, a, b):
+        if isinstance(a, bool) or isinstance(b, bool):
+            return a is b
+        return type(a) is type(b) and a == b
+
+    @classmethod
+    def Concat(cls, a, b):
+        if not (isinstance(a, (float, str)) and isinstance(b, (float, str))):
+            raise cls.RuntimeErr('attempt to concatenate a {0} value'.format(
+                cls.TypeName(b if isinstance(a, (float, str)) else a)))
+        return cls.ToString(a) + cls.ToString(b)
+
+    @classmethod
+    def Truth(cls, val):
+        return val is not None and val is not False
+
+    @classmethod
+    def Floor(cls, x):
+        return float(math.floor(x)) if math.isfinite(x) else x
+
+    @classmethod
+    def Ceil(cls, x):
+        return float(math.ceil(x)) if math.isfinite(x) else x
+
+    @classmethod
+    def ToRedis(cls, val):
+        """
+        convert lua result the way redis EVAL replies: number truncated to integer,
+        true -> 1, nil/false -> None
+        """
+        if isinstance(val, bool):
+            return 1 if val else None
+        elif isinstance(val, float):
+            if not math.isfinite(val):
+                raise cls.RuntimeErr('non finite number result')
+            return int(val)
+        else:
+            return val
+
+    @classmethod
+    def Compile(cls, script):
+        """
+        :param script: lua source
+        :return: func(argv) -> redis style result, raise LuaLite.RuntimeErr on lua runtime error
+        :raise LuaLite.Unsupported: if script is out of the supported subset
+        """
+        block = _LuaParser(cls, cls.Tokenize(script)).Chunk()
+
+        def Run(argv):
+            frame = [None] * block.slots
+            frame[0] = [v if isinstance(v, str) else format(v, 'f') if isinstance(v, float) else str(v) for v in argv]
+            res = block.run(frame)
+            return cls.ToRedis(res[0]) if res else None
+        return Run
+
+
+class _LuaBlock:
+    __slots__ = ('run', 'slots')
+
+    def __init__(self, run, slots):
+        self.run = run
+        self.slots = slots
+
+
+class _LuaParser:
+    """
+    recursive descent parser for LuaLite, emits closures taking the local variable frame,
+    frame[0] holds ARGV
+    """
+    BIN_PRIORITY = {'or': (1, 1), 'and': (2, 2),
+                    '<': (3, 3), '>': (3, 3), '<=': (3, 3), '>=': (3, 3), '~=': (3, 3), '==': (3, 3),
+                    '..': (5, 4), '+': (6, 6), '-': (6, 6), '*': (7, 7), '/': (7, 7), '%': (7, 7),
+                    '^': (10, 9)}
+    UNARY_PRIORITY = 8
+
+    def __init__(self, lua, tokens):
+        self.lua = lua
+        self.tokens = tokens
+        self.pos = 0
+        self.scopes = [{}]
+        self.slots = 1
+
+    def Peek(self):
+        return self.tokens[self.pos]
+
+    def Next(self):
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def Check(self, kind, val):
+        tok = self.Peek()
+        return tok[0] == kind and tok[1] == val
+
+    def Expect(self, kind, val=None):
+        tok = self.Next()
+        if tok[0] != kind or (val is not None and tok[1] != val):
+            raise self.lua.Unsupported('expected {0} got {1}'.format(val or kind, tok[1]))
+        return tok[1]
+
+    def AtBlockEnd(self):
+        tok = self.Peek()
+        return tok[0] == 'eof' or (tok[0] == 'kw' and tok[1] in ('end', 'else', 'elseif'))
+
+    def Resolve(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def Chunk(self):
+        run = self.Block()
+        self.Expect('eof')
+        return _LuaBlock(run, self.slots)
+
+    def Block(self):
+        self.scopes.append({})
+        stats = []
+        while True:
+            if self.Check('op', ';'):
+                self.Next()
+            elif self.Check('kw', 'return'):
+                self.Next()
+                if self.AtBlockEnd() or self.Check('op', ';'):
+                    exp = None
+                else:
+                    exp = self.Exp()
+                if self.Check('op', ';'):
+                    self.Next()
+                stats.append(self.Return(exp))
+                break
+            elif self.AtBlockEnd():
+                break
+            else:
+                stats.append(self.Statement())
+        self.scopes.pop()
+        stats = tuple(stats)
+
+        def Run(frame):
+            for stat in stats:
+                res = stat(frame)
+                if res is not None:
+                    return res
+            return None
+        return Run
+
+    def Return(self, exp):
+        if exp is None:
+            return lambda frame: (None,)
+        return lambda frame: (exp(frame),)
+
+    def Statement(self):
+        tok = self.Next()
+        if tok == ('kw', 'local'):
+            name = self.Expect('name')
+            exp = None
+            if self.Check('op', '='):
+                self.Next()
+                exp = self.Exp()
+            slot = self.slots
+            self.slots += 1
+            self.scopes[-1][name] = slot
+            if exp is None:
+                def Local(frame):
+                    frame[slot] = None
+            else:
+                def Local(frame):
+                    frame[slot] = exp(frame)
+            return Local
+        elif tok == ('kw', 'if'):
+            branches = []
+            cond = self.Exp()
+            self.Expect('kw', 'then')
+            branches.append((cond, self.Block()))
+            else_block = None
+            while True:
+                tok = self.Next()
+                if tok == ('kw', 'elseif'):
+                    cond = self.Exp()
+                    self.Expect('kw', 'then')
+                    branches.append((cond, self.Block()))
+                elif tok == ('kw', 'else'):
+                    else_block = self.Block()
+                    self.Expect('kw', 'end')
+                    break
+                elif tok == ('kw', 'end'):
+                    break
+                else:
+                    raise self.lua.Unsupported('expected end got {0}'.format(tok[1]))
+            branches = tuple(branches)
+            truth = self.lua.Truth
+
+            def If(frame):
+                for cond, block in branches:
+                    if truth(cond(frame)):
+                        return block(frame)
+                return else_block(frame) if else_block else None
+            return If
+        elif tok[0] == 'name':
+            slot = self.Resolve(tok[1])
+            if slot is None or slot == 0:
+                raise self.lua.Unsupported('assignment to global {0}'.format(tok[1]))
+            self.Expect('op', '=')
+            exp = self.Exp()
+
+            def Assign(frame):
+                frame[slot] = exp(frame)
+            return Assign
+        else:
+            raise self.lua.Unsupported('statement {0}'.format(tok[1]))
+
+    def Exp(self, limit=0):
+        tok = self.Peek()
+        if tok in (('kw', 'not'), ('op', '-')):
+            self.Next()
+            left = self.Unary(tok[1], self.Exp(self.UNARY_PRIORITY))
+        else:
+            left = self.Simple()
+        while True:
+            op = self.Peek()[1] if self.Peek()[0] in ('op', 'kw') else None
+            if op not in self.BIN_PRIORITY or self.BIN_PRIORITY[op][0] <= limit:
+                return left
+            self.Next()
+            right = self.Exp(self.BIN_PRIORITY[op][1])
+            left = self.Binary(op, left, right)
+
+    def Unary(self, op, exp):
+        lua = self.lua
+        if op == 'not':
+            return lambda frame: not lua.Truth(exp(frame))
+
+        def Neg(frame):
+            val = exp(frame)
+            num = lua.ToNumber(val)
+            if num is None:
+                raise lua.RuntimeErr('attempt to perform arithmetic on a {0} value'.format(lua.TypeName(val)))
+            return -num
+        return Neg
+
+    def Binary(self, op, left, right):
+        lua = self.lua
+        if op == 'or':
+            def Or(frame):
+                val = left(frame)
+                return val if lua.Truth(val) else right(frame)
+            return Or
+        elif op == 'and':
+            def And(frame):
+                val = left(frame)
+                return right(frame) if lua.Truth(val) else val
+            return And
+        elif op == '==':
+            return lambda frame: lua.Equal(left(frame), right(frame))
+        elif op == '~=':
+            return lambda frame: not lua.Equal(left(frame), right(frame))
+        elif op in lua.CMP_OPS:
+            return lambda frame: lua.Compare(op, left(frame), right(frame))
+        elif op == '..':
+            return lambda frame: lua.Concat(left(frame), right(frame))
+        else:
+            return lambda frame: lua.Arith(op, left(frame), right(frame))
+
+    def Simple(self):
+        tok = self.Next()
+        if tok[0] in ('num', 'str'):
+            val = tok[1]
+            return lambda frame: val
+        elif tok[0] == 'kw' and tok[1] in ('nil', 'true', 'false'):
+            val = {'nil': None, 'true': True, 'false': False}[tok[1]]
+            return lambda frame: val
+        elif tok == ('op', '('):
+            exp = self.Exp()
+            self.Expect('op', ')')
+            return exp
+        elif tok[0] == 'name':
+            return self.Primary(tok[1])
+        else:
+            raise self.lua.Unsupported('expression {0}'.format(tok[1]))
+
+    def Primary(self, name):
+        slot = self.Resolve(name)
+        if slot is not None:
+            return lambda frame: frame[slot]
+        elif name == 'ARGV':
+            self.Expect('op', '[')
+            idx = self.Exp()
+            self.Expect('op', ']')
+
+            def Argv(frame):
+                i = idx(frame)
+                if not isinstance(i, float) or not i.is_integer() or i < 1 or i > len(frame[0]):
+                    return None
+                return frame[0][int(i) - 1]
+            return Argv
+        elif name == 'math':
+            self.Expect('op', '.')
+            name = 'math.' + self.Expect('name')
+        func = self.Builtin(name)
+        self.Expect('op', '(')
+        args = []
+        if not self.Check('op', ')'):
+            args.append(self.Exp())
+            while self.Check('op', ','):
+                self.Next()
+                args.append(self.Exp())
+        self.Expect('op', ')')
+        args = tuple(args)
+        return lambda frame: func(*[a(frame) for a in args])
+
+    def Builtin(self, name):
+        lua = self.lua
+
+        def Num(name, val):
+            res = lua.ToNumber(val)
+            if res is None:
+                raise lua.RuntimeErr("bad argument #1 to '{0}' (number expected, got {1})".format(
+                    name, lua.TypeName(val)))
+            return res
+
+        def Math(func):
+            return lambda *args: func(*[Num(name, a) for a in args])
+        tbl = {'tonumber': lambda val=None: lua.ToNumber(val),
+               'tostring': lambda val=None: lua.ToString(val),
+               'math.floor': Math(lua.Floor),
+               'math.ceil': Math(lua.Ceil),
+               'math.abs': Math(abs),
+               'math.min': Math(min),
+               'math.max': Math(max)}
+        if name not in tbl:
+            raise self.lua.Unsupported('global {0}'.format(name))
+        return tbl[name]
+
+
 class TZ:
     @classmethod
     def GetTimeZoneName(cls, timezone_obj):
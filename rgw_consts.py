@@ -109,6 +109,7 @@ class URLs:
     API_SWITCH_ADM = r'api/switchadm'
     API_ZB_MODULE_ADM = r'api/zbmoduleadm'
     API_ZB_DEVICE_ADM = r'api/zbdeviceadm'
+    API_INGEST = r'api/ingest'
     EXPORT_FMT = "export/{0}"
 
 
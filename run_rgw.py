@@ -1,10 +1,13 @@
 import os.path as os_path
 from twisted.internet import reactor, defer
 from twisted.python import log, logfile
+import rg_lib
 import settings
 import rgw_consts
 import web_app
 import api_core
+import api_sensor_data
+import api_sensor_filter
 import api_switch_stats
 from bkg_tasks import beat_tasks
 
@@ -32,8 +35,16 @@ def UpdateConsts():
 
 
 async def Init():
+    rg_lib.SqlStats.Setup(settings.SQL_STATS['enabled'], settings.SQL_STATS['slow_ms'],
+                          settings.SQL_STATS['slow_log_size'])
     await api_core.BizDB.Init()
     await api_core.LogDB.Init()
+    await api_core.Registry.Load()
+    await api_core.TriggerIndex.Load()
+    await api_core.SensorTrigger.LoadCheckIntervals()
+    await api_sensor_data.Init()
+    await api_sensor_filter.Init()
+    await api_sensor_data.InitRing()
     api_switch_stats.Init()
     await api_core.PageKite.RestartBackend(settings.HTTP_PORT)
     InitWebService()
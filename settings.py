@@ -19,13 +19,132 @@ WEB = {
     'css_dir': "rgw_css"
 }
 
+# page_size applies to new databases, init_rgw.py and migrate_rgw_log.py rebuild existing ones
+SQLITE_PROFILES = {
+    "sd-card": {
+        "synchronous": 1,
+        "cache_size": 2000,  # pages, negative for KiB
+        "mmap_size": 16*1024*1024,
+        "page_size": 4096,
+        "temp_store": "MEMORY",  # keeps temp b-trees off the card
+        "wal_autocheckpoint": 2000,  # pages, fewer and larger checkpoints
+        "pool": {
+            "cp_min": 1,
+            "cp_max": 2
+        },
+        "read_pool": {
+            "cp_min": 1,
+            "cp_max": 3
+        }
+    },
+    "ssd": {
+        "synchronous": 1,
+        "cache_size": -16384,
+        "mmap_size": 256*1024*1024,
+        "page_size": 4096,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,
+        "pool": {
+            "cp_min": 2,
+            "cp_max": 4
+        },
+        "read_pool": {
+            "cp_min": 2,
+            "cp_max": 6
+        }
+    }
+}
+
 BIZ_DB = {
     "path": "/home/pi/rgw_biz.db3",
-    "ttl": 3*86400
+    "ttl": 3*86400,
+    "profile": "sd-card"
 }
 
 LOG_DB = {
     "path": "/home/pi/rgw_log.db3",
-    "ttl": 3*86400
+    "ttl": 3*86400,
+    "archive_ttl": 365*86400,
+    "profile": "sd-card",
+    "writer": {
+        "flush_interval": 0.5,  # seconds
+        "flush_rows": 1000
+    }
+}
+
+SQL_STATS = {
+    "enabled": True,
+    "slow_ms": 200,  # statements slower than this are explained into the slow log
+    "slow_log_size": 50
+}
+
+DB_MAINTENANCE = {
+    "checkpoint_mins": 5,
+    "truncate_wal_bytes": 4*1024*1024,
+    "quiet_hour": 3,  # local time for truncate, optimize and quick_check
+    "analyze_weekday": 6  # full ANALYZE instead of optimize, monday is 0
+}
+
+BACKUP = {
+    "path": "/home/pi/rgw_backup",
+    "step_pages": 256,  # pages copied per backup step
+    "pause": 0.05,  # seconds between steps
+    "compress": True
+}
+
+# slow changing sensors may be read less often, set as "data_no" to opt in,
+# triggers on them then fire up to that many seconds later:
+#    {"moisture": 60, "liquid_level": 30, "pH": 60, "ec": 60}
+SENSOR_SCAN = {
+    "tick": 2,  # seconds between checks for due devices
+    "interval": 12,  # default seconds between reads of a device
+    "data_no": {},  # seconds by sensor data_no
+    "devices": {},  # deviceid -> seconds, overrides data_no
+    "max_backoff": 600  # max seconds between reads of a device returning no values
+}
+
+RXG_READ = {
+    # a chunk times out after (devices + 1) * device_timeout seconds, as ReadDevice did before chunking
+    "default": {"chunk_size": 16, "concurrency": 2, "device_timeout": 100},
+    "modules": {},  # moduleid -> overrides of default
+    "module_refresh": 300  # min seconds between reloads of the device module map
+}
+
+# lossy storage filter, off unless configured: readings within dev of the stored trend are not written
+# mode: abs | pct | swinging_door, dev: deadband (percent for pct), max_interval: heartbeat seconds.
+# a profile for temperature/humidity/illumination sites, set as "data_no" to enable it:
+#    {"temperature": {"mode": "swinging_door", "dev": 0.1, "max_interval": 600},
+#     "humidity": {"mode": "abs", "dev": 0.5, "max_interval": 600},
+#     "illumination": {"mode": "pct", "dev": 1, "max_interval": 600}}
+SENSOR_FILTER = {
+    "default": None,
+    "data_no": {},  # data_no -> cfg
+    "sensors": {}  # sensorid -> cfg, overrides data_no
+}
+
+SENSOR_RING = {
+    "capacity": 128,  # latest readings kept per sensor
+    "span": 600  # seconds of readings loaded from the log db at startup
+}
+
+INGEST = {
+    "key": "",  # shared key of the gateway pushing readings, empty disables the ingest api
+    "rate": 1200,  # max requests per minute
+    "dedup_secs": 5,  # same device vals within this are one reading
+    "max_age": 600,  # seconds, older pushed readings are rejected as stale
+    "max_devices": 500  # max devices per batch
+}
+
+TASK_RUNNER = {
+    "stretch_after": 3,  # overruns in a row before a job period is doubled
+    "max_stretch": 4,  # max period as multiple of the configured one
+    "recover_after": 10  # normal runs in a row before a stretched period is halved
+}
+
+RETENTION = {
+    "batch_rows": 2000,
+    "batch_partitions": 1,
+    "pause": 0.2,  # seconds between batches
+    "vacuum_pages": 1024
 }
 
@@ -0,0 +1,51 @@
+"""
+stand-in gateway pushing readings to api/ingest, test_ingest feeds its batches through
+PushReadings, against a running rgw it is used from the command line:
+python tests/fake_gateway.py --url http://127.0.0.1:8000/api/ingest --key <INGEST key> --devices 50
+"""
+import argparse
+import json
+import random
+import time
+import urllib.request
+
+
+def MakeDevices(count):
+    return ['00124b00feed{0:04x}'.format(i) for i in range(count)]
+
+
+def MakeBatch(deviceids, ts_val):
+    return [{'id': deviceid, 'ts': ts_val, 'vals': [round(20 + random.uniform(-2, 2), 2),
+                                                   round(50 + random.uniform(-5, 5), 2)]}
+            for deviceid in deviceids]
+
+
+def Push(url, key, devs, req_id):
+    body = json.dumps({'jsonrpc': '2.0', 'method': 'PushReadings', 'id': req_id,
+                       'params': [{'key': key, 'devices': devs}]}).encode('utf-8')
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.loads(resp.read().decode('utf-8'))
+
+
+def Main():
+    parser = argparse.ArgumentParser(description='push fake device readings to the ingest api')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/api/ingest')
+    parser.add_argument('--key', required=True)
+    parser.add_argument('--devices', type=int, default=10, help='devices per batch')
+    parser.add_argument('--interval', type=float, default=5, help='seconds between batches')
+    parser.add_argument('--count', type=int, default=0, help='batches to push, 0 runs forever')
+    args = parser.parse_args()
+    deviceids = MakeDevices(args.devices)
+    req_id = 0
+    while args.count < 1 or req_id < args.count:
+        req_id += 1
+        begin = time.monotonic()
+        res = Push(args.url, args.key, MakeBatch(deviceids, int(time.time())), req_id)
+        print('batch {0}: {1} in {2:.3f}s'.format(req_id, res.get('result', res.get('error')),
+                                                  time.monotonic() - begin))
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    Main()
@@ -0,0 +1,38 @@
+import pytest
+import rg_lib
+
+
+class Clock(object):
+    def __init__(self):
+        self.ts = 1000.0
+
+    def __call__(self):
+        return self.ts
+
+
+@pytest.mark.skipif(False, reason='')
+class TestExpiringKeys(object):
+    @pytest.mark.skipif(False, reason='')
+    def test_expire(self):
+        clock = Clock()
+        keys = rg_lib.ExpiringKeys(clock)
+        keys.Set('a', 60)
+        keys.Set('b', 120)
+        keys.Set('a', 300)
+        clock.ts += 100
+        assert keys.Has('a') and keys.Has('b')
+        assert keys.TTL('a') == 200
+        clock.ts += 50
+        assert not keys.Has('b')
+        assert keys.Delete('a')
+        assert not keys.Has('a') and keys.TTL('a') is None
+        assert len(keys) == 0
+
+    @pytest.mark.skipif(False, reason='')
+    def test_compact(self):
+        clock = Clock()
+        keys = rg_lib.ExpiringKeys(clock)
+        for i in range(1000):
+            keys.Set('k', 60 + i)
+        assert keys.Has('k')
+        assert len(keys.heap) <= 66
@@ -0,0 +1,153 @@
+import asyncio
+import types
+import pytest
+from twisted.internet import defer
+import rg_lib
+import rgw_consts
+import settings
+import models
+import api_core
+import api_scan_device
+import api_sensor_data
+import api_sensor_filter
+import api_sensor_ring
+from http_handlers import ingest_api
+from tests import fake_gateway
+
+
+@pytest.mark.skipif(False, reason='')
+class TestIngest(object):
+    @pytest.mark.skipif(False, reason='')
+    def test_dedup(self):
+        settings.INGEST['dedup_secs'] = 5
+        api_scan_device.last_reading_tbl.clear()
+        assert not api_scan_device.IsDuplicate('d1', 100, [1, 2])
+        assert api_scan_device.IsDuplicate('d1', 102, [1, 2])
+        assert api_scan_device.IsDuplicate('d1', 99, [3, 4])
+        assert not api_scan_device.IsDuplicate('d1', 103, [1, 3])
+        assert not api_scan_device.IsDuplicate('d1', 110, [1, 3])
+        assert not api_scan_device.IsDuplicate('d2', 100, [1, 2])
+
+    @pytest.mark.skipif(False, reason='')
+    def test_push_defers_poll(self):
+        api_scan_device.poll_heap.clear()
+        api_scan_device.poll_tbl.clear()
+        api_scan_device.SchedulePoll('d1', 12, 100)
+        api_scan_device.poll_tbl['d1']['due_ts'] = 130
+        assert api_scan_device.PopDue(112, {'d1': []}) == []
+        assert api_scan_device.PopDue(129, {'d1': []}) == []
+        assert api_scan_device.PopDue(130, {'d1': []}) == ['d1']
+
+    @pytest.mark.skipif(False, reason='')
+    def test_new_device_polled_at_once(self, monkeypatch):
+        read = []
+
+        async def GetSensorTbl():
+            return {'d1': [{'data_no': 'temperature'}], 'd2': [{'data_no': 'temperature'}]}
+
+        async def ReadDue(deviceids, curr_ts):
+            read.extend(deviceids)
+            return {}
+
+        monkeypatch.setattr(api_scan_device, 'GetSensorTbl', GetSensorTbl)
+        monkeypatch.setattr(api_scan_device, 'ReadDue', ReadDue)
+        api_scan_device.poll_heap.clear()
+        api_scan_device.poll_tbl.clear()
+        api_scan_device.SchedulePoll('d1', 12, rg_lib.DateTime.ts() + 600)
+        asyncio.run(api_scan_device.ScanSensor())
+        assert read == ['d2']
+
+
+class FakePipeline(object):
+    def incr(self, key):
+        pass
+
+    def expire(self, key, seconds):
+        pass
+
+    def execute_pipeline(self):
+        return defer.succeed([])
+
+
+class FakeRedis(object):
+    def __init__(self):
+        self.set_keys = []
+
+    def get(self, key):
+        return defer.succeed(None)
+
+    def pipeline(self):
+        return defer.succeed(FakePipeline())
+
+    def set(self, key, val, expire=None):
+        self.set_keys.append(key)
+        return defer.succeed('OK')
+
+
+class FakeHandler(object):
+    request = types.SimpleNamespace(headers={}, remote_ip='127.0.0.1')
+
+
+@pytest.mark.skipif(False, reason='')
+class TestPushReadings(object):
+    @pytest.mark.skipif(False, reason='')
+    def test_fake_gateway_batch(self, monkeypatch):
+        deviceids = fake_gateway.MakeDevices(3)
+        sensor_rows = {}
+        for deviceid in deviceids:
+            for offset in range(2):
+                sensor_rows['{0}_{1}'.format(deviceid, offset)] = {
+                    'id': '{0}_{1}'.format(deviceid, offset), 'deviceid': deviceid, 'val_offset': offset,
+                    'data_no': 'temperature' if offset == 0 else 'humidity', 'extra_arg0': None,
+                    'func_body': 'return tostring(tonumber(ARGV[1]) * 2)' if offset == 1 else ''}
+        stored, updated, fired = [], [], []
+
+        async def Add(mdls):
+            stored.extend(mdls)
+
+        async def BulkInteraction(sql_rows):
+            updated.extend(sql_rows)
+
+        async def SendEmail(trigger_mdl):
+            fired.append(trigger_mdl['id'])
+
+        redis_conn = FakeRedis()
+        monkeypatch.setattr(api_core.BizDB, 'redis_conn', redis_conn)
+        monkeypatch.setattr(api_core.BizDB, 'BulkInteraction', BulkInteraction)
+        monkeypatch.setattr(api_sensor_data, 'Add', Add)
+        monkeypatch.setattr(api_scan_device, 'SendEmail', SendEmail)
+        monkeypatch.setattr(api_core.Registry, 'sensor_tbl', sensor_rows)
+        monkeypatch.setitem(api_core.Registry.TBL_MAP, 'sensor', (sensor_rows, 'rgw_sensor'))
+        monkeypatch.setitem(api_core.Registry.stats, 'loaded', True)
+        monkeypatch.setitem(settings.INGEST, 'key', 'gw-key')
+        monkeypatch.setitem(settings.SENSOR_FILTER, 'data_no', {})
+        api_scan_device.last_reading_tbl.clear()
+        api_scan_device.poll_tbl.clear()
+        api_sensor_filter.cfg_tbl.clear()
+        api_sensor_filter.state_tbl.clear()
+        api_sensor_ring.Clear(rg_lib.DateTime.ts() - 600)
+        api_core.SensorTrigger.interval_keys.Clear()
+        trigger = {'id': 1, 'start_ts': 0, 'stop_ts': 0, 'check_interval': 5, 'emails': [], 'message': '',
+                   'sensors': [{'sensorid': deviceids[0] + '_1', 'op': '>', 'rval': '0'}], 'switches': []}
+        trigger['cond'] = models.SensorTrigger.CompileCond(trigger['sensors'])
+        monkeypatch.setattr(api_core.TriggerIndex, 'trigger_tbl', {1: trigger})
+        monkeypatch.setitem(api_core.TriggerIndex.stats, 'loaded', True)
+        api_core.TriggerIndex.Rebuild()
+
+        curr_ts = rg_lib.DateTime.ts()
+        batch = fake_gateway.MakeBatch(deviceids, curr_ts)
+        res = asyncio.run(ingest_api.PushReadings(FakeHandler(), {'key': 'gw-key', 'devices': batch}))
+        assert res == {'readings': 3, 'duplicates': 0, 'unknown': 0, 'stale': 0}
+        assert len(stored) == 6 and len(updated) > 0
+        stored_tbl = {mdl['sensorid']: mdl['val'] for mdl in stored}
+        for dev in batch:
+            assert stored_tbl[dev['id'] + '_0'] == dev['vals'][0]
+            assert stored_tbl[dev['id'] + '_1'] == pytest.approx(dev['vals'][1] * 2)
+        assert fired == [1]
+        assert redis_conn.set_keys == [rgw_consts.Keys.SENSOR_TRIGGER_INTERVAL.format(1)]
+
+        stale_batch = fake_gateway.MakeBatch(deviceids[:1], 0) + fake_gateway.MakeBatch(['ffffffffffffffff'], curr_ts)
+        res = asyncio.run(ingest_api.PushReadings(FakeHandler(), {'key': 'gw-key', 'devices': batch + stale_batch}))
+        assert res == {'readings': 0, 'duplicates': 3, 'unknown': 1, 'stale': 1}
+        assert len(stored) == 6 and fired == [1]
+        assert api_scan_device.GetIngestStats()['push']['readings'] >= 3
@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+import rg_lib
+import api_core
+import api_scan_device
+
+
+@pytest.mark.skipif(False, reason='')
+class TestLuaLite(object):
+    @pytest.mark.skipif(False, reason='')
+    def test_illumination(self):
+        func = rg_lib.LuaLite.Compile("""
+               local i1 = tonumber(ARGV[1]);
+               local MAX_VOLT = 0x1A;
+               if i1 > MAX_VOLT then
+                   i1 = MAX_VOLT;
+               end
+               return tostring(100*i1/MAX_VOLT);
+        """)
+        assert func([7]) == '26.923076923077'
+        assert func([13.0]) == '50'
+        assert func([30]) == '100'
+
+    @pytest.mark.skipif(False, reason='')
+    def test_redis_conversion(self):
+        assert rg_lib.LuaLite.Compile("return 7.9")([]) == 7
+        assert rg_lib.LuaLite.Compile("return -7.9")([]) == -7
+        assert rg_lib.LuaLite.Compile("if tonumber(ARGV[1]) then return 1 end")(['x']) is None
+        assert rg_lib.LuaLite.Compile("return 2^3^2 .. ''")([]) == '512'
+
+    @pytest.mark.skipif(False, reason='')
+    def test_unsupported(self):
+        for script in ["x = 1", "return redis.call('get', KEYS[1])", "for i=1,2 do end"]:
+            with pytest.raises(rg_lib.LuaLite.Unsupported):
+                rg_lib.LuaLite.Compile(script)
+        with pytest.raises(rg_lib.LuaLite.RuntimeErr):
+            rg_lib.LuaLite.Compile("return ARGV[1] > 1")(['a'])
+
+    @pytest.mark.skipif(False, reason='')
+    def test_zero_or_nil_keeps_raw_val(self):
+        sensors = [{'id': 'lua_{0}'.format(idx), 'val': 5, 'extra_arg0': None, 'func_body': func_body}
+                   for idx, func_body in enumerate(["return 0", "if tonumber(ARGV[1]) > 9 then return 1 end",
+                                                    "return tostring(tonumber(ARGV[1]) * 2)"])]
+        for sensor in sensors:
+            api_core.Sensor.func_tbl.pop(sensor['id'], None)
+        asyncio.run(api_scan_device.EvalFuncBody(sensors))
+        assert [s['val'] for s in sensors] == [5, 5, 10.0]
@@ -0,0 +1,48 @@
+import asyncio
+import random
+import sqlite3
+import pytest
+import rg_lib
+import settings
+import models
+import api_core
+import api_sensor_data
+import api_sensor_filter
+
+
+@pytest.mark.skipif(False, reason='')
+class TestMinAvg(object):
+    @pytest.mark.skipif(False, reason='')
+    def test_many_matches_single(self, monkeypatch):
+        day = 19000
+        stop_ts = (day + 1) * rg_lib.DateTime.DAY_SECONDS + 95
+        sensorids = ['00124b00feed{0:04x}_0'.format(i) for i in range(5)]
+        conn_obj = sqlite3.connect(':memory:')
+        conn_obj.row_factory = sqlite3.Row
+        models.SensorKey.Init(conn_obj)
+        for d in (day, day + 1):
+            conn_obj.execute(models.SensorData.CreatePartition(d))
+        sql_row = models.SensorKey.AddMany(sensorids)
+        conn_obj.executemany(sql_row[0], sql_row[1])
+        random.seed(7)
+        for mdl in [{'sensorid': sid, 'cts': stop_ts - random.randint(1, 300), 'val': random.uniform(0, 100)}
+                    for sid in sensorids for _ in range(20)]:
+            sql_str, args = models.SensorData.DynInsert(mdl, True)
+            conn_obj.execute(sql_str, args)
+
+        async def Query(sql_row):
+            return [dict(r) for r in conn_obj.execute(sql_row[0], sql_row[1])]
+
+        monkeypatch.setattr(api_core.LogDB, 'Query', Query)
+        monkeypatch.setitem(settings.SENSOR_FILTER, 'data_no', {})
+        api_sensor_filter.cfg_tbl.clear()
+        monkeypatch.setattr(api_sensor_data, 'partition_days', {day, day + 1})
+        monkeypatch.setattr(api_sensor_data, 'sensor_keys', {})
+        start_dt, stop_dt = rg_lib.DateTime.ts2dt(stop_ts - 180), rg_lib.DateTime.ts2dt(stop_ts)
+        for exclude_max_min in (False, True):
+            many = asyncio.run(api_sensor_data.GetMinAvgMany(start_dt, stop_dt, sensorids, exclude_max_min))
+            assert sorted(many.keys()) == sensorids
+            for sensorid in sensorids:
+                single = asyncio.run(api_sensor_data.GetMinAvg(start_dt, stop_dt, sensorid, exclude_max_min))
+                assert many[sensorid]['cts'] == single['cts']
+                assert many[sensorid]['avg_val'] == pytest.approx(single['avg_val'])
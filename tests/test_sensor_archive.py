@@ -0,0 +1,32 @@
+import pytest
+import models
+import api_sensor_avg_data
+
+
+@pytest.mark.skipif(False, reason='')
+class TestSensorArchive(object):
+    @pytest.mark.skipif(False, reason='')
+    def test_pack_unpack(self):
+        day = 19000
+        start_ts = day * 86400
+        rows = [(start_ts + i * 60, 20.0 + i * 0.25) for i in range(1440)]
+        data = models.SensorArchive.Pack(day, rows)
+        assert len(data) < 1440 * 8
+        assert models.SensorArchive.Unpack(day, data) == rows
+
+    @pytest.mark.skipif(False, reason='')
+    def test_unsorted_rows(self):
+        day = 19000
+        start_ts = day * 86400
+        rows = [(start_ts + 120, 1.5), (start_ts + 5, -2.0)]
+        assert models.SensorArchive.Unpack(day, models.SensorArchive.Pack(day, rows)) == sorted(rows)
+
+    @pytest.mark.skipif(False, reason='')
+    def test_buckets(self):
+        hour_ts = 19000 * 86400 + 3600
+        cts_vals = [hour_ts - 4 * 60 + 7, hour_ts - 3 * 60 + 7, hour_ts + 7, hour_ts + 60 + 7, hour_ts + 7 * 60 + 9]
+        # 7 does not divide 60, minute 56 and minute 0 both start a bucket
+        assert api_sensor_avg_data.GetBuckets(cts_vals, 7) == [(hour_ts - 4 * 60 + 7, hour_ts + 3 * 60),
+                                                               (hour_ts + 7, hour_ts + 7 * 60),
+                                                               (hour_ts + 7 * 60 + 9, hour_ts + 14 * 60)]
+        assert api_sensor_avg_data.GetBuckets(cts_vals[2:], 10) == [(hour_ts + 7, hour_ts + 10 * 60)]
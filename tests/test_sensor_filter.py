@@ -0,0 +1,36 @@
+import math
+import pytest
+import settings
+import api_sensor_filter
+
+
+def RunFilter(sensorid, cfg, raw):
+    settings.SENSOR_FILTER['sensors'][sensorid] = cfg
+    stored = []
+    for cts, val in raw:
+        for mdl in api_sensor_filter.Filter([{'id': sensorid, 'data_no': '', 'uts': cts, 'val': val}]):
+            stored.append((mdl['cts'], mdl['val']))
+    return stored
+
+
+@pytest.mark.skipif(False, reason='')
+class TestSensorFilter(object):
+    @pytest.mark.skipif(False, reason='')
+    def test_deadband_heartbeat(self):
+        cfg = {'mode': 'abs', 'dev': 0.5, 'max_interval': 120}
+        raw = [(i * 12, 20.0) for i in range(30)] + [(360, 21.0)]
+        stored = RunFilter('t_abs', cfg, raw)
+        assert stored == [(0, 20.0), (120, 20.0), (240, 20.0), (360, 21.0)]
+        assert api_sensor_filter.stats_tbl['t_abs']['suppressed'] == 27
+
+    @pytest.mark.skipif(False, reason='')
+    def test_reconstruct_avg(self):
+        cfg = {'mode': 'swinging_door', 'dev': 0.1, 'max_interval': 600}
+        raw = [(i * 12, 25 + 3 * math.sin(i / 50.0)) for i in range(600)]
+        stored = RunFilter('t_sdt', cfg, raw)
+        assert len(stored) < len(raw) / 5
+        for start_ts in range(0, 600 * 12 - 600, 60):
+            expect = api_sensor_filter.MinAvg([r for r in raw if start_ts <= r[0] < start_ts + 60], True)
+            res = api_sensor_filter.MinAvg(api_sensor_filter.Reconstruct(cfg, 12, stored, start_ts, start_ts + 60), True)
+            assert res[0] == expect[0]
+            assert abs(res[1] - expect[1]) <= cfg['dev']
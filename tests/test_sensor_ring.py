@@ -0,0 +1,28 @@
+import pytest
+import settings
+import api_sensor_ring
+
+
+@pytest.mark.skipif(False, reason='')
+class TestSensorRing(object):
+    @pytest.mark.skipif(False, reason='')
+    def test_window(self):
+        settings.SENSOR_RING['capacity'] = 8
+        api_sensor_ring.Clear(0)
+        for i in range(5):
+            api_sensor_ring.Push('s1', 100 + i * 10, float(i))
+        api_sensor_ring.Push('s1', 120, 9.0)
+        assert api_sensor_ring.Latest('s1') == (140, 4.0)
+        assert api_sensor_ring.Window('s1', 110, 140) == [(110, 1.0), (120, 2.0), (130, 3.0)]
+        assert api_sensor_ring.Summary('s1', 0, 200) == {'count': 5, 'avg_val': 2.0, 'min_val': 0.0, 'max_val': 4.0}
+        assert api_sensor_ring.Summary('s2', 0, 200) == {'count': 0, 'avg_val': None, 'min_val': None,
+                                                         'max_val': None}
+
+    @pytest.mark.skipif(False, reason='')
+    def test_overwrite(self):
+        settings.SENSOR_RING['capacity'] = 4
+        api_sensor_ring.Clear(0)
+        for i in range(10):
+            api_sensor_ring.Push('s1', i * 10, float(i))
+        assert api_sensor_ring.Window('s1', 50, 100) is None
+        assert api_sensor_ring.Window('s1', 60, 100) == [(60, 6.0), (70, 7.0), (80, 8.0), (90, 9.0)]
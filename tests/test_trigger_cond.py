@@ -0,0 +1,44 @@
+import sqlite3
+import pytest
+import rg_lib
+import models
+
+
+def SqliteEval(conn_obj, terms):
+    sql = " and ".join(["(? {0} ?)".format(op) for op, lval, rval in terms])
+    args = []
+    for op, lval, rval in terms:
+        args.append(lval)
+        try:
+            args.append(float(rval))
+        except ValueError:
+            args.append(rval)
+    res = conn_obj.execute("select {0}".format(sql), args).fetchone()[0]
+    return res is not None and res > 0
+
+
+@pytest.mark.skipif(False, reason='')
+class TestTriggerCond(object):
+    @pytest.mark.skipif(False, reason='')
+    def test_same_as_sqlite(self):
+        conn_obj = sqlite3.connect(':memory:')
+        ops = ['=', '==', '!=', '<>', '<', '<=', '>', '>=', 'is', 'is not']
+        lvals = [None, -1.5, 0, 10, 10.0, 25.25, float('inf'), float('nan'), 'abc', '10', 'Ä']
+        rvals = ['10', '10.0', '-1.5', ' 25.25 ', 'abc', 'abd', 'ab', 'Z', '', 'inf', 'nan', 'é']
+        for op in ops:
+            for lval in lvals:
+                for rval in rvals:
+                    cond = models.SensorTrigger.CompileCond([{'sensorid': 's1', 'op': op, 'rval': rval}])
+                    assert models.SensorTrigger.EvalCond(cond, {'s1': lval}) == \
+                        SqliteEval(conn_obj, [(op, lval, rval)]), (op, lval, rval)
+
+    @pytest.mark.skipif(False, reason='')
+    def test_and_terms(self):
+        cond = models.SensorTrigger.CompileCond([{'sensorid': 's1', 'op': '>', 'rval': '10'},
+                                                 {'sensorid': 's2', 'op': 'IS  NOT', 'rval': 'off'}])
+        assert models.SensorTrigger.EvalCond(cond, {'s1': 11, 's2': 3})
+        assert not models.SensorTrigger.EvalCond(cond, {'s1': 9, 's2': 3})
+        assert not models.SensorTrigger.EvalCond(cond, {'s1': 11})
+        assert not models.SensorTrigger.EvalCond(models.SensorTrigger.CompileCond([]), {})
+        with pytest.raises(rg_lib.RGError):
+            models.SensorTrigger.CompileCond([{'sensorid': 's1', 'op': '> 1 or 1 >', 'rval': '10'}])
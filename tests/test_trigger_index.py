@@ -0,0 +1,27 @@
+import pytest
+import api_core
+
+
+def MakeTrigger(triggerid, start_ts, stop_ts, sensorids):
+    return {'id': triggerid, 'start_ts': start_ts, 'stop_ts': stop_ts,
+            'sensors': [{'sensorid': sid, 'op': '>', 'rval': '0'} for sid in sensorids], 'switches': []}
+
+
+@pytest.mark.skipif(False, reason='')
+class TestTriggerIndex(object):
+    @pytest.mark.skipif(False, reason='')
+    def test_active_timeline(self):
+        tbl = api_core.TriggerIndex.trigger_tbl
+        tbl.clear()
+        tbl.update({1: MakeTrigger(1, 0, 0, ['s1']), 2: MakeTrigger(2, 100, 0, ['s1', 's2']),
+                    3: MakeTrigger(3, 0, 200, ['s2']), 4: MakeTrigger(4, 100, 200, ['s3'])})
+        api_core.TriggerIndex.Rebuild()
+        assert api_core.TriggerIndex.timeline == [100, 200]
+        assert api_core.TriggerIndex.sensor_tbl == {'s1': {1, 2}, 's2': {2, 3}, 's3': {4}}
+        for ts_val in (50, 100, 101, 150, 200, 201, 100):
+            expected = {i for i, mdl in tbl.items() if api_core.TriggerIndex.IsActive(mdl, ts_val)}
+            assert api_core.TriggerIndex.Active(ts_val) == expected
+        assert api_core.TriggerIndex.Active(150) == {1, 2, 3, 4}
+        assert api_core.TriggerIndex.Active(200) == {1, 2}
+        api_core.TriggerIndex.Discard([2])
+        assert api_core.TriggerIndex.Active(150) == {1, 3, 4}
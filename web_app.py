@@ -30,7 +30,8 @@ def GetApi():
             (rgw_consts.URLs.API_SWITCH_ADM, api_handlers.SwitchAdm),
             (rgw_consts.URLs.API_EM, api_handlers.EnvMonitor),
             (rgw_consts.URLs.API_ZB_MODULE_ADM, api_handlers.ZbModuleAdm),
-            (rgw_consts.URLs.API_ZB_DEVICE_ADM, api_handlers.ZbDeviceAdm)
+            (rgw_consts.URLs.API_ZB_DEVICE_ADM, api_handlers.ZbDeviceAdm),
+            (rgw_consts.URLs.API_INGEST, api_handlers.Ingest)
             ]
 
 